@@ -1,19 +1,14 @@
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 import json
 from dotenv import load_dotenv
 
+from app.ai_agent.app.utils.llm import complete_chat
+
 load_dotenv()
 
-# Initialize LLM (sử dụng GPT-4o, key lấy từ ENV OPENAI_API_KEY)
-llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0,
-    max_tokens=500,
-    max_retries=2
-)
+# LLM phân loại input: GPT-4o qua client async dùng chung (key lấy từ ENV OPENAI_API_KEY)
+INPUT_CHECK_MODEL = "gpt-4o"
 
-def input_check_node(state):
+async def input_check_node(state):
     user_input = state["input"]
     print("[DEBUG] User input:", user_input)
 
@@ -30,14 +25,20 @@ Chỉ trả về JSON, không bao Markdown (```).
 """
 
     try:
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_input)
-        ])
-
-        print("[DEBUG] Raw LLM output:", response.content)
-
-        result = json.loads(response.content)
+        content = await complete_chat(
+            model=INPUT_CHECK_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_input},
+            ],
+            temperature=0,
+            max_tokens=500,
+            cache="input_check",
+        )
+
+        print("[DEBUG] Raw LLM output:", content)
+
+        result = json.loads(content)
 
         return {
             "action": result.get("action", "exit"),
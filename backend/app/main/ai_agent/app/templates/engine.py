@@ -0,0 +1,283 @@
+"""
+Engine sinh project dùng chung cho mọi framework (react, next, vue, svelte).
+
+Mặc định (GENERATION_MODE=plan):
+  1) hỏi model danh sách file cần có (plan: path + mô tả),
+  2) sinh nội dung từng file song song (tối đa GENERATION_CONCURRENCY lời gọi
+     cùng lúc), mỗi lời gọi chỉ trả về một file nên không bị giới hạn output
+     token của cả project, file lỗi được thử lại riêng (GENERATION_FILE_RETRIES),
+  3) ghi file ngay khi xong (sự kiện file_generated), rồi insert DB.
+
+GENERATION_MODE=single giữ cách cũ: một lời gọi trả về cả mảng JSON, file được
+ghi dần trong lúc stream (xem utils/project_stream.py).
+
+Vị trí file: backend/app/ai_agent/app/templates/engine.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from app.ai_agent.app.utils.db import insert_generated_project
+from app.ai_agent.app.utils.json_stream import JsonArrayStream
+from app.ai_agent.app.utils.llm import stream_text
+from app.ai_agent.app.utils.progress import emit_progress
+from app.ai_agent.app.utils.project_stream import package_name, resolve_in_project, stream_project_files
+from app.ai_agent.app.utils.write_file import _write_file_sync
+
+logger = logging.getLogger(__name__)
+
+GENERATION_MODEL = os.getenv("GENERATION_MODEL", "gpt-4.1")
+GENERATION_MODE = (os.getenv("GENERATION_MODE") or "plan").lower()   # plan | single
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "6"))
+GENERATION_FILE_RETRIES = int(os.getenv("GENERATION_FILE_RETRIES", "2"))
+GENERATION_MAX_FILES = int(os.getenv("GENERATION_MAX_FILES", "60"))
+
+
+@dataclass(frozen=True)
+class FrameworkConfig:
+    key: str                 # "react" -> thư mục <temp>/react_project/react_project_<ts>
+    label: str               # tên hiển thị trong câu trả lời
+    stack: str               # mô tả stack đưa vào prompt
+    example_files: tuple     # file mẫu trong prompt; luôn có trong plan
+
+
+FRAMEWORKS = {
+    "react": FrameworkConfig(
+        "react", "React", "React",
+        ("package.json", "src/App.jsx", "src/main.jsx"),
+    ),
+    "next": FrameworkConfig(
+        "next", "Next.js", "Next.js (App Router)",
+        ("package.json", "next.config.js", "app/layout.jsx", "app/page.jsx"),
+    ),
+    "vue": FrameworkConfig(
+        "vue", "Vue", "Vue 3 + Vite",
+        ("package.json", "index.html", "vite.config.js", "src/main.js", "src/App.vue"),
+    ),
+    "svelte": FrameworkConfig(
+        "svelte", "Svelte", "Svelte + Vite",
+        ("package.json", "index.html", "vite.config.js", "src/main.js", "src/App.svelte"),
+    ),
+}
+
+
+@dataclass
+class PlannedFile:
+    path: str
+    description: str
+
+
+def _timestamp():
+    now = datetime.now()
+    return now.strftime("%Y%m%d_%H%M%S") + f"_{int(now.microsecond/1000):03d}"
+
+
+def _new_project_dir(cfg: FrameworkConfig) -> Path:
+    base_dir = Path(tempfile.gettempdir()) / f"{cfg.key}_project"
+    base_dir.mkdir(exist_ok=True)
+    name = f"{cfg.key}_project_{_timestamp()}"
+    # nhiều lượt sinh cùng một ms: thêm hậu tố thay vì ghi chung thư mục
+    for i in range(100):
+        project_dir = base_dir / (name if i == 0 else f"{name}_{i}")
+        try:
+            project_dir.mkdir(parents=True)
+            return project_dir
+        except FileExistsError:
+            continue
+    raise RuntimeError(f"Cannot create project dir under {base_dir}")
+
+
+# =============== Prompt ===============
+def _single_prompt(cfg: FrameworkConfig, instruction: str) -> str:
+    examples = ",\n".join(f'  {{"path": "{p}", "content": "..." }}' for p in cfg.example_files)
+    return f"""
+Bạn là một generator code {cfg.stack}.
+Hãy tạo một project {cfg.label} hoàn chỉnh dựa trên yêu cầu sau:
+"{instruction}"
+
+Yêu cầu:
+- Trả về JSON, dạng mảng các file:
+[
+{examples}
+  ...
+]
+- Mỗi file phải có content code đầy đủ.
+- Không giải thích gì thêm.
+"""
+
+
+def _plan_prompt(cfg: FrameworkConfig, instruction: str) -> str:
+    return f"""
+Bạn là kiến trúc sư project {cfg.stack}.
+Hãy lập danh sách file cho một project {cfg.label} hoàn chỉnh, chạy được, theo yêu cầu sau:
+"{instruction}"
+
+Yêu cầu:
+- Trả về JSON, dạng mảng:
+[
+  {{"path": "package.json", "description": "scripts dev/build, dependencies ..." }},
+  {{"path": "src/...", "description": "nội dung chính, export gì, import từ file nào" }},
+  ...
+]
+- Bắt buộc có: {", ".join(cfg.example_files)}.
+- Mô tả đủ để người khác viết từng file riêng mà các import/export vẫn khớp nhau.
+- Tối đa {GENERATION_MAX_FILES} file, không có file nhị phân.
+- Không giải thích gì thêm.
+"""
+
+
+def _file_prompt(cfg: FrameworkConfig, instruction: str, plan: list[PlannedFile], target: PlannedFile) -> str:
+    listing = "\n".join(f"- {f.path}: {f.description}" for f in plan)
+    return f"""
+Bạn là một generator code {cfg.stack}.
+Project theo yêu cầu: "{instruction}"
+
+Danh sách file của project:
+{listing}
+
+Hãy viết TOÀN BỘ nội dung của file: {target.path}
+({target.description})
+
+Yêu cầu:
+- Chỉ trả về nội dung file, không bọc Markdown (```), không giải thích.
+- Import/export phải khớp với danh sách file ở trên.
+"""
+
+
+_FENCE = re.compile(r"^\s*```[\w.+-]*\s*\n(.*?)\n?```\s*$", re.S)
+
+
+def _strip_fence(text: str) -> str:
+    m = _FENCE.match(text)
+    return m.group(1) if m else text
+
+
+# =============== Plan -> sinh song song ===============
+async def _plan(cfg: FrameworkConfig, instruction: str) -> list[PlannedFile]:
+    parser = JsonArrayStream()
+    entries = parser.feed(await stream_text(
+        model=GENERATION_MODEL, input=_plan_prompt(cfg, instruction), temperature=0,
+        cache=f"plan:{cfg.key}",
+    ))
+    plan: dict[str, PlannedFile] = {}
+    for e in entries:
+        if isinstance(e, dict) and isinstance(e.get("path"), str) and e["path"].strip():
+            path = e["path"].strip().lstrip("/")
+            if ".." in path.split("/"):
+                continue
+            plan.setdefault(path, PlannedFile(path, str(e.get("description") or "")))
+    for path in cfg.example_files:
+        plan.setdefault(path, PlannedFile(path, "file bắt buộc của project"))
+    # file bắt buộc đứng đầu để không bị cắt bởi GENERATION_MAX_FILES
+    files = sorted(plan.values(), key=lambda f: f.path not in cfg.example_files)
+    return files[:GENERATION_MAX_FILES]
+
+
+async def _generate_file(
+    cfg: FrameworkConfig,
+    instruction: str,
+    plan: list[PlannedFile],
+    target: PlannedFile,
+    root: Path,
+    sem: asyncio.Semaphore,
+    written: list[str],
+) -> Optional[str]:
+    """Sinh + ghi một file, thử lại riêng khi lỗi (kể cả lỗi ghi). Trả về nội dung, None nếu bỏ cuộc."""
+    path = resolve_in_project(root, target.path)
+    if path is None:
+        return None
+    prompt = _file_prompt(cfg, instruction, plan, target)
+    for attempt in range(GENERATION_FILE_RETRIES + 1):
+        try:
+            async with sem:
+                content = _strip_fence(await stream_text(
+                    model=GENERATION_MODEL, input=prompt, temperature=0, cache=f"file:{cfg.key}"
+                ))
+            if not content.strip():
+                raise ValueError("empty content")
+            await asyncio.to_thread(_write_file_sync, str(path), content)
+            break
+        except Exception as e:
+            logger.warning("Generating %s failed (attempt %d): %s", target.path, attempt + 1, e)
+            if attempt == GENERATION_FILE_RETRIES:
+                return None
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    written.append(target.path)
+    await emit_progress({
+        "type": "file_generated",
+        "path": target.path,
+        "size": len(content),
+        "index": len(written),
+        "total": len(plan),
+        "project_dir": str(root),
+    })
+    return content
+
+
+async def _generate_planned(cfg: FrameworkConfig, instruction: str, project_dir: Path) -> tuple[list[str], Optional[str], list[str]]:
+    plan = await _plan(cfg, instruction)
+    await emit_progress({"type": "plan", "files": [f.path for f in plan], "project_dir": str(project_dir)})
+
+    sem = asyncio.Semaphore(max(1, GENERATION_CONCURRENCY))
+    written: list[str] = []
+    contents = await asyncio.gather(*(
+        _generate_file(cfg, instruction, plan, f, project_dir.resolve(), sem, written) for f in plan
+    ))
+    failed = [f.path for f, c in zip(plan, contents) if c is None]
+    project_name = next(
+        (package_name(c) for f, c in zip(plan, contents) if f.path == "package.json" and c is not None), None
+    )
+    return written, project_name, failed
+
+
+# =============== API ===============
+async def generate_project(framework: str, instruction: str) -> str:
+    """
+    Sinh project cho `framework` (key của FRAMEWORKS), ghi vào
+    <temp>/<key>_project/<key>_project_<YYYYMMDD_HHMMSS_mmm>/ và insert DB.
+    """
+    cfg = FRAMEWORKS[framework]
+    instruction = " ".join(instruction.split())  # prompt ổn định -> dùng lại được cache LLM
+    print(f"[DEBUG] Generating {cfg.label} project ({GENERATION_MODE}) with instruction:", instruction)
+    project_dir = _new_project_dir(cfg)
+
+    try:
+        if GENERATION_MODE == "single":
+            generated = await stream_project_files(
+                model=GENERATION_MODEL, prompt=_single_prompt(cfg, instruction), project_dir=project_dir,
+                cache=f"single:{cfg.key}",
+            )
+            files, project_name = generated.files, generated.project_name
+            note = "" if generated.complete else " (response bị cắt, giữ các file đã nhận)"
+            if generated.failed:
+                note += f" ({len(generated.failed)} file lỗi: {', '.join(generated.failed)})"
+        else:
+            files, project_name, failed = await _generate_planned(cfg, instruction, project_dir)
+            note = f" ({len(failed)} file lỗi: {', '.join(failed)})" if failed else ""
+    except Exception:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        raise
+    if not files:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        return "Lỗi sinh project từ OpenAI: không nhận được file nào"
+
+    record_id = await insert_generated_project(
+        name=project_name or project_dir.name,
+        resource_path=str(project_dir),
+        created_by="agent",
+    )
+    return (
+        f"{cfg.label} project generated at {project_dir} with {len(files)} files. "
+        f"DB record id={record_id}{note}"
+    )
@@ -1,79 +1,77 @@
 """
 Agent DB util: dùng lại SQLAlchemy engine/session của backend.
+Mọi thao tác ghi đi qua DB_WRITER (một thread ghi, gom nhiều insert/update
+vào một transaction), không mở session riêng ở thread bất kỳ.
 Vị trí file: backend/app/ai_agent/app/utils/db.py
 """
 
 from __future__ import annotations
 
 import asyncio
+import logging
+from pathlib import Path
 from typing import Optional
 
+from sqlalchemy.orm import Session
+
 # Dùng lại cấu hình ORM của backend
-from app.db.database import SessionLocal  # sessionmaker đã gắn engine & pool
+from app.db.writer import DB_WRITER
 from app.models.generated_project import GeneratedProject
+from app.services.archive_cache import schedule_prebuild
+from app.services.project_manifest import ManifestEntry, build_manifest, replace_manifest_op
 
-# (Tuỳ chọn) session dùng chung cho agent để tái sử dụng kết nối
-AGENT_DB_SESSION = None  # type: Optional[object]
+logger = logging.getLogger(__name__)
 
 
 def init_agent_db() -> None:
     """
-    Khởi tạo 1 session dùng chung cho agent (nếu bạn muốn reuse).
-    Gọi 1 lần khi khởi chạy agent (ví dụ ở node init hoặc app startup).
+    Khởi động thread ghi DB (nếu chưa chạy). Không bắt buộc: thao tác ghi
+    đầu tiên cũng tự khởi động.
     """
-    global AGENT_DB_SESSION
-    if AGENT_DB_SESSION is None:
-        AGENT_DB_SESSION = SessionLocal()
+    DB_WRITER.start()
 
 
 def close_agent_db() -> None:
     """
-    Đóng session dùng chung khi tắt agent.
+    Ghi nốt các thao tác đang chờ và dừng thread ghi khi tắt agent.
     """
-    global AGENT_DB_SESSION
-    if AGENT_DB_SESSION is not None:
-        try:
-            AGENT_DB_SESSION.close()
-        finally:
-            AGENT_DB_SESSION = None
+    DB_WRITER.stop()
 
 
-# =============== Core sync (chạy trong thread) ===============
-def _insert_generated_project_sync(
+# =============== Thao tác ghi (chạy trong thread ghi) ===============
+def _insert_generated_project_op(
+    session: Session,
     *,
     name: str,
     resource_path: str,
     created_by: Optional[str] = None,
     updated_by: Optional[str] = None,
+    manifest: Optional[list[ManifestEntry]] = None,
 ) -> int:
-    """
-    Tạo 1 bản ghi GeneratedProject và trả về id.
-    Nếu đã gọi init_agent_db() thì tái dùng session đó, ngược lại tạo session tạm.
-    """
-    global AGENT_DB_SESSION
-    session = AGENT_DB_SESSION or SessionLocal()
-    is_temp = AGENT_DB_SESSION is None
+    obj = GeneratedProject(
+        name=name,
+        resource_path=resource_path,
+        created_by=created_by,
+        updated_by=updated_by,
+    )
+    session.add(obj)
+    session.flush()  # lấy id, commit theo batch
+    if manifest:
+        replace_manifest_op(session, obj.id, manifest)
+    return obj.id
 
-    try:
-        obj = GeneratedProject(
-            name=name,
-            resource_path=resource_path,
-            created_by=created_by,
-            updated_by=updated_by,
-        )
-        session.add(obj)
-        session.commit()
-        session.refresh(obj)
-        return obj.id
-    except Exception:
-        session.rollback()
-        raise
-    finally:
-        if is_temp:
-            session.close()
-
-
-# =============== Async wrapper (không block event loop) ===============
+
+def _update_generated_project_op(session: Session, project_id: int, fields: dict) -> bool:
+    obj = session.get(GeneratedProject, project_id)
+    if obj is None:
+        return False
+    for key, value in fields.items():
+        setattr(obj, key, value)
+    session.flush()
+    return True
+
+
+# =============== Async API (không block event loop) ===============
 async def insert_generated_project(
     *,
     name: str,
@@ -81,10 +79,30 @@ async def insert_generated_project(
     created_by: Optional[str] = None,
     updated_by: Optional[str] = None,
 ) -> int:
-    return await asyncio.to_thread(
-        _insert_generated_project_sync,
-        name=name,
-        resource_path=resource_path,
-        created_by=created_by,
-        updated_by=updated_by,
+    # Manifest (size + sha256 từng file) tính trong thread, ghi cùng transaction với project
+    try:
+        manifest = await asyncio.to_thread(build_manifest, Path(resource_path))
+    except OSError:
+        logger.exception("Cannot build manifest for %s", resource_path)
+        manifest = None
+    record_id = await DB_WRITER.run(
+        lambda s: _insert_generated_project_op(
+            s,
+            name=name,
+            resource_path=resource_path,
+            created_by=created_by,
+            updated_by=updated_by,
+            manifest=manifest,
+        )
     )
+    # Nén sẵn archive để lần tải đầu không phải chờ
+    schedule_prebuild(resource_path)
+    return record_id
+
+
+async def update_generated_project(project_id: int, **fields) -> bool:
+    """Cập nhật các cột của GeneratedProject; trả về False nếu không có id."""
+    unknown = set(fields) - set(GeneratedProject.__table__.columns.keys())
+    if unknown:
+        raise ValueError(f"unknown GeneratedProject fields: {sorted(unknown)}")
+    return await DB_WRITER.run(lambda s: _update_generated_project_op(s, project_id, fields))
@@ -0,0 +1,80 @@
+"""
+Parser JSON tăng dần cho output dạng mảng object của LLM:
+
+    [ {"path": "...", "content": "..."}, {...}, ... ]
+
+feed() nhận từng đoạn text đang stream và trả về các object đã đóng đủ ngoặc,
+nên có thể ghi file ngay khi model vừa viết xong file đó. Text trước dấu "["
+(ví dụ ```json) bị bỏ qua. Response bị cắt giữa chừng thì các object đã trả
+về vẫn dùng được; `complete` cho biết đã gặp "]" đóng mảng hay chưa.
+
+Vị trí file: backend/app/ai_agent/app/utils/json_stream.py
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayStream:
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0          # vị trí quét tiếp theo trong _buf
+        self._start = -1       # đầu object đang mở trong _buf
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self.started = False
+        self.complete = False
+        self.count = 0
+
+    def feed(self, chunk: str) -> list[Any]:
+        if self.complete or not chunk:
+            return []
+        self._buf += chunk
+        buf, i, out = self._buf, self._pos, []
+        while i < len(buf):
+            c = buf[i]
+            if not self.started:
+                if c == "[":
+                    self.started = True
+            elif self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c in "{[":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 0:  # "]" đóng mảng ngoài cùng
+                    self.complete = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = buf[self._start:i + 1]
+                    try:
+                        out.append(json.loads(raw))
+                        self.count += 1
+                    except ValueError:
+                        logger.warning("Skipping malformed array element (%d chars)", len(raw))
+                    self._start = -1
+            i += 1
+
+        # bỏ phần đã xử lý, chỉ giữ object đang mở
+        keep = self._start if self._start >= 0 else i
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._start >= 0:
+            self._start = 0
+        return out
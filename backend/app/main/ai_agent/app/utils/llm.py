@@ -0,0 +1,151 @@
+"""
+Client OpenAI dùng chung cho agent (async, pool kết nối, streaming).
+
+Mọi lời gọi LLM trong agent đi qua đây: không chặn event loop (các /ws/chat
+khác vẫn chạy trong lúc sinh code), các request của nhiều user chạy chồng lên
+nhau trên cùng một pool HTTP keep-alive.
+
+Vị trí file: backend/app/ai_agent/app/utils/llm.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from app.ai_agent.app.utils.llm_cache import LLM_CACHE, LLM_CACHE_ENABLED, cache_key
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))            # giây, cả lượt sinh code
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_llm_client() -> AsyncOpenAI:
+    """AsyncOpenAI dùng chung (tạo lần đầu khi cần, key lấy từ ENV OPENAI_API_KEY)."""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            max_retries=LLM_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            ),
+        )
+    return _client
+
+
+async def close_llm_client() -> None:
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.close()
+
+
+async def _cache_lookup(cache: Optional[str], model: str, temperature: float, prompt, params: dict):
+    """(key, text đã cache). key None = lời gọi này không dùng cache."""
+    if cache is None or not LLM_CACHE_ENABLED or temperature != 0:
+        return None, None
+    key = cache_key(cache, model, temperature, prompt, **params)
+    if LLM_CACHE.bypass:
+        LLM_CACHE.bypassed += 1
+        return key, None
+    try:
+        return key, await asyncio.to_thread(LLM_CACHE.get, key)
+    except Exception as e:  # cache hỏng không được làm hỏng lời gọi LLM
+        logger.warning("LLM cache lookup failed: %s", e)
+        return None, None
+
+
+async def _cache_store(key: Optional[str], cache: Optional[str], model: str, text: str) -> None:
+    if key is None or not text:
+        return
+    try:
+        await asyncio.to_thread(LLM_CACHE.put, key, cache, model, text)
+    except Exception as e:
+        logger.warning("LLM cache store failed: %s", e)
+
+
+async def stream_text(
+    *,
+    model: str,
+    input,
+    temperature: float = 0,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    cache: Optional[str] = None,
+    **kwargs,
+) -> str:
+    """
+    Gọi Responses API ở chế độ stream, trả về toàn bộ output_text.
+    `on_delta` (nếu có) được await với từng đoạn text ngay khi nhận.
+    `cache` (ví dụ "file:react"): scope của cache response; cache hit thì
+    on_delta nhận cả text một lần. Response bị cắt (response.incomplete) là lỗi
+    và không được cache.
+    """
+    key, cached = await _cache_lookup(cache, model, temperature, input, kwargs)
+    if cached is not None:
+        if on_delta is not None:
+            await on_delta(cached)
+        return cached
+
+    stream = await get_llm_client().responses.create(
+        model=model, input=input, temperature=temperature, stream=True, **kwargs
+    )
+    parts: list[str] = []
+    completed = False
+    async with stream:
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                parts.append(event.delta)
+                if on_delta is not None:
+                    await on_delta(event.delta)
+            elif event.type == "response.completed":
+                completed = True
+            elif event.type == "response.incomplete":
+                # bị cắt (max_output_tokens, content filter ...): không phải kết quả dùng được
+                details = getattr(getattr(event, "response", None), "incomplete_details", None)
+                raise RuntimeError(f"LLM response incomplete: {getattr(details, 'reason', None) or 'unknown'}")
+            elif event.type in ("response.failed", "error"):
+                error = getattr(getattr(event, "response", None), "error", None) or getattr(event, "message", event)
+                raise RuntimeError(f"LLM stream failed: {error}")
+    text = "".join(parts)
+    if completed:  # chỉ cache response trọn vẹn
+        await _cache_store(key, cache, model, text)
+    return text
+
+
+async def complete_chat(
+    *,
+    model: str,
+    messages: list[dict],
+    temperature: float = 0,
+    cache: Optional[str] = None,
+    **kwargs,
+) -> str:
+    """
+    Chat Completions (không stream) cho câu trả lời ngắn, ví dụ phân loại input.
+    Chỉ cache khi finish_reason == "stop" (bị cắt vì max_tokens thì không cache).
+    """
+    key, cached = await _cache_lookup(cache, model, temperature, messages, kwargs)
+    if cached is not None:
+        return cached
+    response = await get_llm_client().chat.completions.create(
+        model=model, messages=messages, temperature=temperature, **kwargs
+    )
+    choice = response.choices[0]
+    text = choice.message.content or ""
+    if choice.finish_reason == "stop":
+        await _cache_store(key, cache, model, text)
+    return text
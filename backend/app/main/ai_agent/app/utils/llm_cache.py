@@ -0,0 +1,181 @@
+"""
+Cache response LLM trên đĩa (SQLite riêng, không dùng chung app.db).
+
+Key = sha256(scope, model, temperature, prompt đã chuẩn hoá, tham số khác).
+Prompt được chuẩn hoá (NFC, gộp khoảng trắng) nên các yêu cầu chỉ khác nhau ở
+khoảng trắng ("Todo app  in React " / "Todo app in React") dùng chung một entry.
+Không đổi chữ hoa/thường: tên component, chuỗi hiển thị ... là một phần yêu cầu.
+Chỉ cache lời gọi temperature=0 (kết quả lặp lại được).
+
+Giới hạn bằng LLM_CACHE_MAX_BYTES (xoá entry dùng lâu nhất trước) và
+LLM_CACHE_TTL (giây). Tắt hẳn bằng LLM_CACHE=0, hoặc bỏ qua cho một lượt chạy
+bằng `with llm_cache_bypass(): ...` (vẫn ghi đè entry bằng kết quả mới).
+
+Vị trí file: backend/app/ai_agent/app/utils/llm_cache.py
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = (os.getenv("LLM_CACHE") or "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH") or Path(tempfile.gettempdir()) / "llm_cache.db")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))  # 256 MiB
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))              # 7 ngày
+
+_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+_WS = re.compile(r"\s+")
+
+
+@contextlib.contextmanager
+def llm_cache_bypass(enabled: bool = True) -> Iterator[None]:
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def normalize_prompt(value) -> str:
+    """Chuẩn hoá input (str hoặc list message) thành chuỗi ổn định để hash."""
+    if isinstance(value, str):
+        return _WS.sub(" ", unicodedata.normalize("NFC", value)).strip()
+    if isinstance(value, dict):
+        return json.dumps({k: normalize_prompt(v) for k, v in sorted(value.items())}, ensure_ascii=False)
+    if isinstance(value, (list, tuple)):
+        return json.dumps([normalize_prompt(v) for v in value], ensure_ascii=False)
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def cache_key(scope: str, model: str, temperature: float, prompt, **params) -> str:
+    raw = json.dumps(
+        [scope, model, float(temperature), normalize_prompt(prompt), normalize_prompt(params)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: Path, max_bytes: int, ttl: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # gọi khi đang giữ _lock
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    @property
+    def bypass(self) -> bool:
+        return _bypass.get()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            db.execute("UPDATE llm_cache SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, scope: str, model: str, response: str) -> None:
+        size = len(response.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, scope, model, response, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, model, response, size, now, now),
+            )
+            self.stores += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        # gọi khi đang giữ _lock: hết hạn trước, rồi LRU cho tới khi dưới ngân sách
+        db = self._conn
+        self.evictions += db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._conn is not None:
+                entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            else:
+                entries, size = None, None
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "bypassed": self.bypassed,
+        }
+
+
+LLM_CACHE = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL)
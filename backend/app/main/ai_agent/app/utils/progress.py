@@ -0,0 +1,42 @@
+"""
+Sự kiện tiến độ của agent (ví dụ file_generated) gửi về client đang chat.
+
+Router /ws/chat đặt sink cho lượt chạy hiện tại bằng use_progress_sink();
+node/template chỉ gọi `await emit_progress({...})`. Sink nằm trong
+ContextVar nên đi theo task của LangGraph, mỗi socket nhận đúng sự kiện của
+mình, và không có sink thì emit_progress không làm gì.
+
+Vị trí file: backend/app/ai_agent/app/utils/progress.py
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+ProgressSink = Callable[[dict], Awaitable[None]]
+
+_sink: ContextVar[Optional[ProgressSink]] = ContextVar("agent_progress_sink", default=None)
+
+
+@contextlib.contextmanager
+def use_progress_sink(sink: Optional[ProgressSink]) -> Iterator[None]:
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+async def emit_progress(event: dict) -> None:
+    sink = _sink.get()
+    if sink is None:
+        return
+    try:
+        await sink(event)
+    except Exception as e:  # client đã ngắt: không làm hỏng lượt sinh code
+        logger.debug("progress sink failed: %s", e)
@@ -0,0 +1,107 @@
+"""
+Sinh project theo kiểu stream: mỗi {"path","content"} được ghi ra đĩa ngay khi
+model viết xong nó (JsonArrayStream), kèm sự kiện `file_generated` cho client
+chat đã bật progress. Response bị cắt / lỗi giữa chừng thì các file đã ghi vẫn
+được giữ lại.
+
+Vị trí file: backend/app/ai_agent/app/utils/project_stream.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from app.ai_agent.app.utils.json_stream import JsonArrayStream
+from app.ai_agent.app.utils.llm import stream_text
+from app.ai_agent.app.utils.progress import emit_progress
+from app.ai_agent.app.utils.write_file import _write_file_sync
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StreamedProject:
+    files: list[str] = field(default_factory=list)   # path tương đối đã ghi
+    failed: list[str] = field(default_factory=list)  # path tương đối ghi lỗi, sinh lại được
+    project_name: Optional[str] = None                # "name" trong package.json
+    complete: bool = False                            # đã nhận đủ mảng JSON
+    error: Optional[BaseException] = None             # lỗi stream sau khi đã có file
+
+
+def package_name(content: str) -> Optional[str]:
+    try:
+        pkg = json.loads(content or "{}")
+    except ValueError:
+        return None
+    name = pkg.get("name") if isinstance(pkg, dict) else None
+    if isinstance(name, str) and name.strip():
+        return name.strip()
+    return None
+
+
+def resolve_in_project(root: Path, rel: str) -> Optional[Path]:
+    """Đường dẫn thật của file model sinh ra; None nếu nó thoát ra ngoài project."""
+    path = (root / rel.lstrip("/")).resolve()
+    if not path.is_relative_to(root) or path == root:
+        logger.warning("Skipping generated file outside project: %r", rel)
+        return None
+    return path
+
+
+async def stream_project_files(
+    *,
+    model: str,
+    prompt: str,
+    project_dir: Path,
+    temperature: float = 0,
+    cache: Optional[str] = None,
+) -> StreamedProject:
+    result = StreamedProject()
+    parser = JsonArrayStream()
+    root = project_dir.resolve()
+
+    async def write_entry(entry) -> None:
+        if not isinstance(entry, dict):
+            return
+        rel, content = entry.get("path"), entry.get("content")
+        if not isinstance(rel, str) or not isinstance(content, str):
+            return
+        path = resolve_in_project(root, rel)
+        if path is None:
+            return
+        rel = path.relative_to(root).as_posix()
+        try:
+            await asyncio.to_thread(_write_file_sync, str(path), content)
+        except OSError as e:
+            logger.warning("Writing generated file %s failed: %s", rel, e)
+            result.failed.append(rel)
+            return
+        result.files.append(rel)
+        if rel == "package.json":
+            result.project_name = package_name(content)
+        await emit_progress({
+            "type": "file_generated",
+            "path": rel,
+            "size": len(content),
+            "index": len(result.files),
+            "project_dir": str(project_dir),
+        })
+
+    async def on_delta(delta: str) -> None:
+        for entry in parser.feed(delta):
+            await write_entry(entry)
+
+    try:
+        await stream_text(model=model, input=prompt, temperature=temperature, on_delta=on_delta, cache=cache)
+    except Exception as e:
+        if not result.files:
+            raise
+        logger.warning("Generation stream failed after %d files: %s", len(result.files), e)
+        result.error = e
+    result.complete = parser.complete
+    return result
@@ -1,14 +1,21 @@
+import asyncio
 import os
 
+
+def _write_file_sync(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
 async def write_file(path: str, content: str) -> str:
     """
     Ghi nội dung vào file. Tự động tạo thư mục nếu chưa tồn tại.
+    Ghi trong thread để không chặn event loop.
     (ĐÃ BỎ logic insert DB)
     """
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        await asyncio.to_thread(_write_file_sync, path, content)
         return f"File created at: {path}"
     except Exception as e:
         return f"Error writing file {path}: {str(e)}"
\ No newline at end of file
@@ -1,22 +1,35 @@
 # app/api/routers/chat_controller.py
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+import json
 import sys
 import os
 
 
 from app.ai_agent.app.graph import run_agent  # noqa: E402
+from app.ai_agent.app.utils.llm_cache import llm_cache_bypass
+from app.ai_agent.app.utils.progress import use_progress_sink
 
 router = APIRouter()
 
 
 @router.websocket("/ws/chat")
-async def websocket_chat(websocket: WebSocket):
+async def websocket_chat(
+    websocket: WebSocket,
+    progress: bool = Query(False, description="Gửi thêm frame JSON tiến độ (file_generated) trước câu trả lời"),
+    nocache: bool = Query(False, description="Không dùng response LLM đã cache (vẫn cập nhật cache)"),
+):
     await websocket.accept()
+
+    async def send_progress(event: dict):
+        await websocket.send_text(json.dumps(event, ensure_ascii=False))
+
     try:
         while True:
             data = await websocket.receive_text()
             try:
-                reply = await run_agent(data)  # LangGraph agent (async)
+                # client cũ hiển thị mọi frame như text -> chỉ gửi tiến độ khi được yêu cầu
+                with use_progress_sink(send_progress if progress else None), llm_cache_bypass(nocache):
+                    reply = await run_agent(data)  # LangGraph agent (async)
             except Exception as ex:
                 print("[ERROR]", ex)
                 # Không đóng socket, trả thông báo thân thiện
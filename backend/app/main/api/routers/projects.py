@@ -1,46 +1,102 @@
 from __future__ import annotations
+import asyncio
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import String, and_, literal, or_, select, text, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.deps import get_db
-from app.models.generated_project import GeneratedProject
-from app.schemas.generated_project import GeneratedProjectOut
+from app.db import search
+from app.db.deps import get_async_db
+from app.models.generated_project import GeneratedProject, GeneratedProjectFile, GeneratedProjectManifest
+from app.schemas.generated_project import GeneratedProjectFileOut, GeneratedProjectOut
+from app.services.archive_cache import ARCHIVE_CACHE, manifest_key
+from app.services.project_archive import (
+    ARCHIVE_DEFAULT_FORMAT,
+    FORMATS,
+    find_project_root,
+    format_available,
+    open_archive_stream,
+)
+from app.services.project_manifest import (
+    build_manifest,
+    read_with_sha256,
+    record_manifest,
+    refresh_manifest_entry,
+)
 
+import base64
+import binascii
+import json
+import mimetypes
 import os
 import tempfile
-import zipfile
 from pathlib import Path
-from typing import Optional
+from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def _encode_cursor(created_at_raw: str, id_: int) -> str:
+    raw = json.dumps([created_at_raw, id_], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        created_at_raw, id_ = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at_raw), int(id_)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/api/projects", response_model=List[GeneratedProjectOut])
-def list_projects(
-    db: Session = Depends(get_db),
+async def list_projects(
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(50, ge=1, le=500),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Cũ; dùng cursor thay thế"),
+    cursor: Optional[str] = Query(
+        None, description="Giá trị header X-Next-Cursor của trang trước"),
     q: Optional[str] = Query(
         None, description="Search by name or resource_path"),
 ):
-    query = db.query(GeneratedProject)
+    # created_at dạng chuỗi đúng như SQLite lưu, để so sánh keyset khớp tuyệt đối
+    created_raw = type_coerce(GeneratedProject.created_at, String)
+    query = select(GeneratedProject, created_raw.label("created_at_raw"))
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (GeneratedProject.name.ilike(like)) |
-            (GeneratedProject.resource_path.ilike(like))
-        )
-    items = (query
-             .order_by(GeneratedProject.created_at.desc().nullslast())
-             .offset(offset)
-             .limit(limit)
-             .all())
+        if search.FTS_ENABLED and len(q) >= search.FTS_MIN_QUERY:
+            matches = text(
+                f"SELECT rowid FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH :fts"
+            ).bindparams(fts=search.fts_query(q))
+            query = query.where(GeneratedProject.id.in_(matches))
+        else:
+            like = f"%{q}%"
+            query = query.where(
+                (GeneratedProject.name.ilike(like)) |
+                (GeneratedProject.resource_path.ilike(like))
+            )
+    if cursor:
+        # keyset: chỉ lấy các dòng sau (created_at, id) cuối của trang trước
+        after_created, after_id = _decode_cursor(cursor)
+        after_created_lit = literal(after_created, String)
+        query = query.where(or_(
+            created_raw < after_created_lit,
+            and_(created_raw == after_created_lit, GeneratedProject.id < after_id),
+        ))
+    query = query.order_by(GeneratedProject.created_at.desc(), GeneratedProject.id.desc())
+    if offset and not cursor:
+        query = query.offset(offset)
+    rows = (await db.execute(query.limit(limit + 1))).all()
+
+    items = [obj for obj, _ in rows[:limit]]
+    if len(rows) > limit:
+        last_obj, last_created = rows[limit - 1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last_created, last_obj.id)
     return items
 
 
@@ -53,38 +109,10 @@ def _is_subpath(child: Path, parent: Path) -> bool:
         return str(child_r).startswith(str(parent_r) + os.sep) or child_r == parent_r
 
 
-def _find_project_root(start: Path, max_up: int = 5) -> Path:
-    """
-    Leo lên tối đa max_up cấp để tìm thư mục có package.json.
-    Nếu không thấy, trả lại start.
-    """
-    cur = start
-    for _ in range(max_up + 1):
-        if (cur / "package.json").exists():
-            return cur
-        if cur.parent == cur:
-            break
-        cur = cur.parent
-    return start
-
-
-@router.get("/api/projects/{project_id}/download")
-def download_project_zip(
-    project_id: int,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
-    use_root: bool = Query(
-        True, description="Tự tìm thư mục gốc có package.json để zip"),
-):
-    # 1) Lấy record
-    obj: Optional[GeneratedProject] = db.get(GeneratedProject, project_id)
-    if not obj:
-        logger.warning("Download 404: project_id=%s not found", project_id)
-        raise HTTPException(status_code=404, detail="Project not found")
-
-    resource_path = Path(obj.resource_path)
+def _resolve_project_dir(raw_path: str, use_root: bool, project_id: int) -> Path:
+    resource_path = Path(raw_path)
     if use_root:
-        resource_path = _find_project_root(resource_path)
+        resource_path = find_project_root(resource_path)
 
     if not resource_path.exists():
         logger.warning(
@@ -97,7 +125,7 @@ def download_project_zip(
         raise HTTPException(
             status_code=404, detail=f"Resource path is not a directory: {resource_path}")
 
-    # 2) (Khuyến nghị) Giới hạn vùng cho phép nén
+    # (Khuyến nghị) Giới hạn vùng cho phép nén
     projects_base_env = os.getenv("PROJECTS_BASE_DIR")
     if projects_base_env:
         projects_base = Path(projects_base_env).resolve()
@@ -110,34 +138,142 @@ def download_project_zip(
                        resource_path, projects_base)
         raise HTTPException(
             status_code=403, detail="Path is outside allowed directory")
+    return resource_path
+
+
+@router.get("/api/projects/{project_id}/download")
+async def download_project_zip(
+    project_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    use_root: bool = Query(
+        True, description="Tự tìm thư mục gốc có package.json để zip"),
+    fmt: str = Query(
+        ARCHIVE_DEFAULT_FORMAT, alias="format",
+        description="zip | zip_store (không nén) | tar.zst (zstd đa luồng)"),
+):
+    if fmt not in FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Unsupported format: {fmt} (allowed: {', '.join(FORMATS)})")
+    if not format_available(fmt):
+        raise HTTPException(
+            status_code=400, detail=f"Format {fmt} is not available on this server")
+
+    # 1) Lấy record
+    obj: Optional[GeneratedProject] = await db.get(GeneratedProject, project_id)
+    if not obj:
+        logger.warning("Download 404: project_id=%s not found", project_id)
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    # 2) Kiểm tra đường dẫn (đụng filesystem -> chạy trong thread)
+    resource_path = await asyncio.to_thread(_resolve_project_dir, obj.resource_path, use_root, project_id)
+
+    # 3) Archive được cache theo hash manifest (path, size, mtime) + format: ETag = key.
+    #    Đã có trong cache -> gửi file (hỗ trợ Range để tải tiếp);
+    #    chưa có -> nén trong thread riêng, stream ngay, đồng thời ghi vào cache
+    #    (tối đa ARCHIVE_MAX_STREAMS download như vậy cùng lúc, quá thì 503).
+    archive_format = FORMATS[fmt]
+    filename = f"{resource_path.name}{archive_format.ext}"
+    key = await asyncio.to_thread(manifest_key, resource_path, resource_path.name, fmt)
+    etag = f'"{key}"'
+    headers = {
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}",
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+    }
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cached = await asyncio.to_thread(ARCHIVE_CACHE.get, key)
+    if cached is not None:
+        logger.info("Download OK (cached): id=%s -> %s", project_id, filename)
+        return FileResponse(path=str(cached), media_type=archive_format.media_type, headers=headers)
+
+    body = open_archive_stream(
+        lambda: ARCHIVE_CACHE.stream_and_store(resource_path, resource_path.name, key, fmt))
+    if body is None:
+        logger.warning("Download 503: id=%s, too many archives being built", project_id)
+        raise HTTPException(
+            status_code=503, detail="Too many downloads in progress, retry later",
+            headers={"Retry-After": "5"})
 
-    # 3) Tạo zip tạm
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp_zip_path = Path(tmp.name)
-    tmp.close()
-
-    # 4) Ghi zip: bao gồm tên folder gốc trong zip
-    with zipfile.ZipFile(tmp_zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for root, _, files in os.walk(resource_path):
-            for fname in files:
-                fpath = Path(root) / fname
-                arcname = Path(resource_path.name) / \
-                    fpath.relative_to(resource_path)
-                zf.write(fpath, arcname)
-
-    # 5) Trả file + xóa sau khi gửi xong
-    def _cleanup(p: str):
-        try:
-            os.remove(p)
-        except OSError:
-            pass
-
-    background_tasks.add_task(_cleanup, str(tmp_zip_path))
-    filename = f"{resource_path.name}.zip"
     logger.info("Download OK: id=%s -> %s", project_id, filename)
-    return FileResponse(
-        path=str(tmp_zip_path),
-        media_type="application/zip",
-        filename=filename,
-        background=background_tasks,
+    return StreamingResponse(body, media_type=archive_format.media_type, headers=headers)
+
+
+async def _get_project(db: AsyncSession, project_id: int) -> GeneratedProject:
+    obj: Optional[GeneratedProject] = await db.get(GeneratedProject, project_id)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return obj
+
+
+@router.get("/api/projects/{project_id}/files", response_model=List[GeneratedProjectFileOut])
+async def list_project_files(project_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Danh sách file theo manifest trong DB (không duyệt thư mục)."""
+    obj = await _get_project(db, project_id)
+    rows = (await db.execute(
+        select(GeneratedProjectFile)
+        .where(GeneratedProjectFile.project_id == project_id)
+        .order_by(GeneratedProjectFile.path)
+    )).scalars().all()
+    if rows:
+        return rows
+    if await db.get(GeneratedProjectManifest, project_id) is not None:
+        return rows  # manifest đã ghi, project không có file nào
+
+    # Project tạo trước khi có manifest: build một lần từ đĩa rồi lưu lại
+    resource_path = await asyncio.to_thread(_resolve_project_dir, obj.resource_path, False, project_id)
+    entries = await asyncio.to_thread(build_manifest, resource_path)
+    await record_manifest(project_id, entries)
+    logger.info("Manifest backfilled: id=%s (%d files)", project_id, len(entries))
+    return [e._asdict() for e in entries]
+
+
+@router.get("/api/projects/{project_id}/files/{file_path:path}")
+async def get_project_file(
+    project_id: int,
+    file_path: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Trả về nội dung một file có trong manifest; ETag = sha256 của đúng các byte
+    gửi đi. File đã bị sửa trên đĩa thì manifest được cập nhật theo.
+    """
+    obj = await _get_project(db, project_id)
+    entry: Optional[GeneratedProjectFile] = (await db.execute(
+        select(GeneratedProjectFile).where(
+            GeneratedProjectFile.project_id == project_id,
+            GeneratedProjectFile.path == file_path,
+        )
+    )).scalar_one_or_none()
+    if entry is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    root = await asyncio.to_thread(_resolve_project_dir, obj.resource_path, False, project_id)
+    path = root / entry.path
+    if not _is_subpath(path, root):
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    try:
+        data, digest = await asyncio.to_thread(read_with_sha256, path)
+    except OSError:
+        logger.warning("File 404: %s missing on disk (id=%s)", path, project_id)
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    if digest != entry.sha256 or len(data) != entry.size:
+        logger.info("Manifest entry refreshed: id=%s %s", project_id, entry.path)
+        await refresh_manifest_entry(entry.id, len(data), digest)
+
+    etag = f'"{digest}"'
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    media_type = mimetypes.guess_type(entry.path)[0] or "application/octet-stream"
+    if entry.language not in (None, "image", "svg"):
+        # mã nguồn trả dạng text (mimetypes đoán .ts là video/mp2t; html không được render)
+        media_type = "text/plain; charset=utf-8"
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
     )
@@ -1,20 +1,88 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
 # Đường dẫn file SQLite
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "app.db")
+DB_PATH = os.getenv("SQLITE_PATH") or os.path.join(BASE_DIR, "app.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
 
-# Kết nối engine
+# Pragma cho mỗi connection. WAL: reader không chặn writer (và ngược lại);
+# synchronous=NORMAL đủ an toàn với WAL (chỉ mất transaction cuối khi mất điện);
+# busy_timeout: chờ lock thay vì lỗi "database is locked" ngay.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))       # 64 MiB / connection
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 256 MiB
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    "cache_size": -SQLITE_CACHE_SIZE_KB,  # số âm = KiB
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+def _apply_pragmas(dbapi_connection, _connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+# Kết nối engine (sync: startup, script, agent thread)
 # connect_args={"check_same_thread": False} bắt buộc cho SQLite dùng nhiều thread
 engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=int(os.getenv("SQLITE_POOL_SIZE", "8")),
+    max_overflow=int(os.getenv("SQLITE_POOL_OVERFLOW", "8")),
+)
+event.listen(engine, "connect", _apply_pragmas)
+
+# Engine async (aiosqlite) cho router API: không chiếm threadpool của FastAPI
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=int(os.getenv("SQLITE_POOL_SIZE", "8")),
+    max_overflow=int(os.getenv("SQLITE_POOL_OVERFLOW", "8")),
+)
+event.listen(async_engine.sync_engine, "connect", _apply_pragmas)
+
+
+# Engine riêng cho DB_WRITER (db/writer.py), một connection. Driver sqlite3
+# mặc định tự mở transaction theo kiểu riêng: không BEGIN trước SAVEPOINT, nên
+# mỗi savepoint của batch tự commit. Ở đây tắt cơ chế đó và tự phát
+# BEGIN IMMEDIATE: cả batch là một transaction, giữ write lock từ đầu (không
+# bị SQLITE_BUSY khi nâng từ đọc lên ghi). Hai engine trên giữ hành vi mặc
+# định: transaction chỉ đọc không mở snapshot kéo dài.
+def _manual_transactions(dbapi_connection, _connection_record):
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+writer_engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+    pool_size=1,
+    max_overflow=0,
 )
+event.listen(writer_engine, "connect", _manual_transactions)
+event.listen(writer_engine, "connect", _apply_pragmas)
+event.listen(writer_engine, "begin", _begin_immediate)
 
 # Tạo SessionLocal để query
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+WriterSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=writer_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Base class cho models
 Base = declarative_base()
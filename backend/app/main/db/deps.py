@@ -1,4 +1,4 @@
-from app.db.database import SessionLocal
+from app.db.database import AsyncSessionLocal, SessionLocal
 from sqlalchemy.orm import Session
 
 def get_db():
@@ -6,4 +6,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
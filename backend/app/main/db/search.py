@@ -0,0 +1,89 @@
+"""
+Full-text search cho generated_projects (SQLite FTS5, tokenizer trigram).
+
+Bảng ảo generated_projects_fts là external-content table trỏ vào
+generated_projects (content_rowid = id), được đồng bộ bằng trigger nên mọi
+đường ghi (API, agent, script) đều cập nhật index. Trigram cho phép tìm chuỗi
+con giống `ilike('%q%')` cũ nhưng không phải quét cả bảng.
+
+Vị trí file: backend/app/db/search.py
+"""
+
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "generated_projects_fts"
+# trigram chỉ khớp được chuỗi >= 3 ký tự; ngắn hơn thì dùng LIKE
+FTS_MIN_QUERY = 3
+
+# Bật sau khi ensure_project_search() tạo được bảng (SQLite >= 3.34 có trigram)
+FTS_ENABLED = False
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, resource_path,
+        content='generated_projects', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS generated_projects_fts_ai AFTER INSERT ON generated_projects BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, resource_path) VALUES (new.id, new.name, new.resource_path);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS generated_projects_fts_ad AFTER DELETE ON generated_projects BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, resource_path)
+        VALUES ('delete', old.id, old.name, old.resource_path);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS generated_projects_fts_au AFTER UPDATE OF name, resource_path ON generated_projects BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, resource_path)
+        VALUES ('delete', old.id, old.name, old.resource_path);
+        INSERT INTO {FTS_TABLE}(rowid, name, resource_path) VALUES (new.id, new.name, new.resource_path);
+    END
+    """,
+]
+
+# index cho phân trang keyset (ORDER BY created_at DESC, id DESC); create_all
+# không thêm index vào bảng đã tồn tại nên tạo ở đây
+_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_generated_projects_created_at_id ON generated_projects (created_at, id)",
+]
+
+
+def ensure_project_search(engine: Engine) -> bool:
+    """Tạo index + bảng FTS + trigger nếu chưa có; rebuild FTS lần đầu. Gọi lúc startup."""
+    global FTS_ENABLED
+    with engine.begin() as conn:
+        for ddl in _INDEXES:
+            conn.execute(text(ddl))
+    try:
+        with engine.begin() as conn:
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": FTS_TABLE}
+            ).first() is not None
+            for ddl in _DDL:
+                conn.execute(text(ddl))
+            if not existed:
+                # đánh index cho dữ liệu có sẵn
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except Exception as e:  # SQLite build không có FTS5/trigram
+        logger.warning("FTS5 trigram unavailable, search falls back to LIKE: %s", e)
+        FTS_ENABLED = False
+        return False
+    FTS_ENABLED = True
+    return True
+
+
+def fts_query(q: str) -> str:
+    """Chuỗi MATCH: cả q là một phrase (trigram khớp chuỗi con, không phân biệt hoa thường)."""
+    return '"' + q.replace('"', '""') + '"'
@@ -0,0 +1,167 @@
+"""
+Single-writer cho SQLite: mọi thao tác ghi của agent đi qua một hàng đợi, do
+một thread riêng xử lý.
+
+Thread gom các thao tác đang chờ (tối đa DB_WRITER_MAX_BATCH, chờ thêm tối đa
+DB_WRITER_MAX_WAIT_MS sau thao tác đầu) vào MỘT transaction, nên khi sinh
+nhiều project cùng lúc chỉ tốn một lần commit/fsync cho cả batch và không có
+nhiều connection tranh nhau write lock. Mỗi thao tác chạy trong savepoint
+riêng: thao tác lỗi chỉ làm hỏng future của nó, phần còn lại của batch vẫn
+được commit. Connection của thread ghi (writer_engine) tự phát BEGIN IMMEDIATE,
+nên savepoint nằm trong transaction của batch thay vì tự commit.
+
+    fut = DB_WRITER.submit(lambda s: ...)       # concurrent.futures.Future
+    new_id = await DB_WRITER.run(lambda s: ...)  # từ event loop
+
+Vị trí file: backend/app/db/writer.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.database import WriterSessionLocal
+
+logger = logging.getLogger(__name__)
+
+DB_WRITER_MAX_BATCH = int(os.getenv("DB_WRITER_MAX_BATCH", "64"))
+DB_WRITER_MAX_WAIT_MS = float(os.getenv("DB_WRITER_MAX_WAIT_MS", "5"))
+
+WriteOp = Callable[[Session], Any]
+
+
+class _Job(NamedTuple):
+    op: WriteOp
+    future: Future
+
+
+_STOP = object()
+
+
+class DBWriter:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        *,
+        max_batch: int = DB_WRITER_MAX_BATCH,
+        max_wait: float = DB_WRITER_MAX_WAIT_MS / 1000,
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.ops = 0
+        self.failed = 0
+        self.largest_batch = 0
+
+    # ---- phía gọi ----
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, op: WriteOp) -> Future:
+        """
+        Đưa `op(session)` vào hàng đợi. Kết quả (ví dụ id mới sau flush) được trả
+        qua future sau khi batch chứa nó đã commit.
+        """
+        self.start()
+        fut: Future = Future()
+        self._queue.put(_Job(op, fut))
+        return fut
+
+    async def run(self, op: WriteOp) -> Any:
+        return await asyncio.wrap_future(self.submit(op))
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Ghi nốt các thao tác đang chờ rồi dừng thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "ops": self.ops,
+            "failed": self.failed,
+            "largest_batch": self.largest_batch,
+        }
+
+    # ---- thread ghi ----
+    def _collect(self, first: _Job) -> tuple[list[_Job], bool]:
+        batch, stop = [first], False
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch, stop = self._collect(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list[_Job]) -> None:
+        results: list[tuple[_Job, Any, Optional[BaseException]]] = []
+        session = self.session_factory()
+        try:
+            for job in batch:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        results.append((job, job.op(session), None))
+                except Exception as e:  # noqa: BLE001 - lỗi thuộc về future của op
+                    results.append((job, None, e))
+            session.commit()
+        except Exception as e:  # commit lỗi: cả batch thất bại
+            session.rollback()
+            logger.exception("DB writer batch of %d failed", len(batch))
+            results = [(job, None, err or e) for job, _, err in results]
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.ops += len(results)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for job, value, err in results:
+            if err is not None:
+                self.failed += 1
+                job.future.set_exception(err)
+            else:
+                job.future.set_result(value)
+
+
+DB_WRITER = DBWriter(WriterSessionLocal)
+atexit.register(DB_WRITER.stop)
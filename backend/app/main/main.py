@@ -1,11 +1,32 @@
 # app/main.py
+import asyncio
+import os
+from collections import Counter
+from typing import Optional
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api.routers.chat import router as chat_router
 from app.api.routers.projects import router as projects_router
+from app.ai_agent.app.utils.llm import close_llm_client
+from app.ai_agent.app.utils.llm_cache import LLM_CACHE
+
+from app.db.database import Base, async_engine, engine
+from app.db.search import ensure_project_search
+from app.db.writer import DB_WRITER
+from app.services.archive_cache import ARCHIVE_CACHE
+from app.services.project_archive import ARCHIVE_STREAMS
+from app.utils.loop_watchdog import LoopWatchdog
+
+# Watchdog phát hiện code đồng bộ chặn event loop (OpenAI sync, SQLite...), mặc định tắt
+LOOP_WATCHDOG = (os.getenv("LOOP_WATCHDOG") or "0").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_BLOCK_LOG_REPEAT = float(os.getenv("LOOP_BLOCK_LOG_REPEAT", "60"))
 
-from app.db.database import Base, engine
+watchdog: Optional[LoopWatchdog] = None
+blocking_sites: Counter = Counter()
 
 app = FastAPI()
 app.include_router(chat_router)
@@ -18,14 +39,73 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # phân trang /api/projects
 )
 
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
+    global watchdog
     Base.metadata.create_all(bind=engine)
+    ensure_project_search(engine)
+    DB_WRITER.start()
+    if LOOP_WATCHDOG:
+        watchdog = LoopWatchdog(
+            LOOP_BLOCK_THRESHOLD_MS / 1000,
+            repeat=LOOP_BLOCK_LOG_REPEAT,
+            on_stack=lambda site: blocking_sites.update([site]),
+        )
+        watchdog.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if watchdog is not None:
+        await watchdog.stop()
+    await asyncio.to_thread(DB_WRITER.stop)  # ghi nốt hàng đợi
+    await close_llm_client()
+    await async_engine.dispose()
 
 
 @app.get("/")
 def root():
     return {"message": "SQLite + SQLAlchemy ready!"}
+
+
+@app.get("/healthz")
+def healthz():
+    return {
+        "ok": True,
+        "loop_watchdog": watchdog.stats() if watchdog else None,
+        "archive_cache": ARCHIVE_CACHE.stats(),
+        "archive_streams": ARCHIVE_STREAMS.stats(),
+        "db_writer": DB_WRITER.stats(),
+        "llm_cache": LLM_CACHE.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Số lần event loop bị chặn, cache LLM (Prometheus text format)."""
+    lines = []
+    cache = LLM_CACHE.stats()
+    for name in ("hits", "misses", "stores", "evictions", "bypassed"):
+        lines += [
+            f"# TYPE backend_llm_cache_{name}_total counter",
+            f"backend_llm_cache_{name}_total {cache[name]}",
+        ]
+    if cache["bytes"] is not None:
+        lines += ["# TYPE backend_llm_cache_bytes gauge", f"backend_llm_cache_bytes {cache['bytes']}"]
+    if watchdog is not None:
+        stats = watchdog.stats()
+        lines += [
+            "# TYPE backend_event_loop_stalls_total counter",
+            f"backend_event_loop_stalls_total {stats['stalls']}",
+            "# TYPE backend_event_loop_max_stall_seconds gauge",
+            f"backend_event_loop_max_stall_seconds {stats['max_stall_ms'] / 1000}",
+            "# TYPE backend_event_loop_blocking_calls_total counter",
+        ]
+        for site, n in sorted(blocking_sites.items()):
+            site = site.replace("\\", "/").replace('"', "'")
+            lines.append(f'backend_event_loop_blocking_calls_total{{site="{site}"}} {n}')
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -12,3 +13,43 @@ class GeneratedProject(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_by = Column(String, nullable=True)
     updated_by = Column(String, nullable=True)
+
+    # manifest file của project (ghi lúc tạo project), sắp theo path
+    files = relationship(
+        "GeneratedProjectFile",
+        back_populates="project",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="GeneratedProjectFile.path",
+    )
+
+    __table_args__ = (
+        # phân trang keyset: ORDER BY created_at DESC, id DESC
+        Index("ix_generated_projects_created_at_id", "created_at", "id"),
+    )
+
+
+class GeneratedProjectFile(Base):
+    __tablename__ = "generated_project_files"
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, ForeignKey("generated_projects.id", ondelete="CASCADE"), nullable=False)
+    path = Column(String, nullable=False)      # đường dẫn tương đối, dùng "/"
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    language = Column(String, nullable=True)
+
+    project = relationship("GeneratedProject", back_populates="files")
+
+    __table_args__ = (
+        # cũng là index cho "list file của project" (ORDER BY path)
+        UniqueConstraint("project_id", "path", name="uq_generated_project_files_project_path"),
+    )
+
+
+class GeneratedProjectManifest(Base):
+    """Đánh dấu manifest của project đã được ghi (kể cả khi rỗng), để không backfill lại."""
+    __tablename__ = "generated_project_manifests"
+
+    project_id = Column(Integer, ForeignKey("generated_projects.id", ondelete="CASCADE"), primary_key=True)
+    built_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
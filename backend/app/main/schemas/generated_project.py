@@ -12,4 +12,13 @@ class GeneratedProjectOut(BaseModel):
     updated_by: str | None = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class GeneratedProjectFileOut(BaseModel):
+    path: str
+    size: int
+    sha256: str
+    language: str | None = None
+
+    class Config:
+        orm_mode = True
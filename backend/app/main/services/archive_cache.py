@@ -0,0 +1,216 @@
+"""
+Cache file nén của project trên đĩa, địa chỉ theo nội dung.
+
+Key = sha256 của manifest (đường dẫn, size, mtime của từng file sau khi lọc)
+cùng định dạng và tên thư mục gốc trong archive, nên project thay đổi thì key
+đổi, còn tải lại project cũ chỉ là gửi file có sẵn (FileResponse: ETag, Range).
+Dung lượng tổng bị giới hạn, file dùng lâu nhất bị xoá trước (LRU theo atime
+ghi bằng os.utime, giữ được qua lần khởi động lại).
+
+Vị trí file: backend/app/services/archive_cache.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.services.project_archive import (
+    ARCHIVE_DEFAULT_FORMAT,
+    ARCHIVE_EXCLUDES,
+    ARCHIVE_EXECUTOR,
+    FORMATS,
+    find_project_root,
+    format_available,
+    iter_project_files,
+    stream_archive,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CACHE_DIR = Path(
+    os.getenv("ARCHIVE_CACHE_DIR") or Path(tempfile.gettempdir()) / "project_archive_cache"
+)
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv("ARCHIVE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 2 GiB
+ARCHIVE_PREBUILD = (os.getenv("ARCHIVE_PREBUILD") or "1").lower() not in ("0", "false", "no")
+
+
+def manifest_key(root: Path, arc_prefix: str, fmt: str = "zip") -> str:
+    """Hash manifest của project (chỉ stat file, không đọc nội dung)."""
+    h = hashlib.sha256()
+    h.update(f"{fmt}\0{arc_prefix}\0{','.join(sorted(ARCHIVE_EXCLUDES))}\n".encode())
+    for f in iter_project_files(root):
+        h.update(f"{f.rel}\0{f.size}\0{f.mtime_ns}\n".encode())
+    return h.hexdigest()[:40]
+
+
+class ArchiveCache:
+    def __init__(self, directory: Path, max_bytes: int):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[str, int]]" = OrderedDict()  # key -> (tên file, size), cũ nhất trước
+        self._building: set[str] = set()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> None:
+        # gọi khi đang giữ _lock
+        if self._loaded:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        found = []
+        for p in self.dir.iterdir():
+            if p.name.startswith("."):
+                p.unlink(missing_ok=True)  # file tạm của lần build dở
+                continue
+            if any(p.name.endswith(f.ext) for f in FORMATS.values()):
+                st = p.stat()
+                found.append((st.st_atime, p.name.split(".", 1)[0], p.name, st.st_size))
+        for _, key, name, size in sorted(found):
+            self._entries[key] = (name, size)
+        self._loaded = True
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    def get(self, key: str) -> Optional[Path]:
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self.dir / self._entries[key][0]
+            if not path.exists():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        now = time.time()
+        try:
+            os.utime(path, (now, path.stat().st_mtime))
+        except OSError:
+            pass
+        return path
+
+    def _begin(self, key: str) -> bool:
+        with self._lock:
+            self._load()
+            if key in self._building or key in self._entries:
+                return False
+            self._building.add(key)
+            return True
+
+    def _commit(self, key: str, fmt: str, tmp: Path) -> Path:
+        path = self.dir / f"{key}{FORMATS[fmt].ext}"
+        os.replace(tmp, path)
+        with self._lock:
+            self._building.discard(key)
+            self._entries[key] = (path.name, path.stat().st_size)
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+        return path
+
+    def _abort(self, key: str, tmp: Path) -> None:
+        tmp.unlink(missing_ok=True)
+        with self._lock:
+            self._building.discard(key)
+
+    def _evict(self, keep: str) -> None:
+        # gọi khi đang giữ _lock
+        total = self.total_bytes
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            name, size = self._entries.pop(key)
+            total -= size
+            (self.dir / name).unlink(missing_ok=True)
+
+    def stream_and_store(self, root: Path, arc_prefix: str, key: str, fmt: str = "zip") -> Iterator[bytes]:
+        """
+        Stream archive cho client, đồng thời ghi vào cache. Nếu client ngắt giữa chừng
+        (GeneratorExit) thì bỏ file tạm. Key đang được build ở chỗ khác thì chỉ stream.
+        """
+        if not self._begin(key):
+            yield from stream_archive(root, arc_prefix, fmt)
+            return
+        fd, tmp_name = tempfile.mkstemp(prefix=f".{key}.", dir=self.dir)
+        tmp = Path(tmp_name)
+        ok = False
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in stream_archive(root, arc_prefix, fmt):
+                    out.write(chunk)
+                    yield chunk
+            ok = True
+        finally:
+            if ok:
+                self._commit(key, fmt, tmp)
+            else:
+                self._abort(key, tmp)
+
+    def build(self, root: Path, arc_prefix: str, fmt: str = "zip") -> Optional[Path]:
+        """Build đồng bộ (dùng cho pre-build, chạy trong ARCHIVE_EXECUTOR)."""
+        key = manifest_key(root, arc_prefix, fmt)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        for _ in self.stream_and_store(root, arc_prefix, key, fmt):
+            pass
+        return self.get(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "building": len(self._building),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+ARCHIVE_CACHE = ArchiveCache(ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MAX_BYTES)
+
+# giữ reference để task nền không bị GC
+_prebuild_tasks: set[asyncio.Task] = set()
+
+
+def schedule_prebuild(resource_path: str) -> None:
+    """
+    Build sẵn archive cho project vừa tạo (cùng root như khi tải với use_root=True).
+    Gọi từ event loop; việc nén chạy trong thread.
+    """
+    if not ARCHIVE_PREBUILD or not format_available(ARCHIVE_DEFAULT_FORMAT):
+        return
+
+    async def _run():
+        root = find_project_root(Path(resource_path))
+        if not root.is_dir():
+            return
+        try:
+            started = time.perf_counter()
+            path = await asyncio.get_running_loop().run_in_executor(
+                ARCHIVE_EXECUTOR, ARCHIVE_CACHE.build, root, root.name, ARCHIVE_DEFAULT_FORMAT
+            )
+            logger.info("Archive prebuilt %s -> %s (%.2fs)", root, path, time.perf_counter() - started)
+        except Exception:
+            logger.exception("Archive prebuild failed for %s", root)
+
+    task = asyncio.get_running_loop().create_task(_run())
+    _prebuild_tasks.add(task)
+    task.add_done_callback(_prebuild_tasks.discard)
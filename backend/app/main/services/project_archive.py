@@ -0,0 +1,355 @@
+"""
+Nén project để tải về, dạng stream: entry được ghi ra socket ngay khi tạo,
+không dùng file tạm, bộ nhớ giới hạn ở cỡ vài chunk.
+
+Định dạng (FORMATS):
+  - "zip":       DEFLATE, mặc định, mở được ở mọi nơi
+  - "zip_store": zip không nén, gần như không tốn CPU
+  - "tar.zst":   tar + zstd nén đa luồng (cần package `zstandard`)
+
+Mỗi download nén trực tiếp có thread producer riêng (zlib và zstd nhả GIL khi
+nén nên dùng được nhiều core): producer chờ theo tốc độ client mà không giữ
+worker của ARCHIVE_EXECUTOR (pool đó chỉ còn cho pre-build). Số download nén
+trực tiếp cùng lúc giới hạn bởi ARCHIVE_MAX_STREAMS, quá thì router trả 503.
+
+Vị trí file: backend/app/services/project_archive.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import stat
+import tarfile
+import threading
+import weakref
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, NamedTuple, Optional
+
+try:  # tuỳ chọn: chỉ cần cho tar.zst
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Thư mục bỏ qua khi nén (có thể tạo lại bằng npm install / build)
+DEFAULT_EXCLUDES = {
+    "node_modules", ".git", ".next", ".nuxt", ".svelte-kit", ".turbo", ".cache",
+    ".parcel-cache", ".vite", "dist", "build", "coverage", "__pycache__", ".venv",
+}
+ARCHIVE_EXCLUDES = {
+    d.strip() for d in (os.getenv("PROJECT_ARCHIVE_EXCLUDES") or ",".join(sorted(DEFAULT_EXCLUDES))).split(",")
+    if d.strip()
+}
+ARCHIVE_EXCLUDE_FILES = {".DS_Store", "Thumbs.db"}
+
+CHUNK_SIZE = 64 * 1024
+ZIP_LEVEL = int(os.getenv("ARCHIVE_ZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "3"))
+ZSTD_THREADS = int(os.getenv("ARCHIVE_ZSTD_THREADS", "-1"))  # -1 = số core
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", str(min(4, os.cpu_count() or 1))))
+ARCHIVE_QUEUE_CHUNKS = 8  # chunk nén sẵn chờ gửi, mỗi download
+ARCHIVE_MAX_STREAMS = int(os.getenv("ARCHIVE_MAX_STREAMS", "16"))  # download nén trực tiếp cùng lúc, 0 = không giới hạn
+
+
+class ArchiveFormat(NamedTuple):
+    ext: str
+    media_type: str
+
+
+FORMATS = {
+    "zip": ArchiveFormat(".zip", "application/zip"),
+    "zip_store": ArchiveFormat(".zip", "application/zip"),
+    "tar.zst": ArchiveFormat(".tar.zst", "application/zstd"),
+}
+ARCHIVE_DEFAULT_FORMAT = os.getenv("ARCHIVE_DEFAULT_FORMAT") or "zip"
+
+ARCHIVE_EXECUTOR = ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS, thread_name_prefix="archive")
+# file lớn hơn mức này cần zip64 (zipfile không biết trước size khi stream)
+_ZIP64_THRESHOLD = zipfile.ZIP64_LIMIT - CHUNK_SIZE
+
+
+def find_project_root(start: Path, max_up: int = 5) -> Path:
+    """
+    Leo lên tối đa max_up cấp để tìm thư mục có package.json.
+    Nếu không thấy, trả lại start.
+    """
+    cur = start
+    for _ in range(max_up + 1):
+        if (cur / "package.json").exists():
+            return cur
+        if cur.parent == cur:
+            break
+        cur = cur.parent
+    return start
+
+
+class ProjectFile(NamedTuple):
+    path: Path      # đường dẫn thật trên đĩa
+    rel: str        # đường dẫn tương đối (dùng "/")
+    size: int
+    mtime_ns: int
+
+
+def iter_project_files(root: Path, excludes: set[str] = ARCHIVE_EXCLUDES) -> Iterator[ProjectFile]:
+    """
+    Duyệt file của project theo thứ tự cố định (sorted), bỏ qua thư mục trong `excludes`.
+    Symlink chỉ được giữ nếu trỏ vào bên trong root.
+    """
+    root = root.resolve()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in excludes)
+        base = Path(dirpath)
+        for fname in sorted(filenames):
+            if fname in ARCHIVE_EXCLUDE_FILES:
+                continue
+            fpath = base / fname
+            try:
+                st = fpath.stat()
+                if fpath.is_symlink() and not fpath.resolve().is_relative_to(root):
+                    continue
+            except OSError:
+                continue  # file bị xoá trong lúc duyệt
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            yield ProjectFile(fpath, fpath.relative_to(root).as_posix(), st.st_size, st.st_mtime_ns)
+
+
+class _Sink:
+    """File-like không seek được: zipfile ghi vào, generator lấy bytes ra."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def write(self, data) -> int:
+        self._buf += data
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    @property
+    def pending(self) -> int:
+        # không dùng __len__: zipfile kiểm tra `if not self.fp`
+        return len(self._buf)
+
+    def drain(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+def stream_zip(
+    root: Path,
+    arc_prefix: str,
+    *,
+    compression: int = zipfile.ZIP_DEFLATED,
+    compresslevel: int | None = ZIP_LEVEL,
+    files: Iterator[ProjectFile] | None = None,
+) -> Iterator[bytes]:
+    """
+    Generator trả về từng chunk của file zip. Chạy đồng bộ: StreamingResponse sẽ
+    lặp nó trong threadpool nên không chặn event loop.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=compression, compresslevel=compresslevel) as zf:
+        for f in files if files is not None else iter_project_files(root):
+            try:
+                info = zipfile.ZipInfo.from_file(f.path, f"{arc_prefix}/{f.rel}" if arc_prefix else f.rel)
+                info.compress_type = compression
+                with open(f.path, "rb") as src, zf.open(info, "w", force_zip64=f.size > _ZIP64_THRESHOLD) as dst:
+                    while True:
+                        block = src.read(CHUNK_SIZE)
+                        if not block:
+                            break
+                        dst.write(block)
+                        if sink.pending >= CHUNK_SIZE:
+                            yield sink.drain()
+            except FileNotFoundError:
+                continue  # file bị xoá sau khi duyệt; entry chưa được mở
+            if sink.pending >= CHUNK_SIZE:
+                yield sink.drain()
+    tail = sink.drain()  # central directory
+    if tail:
+        yield tail
+
+
+def stream_tar_zst(
+    root: Path,
+    arc_prefix: str,
+    *,
+    level: int = ZSTD_LEVEL,
+    threads: int = ZSTD_THREADS,
+    files: Iterator[ProjectFile] | None = None,
+) -> Iterator[bytes]:
+    """
+    tar (PAX) nén zstd. Header/nội dung tar được ghi tay theo từng block thay vì
+    tarfile.addfile (đọc hết file một lần) để giữ bộ nhớ giới hạn.
+    """
+    if zstandard is None:
+        raise RuntimeError("tar.zst cần package zstandard")
+    sink = _Sink()
+    writer = zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(sink, closefd=False)
+    for f in files if files is not None else iter_project_files(root):
+        try:
+            src = open(f.path, "rb")
+        except FileNotFoundError:
+            continue
+        with src:
+            info = tarfile.TarInfo(f"{arc_prefix}/{f.rel}" if arc_prefix else f.rel)
+            info.size = f.size
+            info.mtime = f.mtime_ns // 1_000_000_000
+            info.mode = 0o644
+            writer.write(info.tobuf(format=tarfile.PAX_FORMAT))
+            remaining = f.size
+            while remaining > 0:
+                # đúng f.size byte: file bị sửa giữa chừng vẫn cho ra tar hợp lệ
+                block = src.read(min(CHUNK_SIZE, remaining)) or b"\0" * min(CHUNK_SIZE, remaining)
+                writer.write(block)
+                remaining -= len(block)
+                if sink.pending >= CHUNK_SIZE:
+                    yield sink.drain()
+            pad = -f.size % tarfile.BLOCKSIZE
+            if pad:
+                writer.write(b"\0" * pad)
+        if sink.pending >= CHUNK_SIZE:
+            yield sink.drain()
+    writer.write(b"\0" * (2 * tarfile.BLOCKSIZE))  # end-of-archive
+    writer.flush(zstandard.FLUSH_FRAME)
+    tail = sink.drain()
+    if tail:
+        yield tail
+
+
+def format_available(fmt: str) -> bool:
+    return fmt in FORMATS and (fmt != "tar.zst" or zstandard is not None)
+
+
+def stream_archive(root: Path, arc_prefix: str, fmt: str = "zip") -> Iterator[bytes]:
+    if fmt == "zip":
+        return stream_zip(root, arc_prefix)
+    if fmt == "zip_store":
+        return stream_zip(root, arc_prefix, compression=zipfile.ZIP_STORED, compresslevel=None)
+    if fmt == "tar.zst":
+        return stream_tar_zst(root, arc_prefix)
+    raise ValueError(f"unknown archive format: {fmt}")
+
+
+class _Done(NamedTuple):
+    error: BaseException | None
+
+
+class _StreamSlots:
+    """Đếm download đang nén trực tiếp (mỗi cái giữ một thread producer)."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[Callable[[], None]]:
+        """Hàm nhả slot (gọi nhiều lần cũng chỉ nhả một lần); None nếu đã đủ."""
+        with self._lock:
+            if self.limit and self.active >= self.limit:
+                self.rejected += 1
+                return None
+            self.active += 1
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            with self._lock:
+                if not released:
+                    released = True
+                    self.active -= 1
+
+        return release
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active": self.active, "max": self.limit, "rejected": self.rejected}
+
+
+ARCHIVE_STREAMS = _StreamSlots(ARCHIVE_MAX_STREAMS)
+
+
+async def aiter_in_thread(
+    make_iter: Callable[[], Iterator[bytes]],
+    on_close: Optional[Callable[[], None]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Chạy generator nén trong một thread riêng và chuyển chunk qua hàng đợi có giới
+    hạn: nén chunk kế tiếp trong lúc chunk trước đang được gửi. Client chậm chỉ
+    làm thread của chính nó chờ. Client ngắt thì generator được đóng (file tạm
+    của cache bị huỷ); `on_close` được gọi khi producer đã dừng hẳn.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=ARCHIVE_QUEUE_CHUNKS)
+    stop = threading.Event()
+    finished = loop.create_future()
+
+    def put(item) -> None:
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def produce() -> None:
+        try:
+            it = make_iter()
+            error = None
+            try:
+                for chunk in it:
+                    if stop.is_set():
+                        break
+                    put(chunk)
+            except BaseException as e:  # noqa: BLE001 - chuyển lỗi sang phía async
+                error = e
+            finally:
+                close = getattr(it, "close", None)
+                if close is not None:
+                    close()
+            if not stop.is_set():
+                put(_Done(error))
+        finally:
+            try:
+                loop.call_soon_threadsafe(finished.set_result, None)
+            except RuntimeError:  # loop đã đóng (tắt server)
+                pass
+
+    threading.Thread(target=produce, name="archive-stream", daemon=True).start()
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _Done):
+                if item.error is not None:
+                    raise item.error
+                break
+            yield item
+    finally:
+        stop.set()
+        while not queue.empty():  # nhả put đang chờ để producer thấy stop
+            queue.get_nowait()
+        try:
+            await asyncio.shield(finished)
+        finally:
+            if on_close is not None:
+                on_close()
+
+
+def open_archive_stream(make_iter: Callable[[], Iterator[bytes]]) -> Optional[AsyncIterator[bytes]]:
+    """
+    Giữ một slot ARCHIVE_MAX_STREAMS cho download nén trực tiếp; None khi đã đủ.
+    Slot được nhả khi stream kết thúc, hoặc khi body bị bỏ mà chưa từng chạy
+    (client ngắt trước byte đầu tiên).
+    """
+    release = ARCHIVE_STREAMS.try_acquire()
+    if release is None:
+        return None
+    body = aiter_in_thread(make_iter, on_close=release)
+    weakref.finalize(body, release)
+    return body
@@ -0,0 +1,110 @@
+"""
+Manifest file của project: đường dẫn tương đối, size, sha256, ngôn ngữ.
+
+Được ghi vào bảng generated_project_files khi agent tạo project, để gallery /
+preview liệt kê và đọc file theo index trong DB thay vì duyệt thư mục
+(và leo tìm package.json) mỗi lần.
+
+Vị trí file: backend/app/services/project_manifest.py
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+from pathlib import Path, PurePosixPath
+from typing import NamedTuple, Optional
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.db.writer import DB_WRITER
+from app.models.generated_project import GeneratedProjectFile, GeneratedProjectManifest
+from app.services.project_archive import CHUNK_SIZE, iter_project_files
+
+logger = logging.getLogger(__name__)
+
+# phần mở rộng -> ngôn ngữ (tên dùng được cho highlight ở frontend)
+LANGUAGES = {
+    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".jsx": "javascript",
+    ".ts": "typescript", ".mts": "typescript", ".cts": "typescript", ".tsx": "typescript",
+    ".vue": "vue", ".svelte": "svelte",
+    ".html": "html", ".htm": "html",
+    ".css": "css", ".scss": "scss", ".sass": "sass", ".less": "less",
+    ".json": "json", ".md": "markdown", ".mdx": "markdown",
+    ".yml": "yaml", ".yaml": "yaml", ".toml": "toml", ".xml": "xml",
+    ".svg": "svg", ".py": "python", ".sh": "shell",
+    ".png": "image", ".jpg": "image", ".jpeg": "image", ".gif": "image",
+    ".webp": "image", ".ico": "image",
+}
+SPECIAL_FILES = {"Dockerfile": "dockerfile", "Makefile": "makefile", ".gitignore": "ignore", ".env": "dotenv"}
+
+
+class ManifestEntry(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+    language: Optional[str]
+
+
+def detect_language(path: str) -> Optional[str]:
+    p = PurePosixPath(path)
+    if p.name in SPECIAL_FILES:
+        return SPECIAL_FILES[p.name]
+    return LANGUAGES.get(p.suffix.lower())
+
+
+def read_with_sha256(path: Path) -> tuple[bytes, str]:
+    """Nội dung file + sha256 của đúng các byte đó. Đồng bộ, gọi trong thread."""
+    data = path.read_bytes()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(CHUNK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def build_manifest(root: Path) -> list[ManifestEntry]:
+    """Duyệt + hash file của project (cùng bộ lọc như khi nén). Chạy đồng bộ, gọi trong thread."""
+    entries = []
+    for f in iter_project_files(root):
+        try:
+            digest = _sha256(f.path)
+        except OSError:
+            continue  # file bị xoá trong lúc duyệt
+        entries.append(ManifestEntry(f.rel, f.size, digest, detect_language(f.rel)))
+    return entries
+
+
+def replace_manifest_op(session: Session, project_id: int, entries: list[ManifestEntry]) -> int:
+    """Thao tác ghi cho DB_WRITER: thay toàn bộ manifest của project và đánh dấu đã có manifest."""
+    session.execute(delete(GeneratedProjectFile).where(GeneratedProjectFile.project_id == project_id))
+    session.add_all(
+        GeneratedProjectFile(project_id=project_id, path=e.path, size=e.size, sha256=e.sha256, language=e.language)
+        for e in entries
+    )
+    session.execute(
+        insert(GeneratedProjectManifest).values(project_id=project_id)
+        .on_conflict_do_update(index_elements=["project_id"], set_={"built_at": func.now()})
+    )
+    session.flush()
+    return len(entries)
+
+
+async def record_manifest(project_id: int, entries: list[ManifestEntry]) -> int:
+    return await DB_WRITER.run(lambda s: replace_manifest_op(s, project_id, entries))
+
+
+async def refresh_manifest_entry(entry_id: int, size: int, sha256: str) -> None:
+    """File trên đĩa đã đổi so với manifest: cập nhật size/sha256 của entry."""
+    await DB_WRITER.run(lambda s: s.execute(
+        update(GeneratedProjectFile).where(GeneratedProjectFile.id == entry_id).values(size=size, sha256=sha256)
+    ))
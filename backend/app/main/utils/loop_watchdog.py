@@ -0,0 +1,142 @@
+# backend/app/main/utils/loop_watchdog.py
+# Copy of run_code_agent/app/main/utils/loop_watchdog.py, which is canonical:
+# change that file and copy it here (the two services share no package).
+"""
+Event-loop watchdog: finds synchronous work that blocks the loop.
+
+A heartbeat task on the loop stamps a timestamp every `interval`. A daemon
+thread checks the stamp; once it is older than interval + threshold the loop
+is stuck in one callback, and the thread grabs the loop thread's stack with
+sys._current_frames() while the offending call is still running. The stack
+is logged at most once per `repeat` seconds for the same call site. The
+heartbeat reports the stall length when the loop comes back.
+
+    wd = LoopWatchdog(threshold=0.1, on_stall=lambda s: ..., on_stack=lambda st: ...)
+    wd.start()          # on the loop
+    ...
+    await wd.stop()
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Optional
+
+log = logging.getLogger("loop_watchdog")
+
+
+class LoopWatchdog:
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        *,
+        repeat: float = 60.0,
+        stack_limit: int = 40,
+        on_stall: Optional[Callable[[float], None]] = None,
+        on_stack: Optional[Callable[[str], None]] = None,
+    ):
+        self.threshold = threshold
+        self.interval = max(0.01, threshold / 4)
+        self.repeat = repeat
+        self.stack_limit = stack_limit
+        self.on_stall = on_stall      # called on the loop with the stall length (seconds)
+        self.on_stack = on_stack      # called from the watchdog thread with the blocking call site
+        self.stalls = 0
+        self.stacks = 0
+        self.max_stall = 0.0
+        self.last_stack: Optional[dict[str, Any]] = None
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_tid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._seen: dict[str, float] = {}  # call site -> last time its stack was logged
+
+    # ---- loop side ----
+    def start(self) -> None:
+        """Start the heartbeat and the watchdog thread (call from the loop thread)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_tid = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat(), name="loop_watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+        self._task = self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            before = time.monotonic()
+            self._beat = before
+            await asyncio.sleep(self.interval)
+            stall = time.monotonic() - before - self.interval
+            if stall >= self.threshold:
+                self.stalls += 1
+                self.max_stall = max(self.max_stall, stall)
+                if self.on_stall is not None:
+                    with contextlib.suppress(Exception):
+                        self.on_stall(stall)
+
+    # ---- watchdog thread ----
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if beat == reported_beat:
+                continue  # this stall has been captured already
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold:
+                continue
+            reported_beat = beat
+            with contextlib.suppress(Exception):
+                self._capture(blocked)
+
+    def _capture(self, blocked: float) -> None:
+        frame = sys._current_frames().get(self._loop_tid)
+        if frame is None:
+            return
+        summary = traceback.extract_stack(frame, limit=self.stack_limit)
+        site = f"{summary[-1].filename}:{summary[-1].lineno}" if summary else "?"
+        task_name = None
+        with contextlib.suppress(Exception):
+            task = asyncio.current_task(self._loop)
+            task_name = task.get_name() if task is not None else None
+        self.stacks += 1
+        now = time.monotonic()
+        self.last_stack = {"site": site, "task": task_name, "blocked_ms": round(blocked * 1000), "at": time.time()}
+        if self.on_stack is not None:
+            with contextlib.suppress(Exception):
+                self.on_stack(site)
+        if now - self._seen.get(site, -self.repeat) < self.repeat:
+            log.warning("event loop blocked >%dms at %s (task %s; stack logged earlier)", blocked * 1000, site, task_name)
+            return
+        self._seen[site] = now
+        if len(self._seen) > 256:
+            self._seen = {k: t for k, t in self._seen.items() if now - t < self.repeat}
+        log.warning(
+            "event loop blocked >%dms (task %s), blocking call:\n%s",
+            blocked * 1000, task_name, "".join(traceback.format_list(summary)).rstrip(),
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "threshold_ms": round(self.threshold * 1000),
+            "stalls": self.stalls,
+            "stacks_captured": self.stacks,
+            "max_stall_ms": round(self.max_stall * 1000),
+            "last_stack": self.last_stack,
+        }
@@ -0,0 +1,96 @@
+"""
+Benchmark định dạng archive cho /api/projects/{id}/download, để chọn
+ARCHIVE_DEFAULT_FORMAT / level.
+
+Chạy từ thư mục chứa package `app` (giống uvicorn), ví dụ:
+
+    python ../bench/archive_formats.py /tmp/react_project/react_project_20250101_120000_000 \
+        --zip-levels 1,6 --zstd-levels 1,3,9 --repeat 3 > formats.json
+
+Mỗi biến thể nén toàn bộ project (cùng bộ lọc node_modules, .git ... như khi
+tải) vào bộ nhớ rồi bỏ đi; in JSON: thời gian (median), CPU time, kích thước,
+tỉ lệ nén và tốc độ MB/s theo dữ liệu đầu vào.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+from app.services import project_archive as pa
+
+
+def _variants(args) -> list[tuple[str, callable]]:
+    out = []
+    for lvl in args.zip_levels:
+        out.append((f"zip/l{lvl}", lambda root, lvl=lvl: pa.stream_zip(root, root.name, compresslevel=lvl)))
+    out.append(("zip_store", lambda root: pa.stream_zip(root, root.name, compression=zipfile.ZIP_STORED, compresslevel=None)))
+    if pa.zstandard is not None:
+        for lvl in args.zstd_levels:
+            for threads in args.zstd_threads:
+                out.append((
+                    f"tar.zst/l{lvl}/t{threads}",
+                    lambda root, lvl=lvl, threads=threads: pa.stream_tar_zst(root, root.name, level=lvl, threads=threads),
+                ))
+    return out
+
+
+def _run_once(make) -> tuple[float, float, int]:
+    wall, cpu = time.perf_counter(), time.process_time()
+    size = 0
+    for chunk in make():
+        size += len(chunk)
+    return time.perf_counter() - wall, time.process_time() - cpu, size
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("project", type=Path)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--zip-levels", type=lambda s: [int(x) for x in s.split(",")], default=[1, 6])
+    ap.add_argument("--zstd-levels", type=lambda s: [int(x) for x in s.split(",")], default=[1, 3, 9])
+    ap.add_argument("--zstd-threads", type=lambda s: [int(x) for x in s.split(",")], default=[0, -1])
+    args = ap.parse_args()
+
+    root = pa.find_project_root(args.project.resolve())
+    files = list(pa.iter_project_files(root))
+    input_bytes = sum(f.size for f in files)
+
+    results = []
+    for name, variant in _variants(args):
+        runs = [_run_once(lambda: variant(root)) for _ in range(max(1, args.repeat))]
+        wall = statistics.median(r[0] for r in runs)
+        cpu = statistics.median(r[1] for r in runs)
+        size = runs[-1][2]
+        results.append({
+            "format": name,
+            "seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "bytes": size,
+            "ratio": round(size / input_bytes, 4) if input_bytes else None,
+            "input_mb_per_s": round(input_bytes / wall / 1e6, 1) if wall > 0 else None,
+        })
+        print(f"{name:>20}  {wall:7.3f}s  cpu {cpu:7.3f}s  {size / 1e6:9.2f} MB", file=sys.stderr)
+
+    json.dump({
+        "project": str(root),
+        "files": len(files),
+        "input_bytes": input_bytes,
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "zstandard": getattr(pa.zstandard, "__version__", None),
+        "results": results,
+    }, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,14 @@
 # app/main/config.py
 from __future__ import annotations
 import os
+import socket
 from pathlib import Path
 
 WORKSPACE_ROOT = Path(os.getenv("WORKSPACE_ROOT", "/tmp/workspaces")).resolve()
 WORKSPACE_ROOT.mkdir(parents=True, exist_ok=True)
 
-# Command to start a user's dev server
+# Command to start a user's dev server. "{base}" is replaced by the session's preview
+# path (/preview/<id>/), e.g. "npm install && npm run dev -- --base {base}" for Vite.
 DEV_CMD = os.getenv("DEV_CMD") or "npm install && npm run dev"
 
 DEFAULT_EXCLUDES = {".git", "node_modules", ".next", "dist", "build", "__pycache__"}
@@ -14,6 +16,85 @@ DEFAULT_EXCLUDES = {".git", "node_modules", ".next", "dist", "build", "__pycache
 # I/O limits (bytes)
 MAX_READ_BYTES = int(os.getenv("MAX_READ_BYTES", "1048576"))   # 1 MiB
 MAX_WRITE_BYTES = int(os.getenv("MAX_WRITE_BYTES", "2097152")) # 2 MiB
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "200"))      # paths per read_files/write_files
+
+# In-memory cache of decoded file contents (served to read_file/read_files)
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", "67108864"))  # 64 MiB
+CONTENT_CACHE_MAX_ENTRIES = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "4096"))
+
+# Workspace search index (search_files / search_text)
+SEARCH_MAX_FILE_BYTES = int(os.getenv("SEARCH_MAX_FILE_BYTES", "524288"))       # 512 KiB per file
+# trigram postings (not file text) held in memory: per workspace, and for all workspaces together
+SEARCH_MAX_INDEX_BYTES = int(os.getenv("SEARCH_MAX_INDEX_BYTES", "67108864"))   # 64 MiB per workspace
+SEARCH_MAX_TOTAL_INDEX_BYTES = int(os.getenv("SEARCH_MAX_TOTAL_INDEX_BYTES", "536870912"))  # 512 MiB
+SEARCH_MAX_WORKSPACES = int(os.getenv("SEARCH_MAX_WORKSPACES", "32"))
+SEARCH_FILE_TIMEOUT_MS = float(os.getenv("SEARCH_FILE_TIMEOUT_MS", "200"))      # per candidate file
+SEARCH_QUERY_TIMEOUT_MS = float(os.getenv("SEARCH_QUERY_TIMEOUT_MS", "10000"))  # whole search_text
+SEARCH_REGEX_MAX_LINE = int(os.getenv("SEARCH_REGEX_MAX_LINE", "2000"))         # chars of a line a regex sees
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "1000"))
+SEARCH_RESULT_CHUNK = int(os.getenv("SEARCH_RESULT_CHUNK", "100"))
+
+# Workspace snapshots; keep on the same filesystem as WORKSPACE_ROOT so reflinks work
+SNAPSHOT_ROOT = Path(os.getenv("SNAPSHOT_ROOT", str(WORKSPACE_ROOT / ".snapshots"))).resolve()
+SNAPSHOT_MAX_PER_WORKSPACE = int(os.getenv("SNAPSHOT_MAX_PER_WORKSPACE", "20"))
+
+# Per-workspace disk quota (0 = unlimited). QUOTA_ACTION: "reject" or "evict" (delete regenerable dirs first)
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", "0"))
+QUOTA_ACTION = (os.getenv("QUOTA_ACTION") or "reject").lower()
+QUOTA_EVICT_DIRS = {d.strip() for d in (os.getenv("QUOTA_EVICT_DIRS") or ".next,dist,build,__pycache__").split(",") if d.strip()}
+# excluded dirs (node_modules ...) are re-measured this long after the last install-done event
+USAGE_REFRESH_DEBOUNCE = float(os.getenv("USAGE_REFRESH_DEBOUNCE", "5"))
+
+# Shared session state: "memory" (single worker), "sqlite" (workers on one host) or "redis"
+STATE_BACKEND = (os.getenv("STATE_BACKEND") or "memory").lower()
+STATE_SQLITE_PATH = Path(os.getenv("STATE_SQLITE_PATH", str(WORKSPACE_ROOT / ".state" / "state.sqlite3"))).resolve()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STATE_LOCK_TTL = float(os.getenv("STATE_LOCK_TTL", "30"))  # seconds; setup lock lease
+AFFINITY_TTL = float(os.getenv("AFFINITY_TTL", "60"))      # seconds; refreshed by keepalive pings
+SESSION_TTL = float(os.getenv("SESSION_TTL", "300"))       # seconds; session ownership, refreshed by keepalive pings
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Bearer token for operator endpoints (/admin/*) that expose per-workspace detail;
+# unset disables them. /healthz only ever reports aggregates.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Dev process admission (per worker; 0 = unlimited) and speculative pre-start.
+# PRESTART_DEV starts install + dev server right after setup/init; logs are buffered
+# (last DEV_LOG_BACKLOG lines) until the client sends start_dev.
+MAX_DEV_PROCESSES = int(os.getenv("MAX_DEV_PROCESSES", "0"))
+PRESTART_DEV = (os.getenv("PRESTART_DEV") or "0").lower() in ("1", "true", "yes")
+PRESTART_HEADROOM = int(os.getenv("PRESTART_HEADROOM", "2"))            # slots kept free for explicit start_dev
+PRESTART_MAX_LOAD = float(os.getenv("PRESTART_MAX_LOAD", "0.75"))       # 1-min loadavg per core
+PRESTART_IDLE_TIMEOUT = float(os.getenv("PRESTART_IDLE_TIMEOUT", "600"))  # stop if never claimed (seconds)
+DEV_LOG_BACKLOG = int(os.getenv("DEV_LOG_BACKLOG", "2000"))
+
+# Resource limits for dev processes. DEV_SANDBOX: "off", "cgroup" (cgroup v2; falls back to
+# rlimits when unavailable) or "rlimit". DEV_CGROUP_ROOT should be a delegated cgroup
+# (systemd Delegate=yes); by default the server's own cgroup is used.
+DEV_SANDBOX = (os.getenv("DEV_SANDBOX") or "off").lower()
+DEV_CGROUP_ROOT = os.getenv("DEV_CGROUP_ROOT") or None
+DEV_CPU_WEIGHT = int(os.getenv("DEV_CPU_WEIGHT", "100"))               # cgroup cpu.weight, 1..10000
+DEV_CPU_MAX_CORES = float(os.getenv("DEV_CPU_MAX_CORES", "0"))         # hard cap in cores (0 = none)
+DEV_MEMORY_MAX = int(os.getenv("DEV_MEMORY_MAX", str(2 * 1024**3)))    # bytes (0 = none)
+DEV_PIDS_MAX = int(os.getenv("DEV_PIDS_MAX", "512"))                   # 0 = none
+
+# Dev-server preview proxy: /preview/{session_id}/... -> PREVIEW_UPSTREAM_HOST:dev_port
+PREVIEW_UPSTREAM_HOST = os.getenv("PREVIEW_UPSTREAM_HOST", "localhost")
+# off: the dev server is expected to serve under PREVIEW_BASE_PATH itself (Vite `base`,
+# Next `basePath`), so root-absolute asset and HMR URLs stay inside the preview.
+# on: only for apps that use relative URLs exclusively.
+PREVIEW_STRIP_PREFIX = (os.getenv("PREVIEW_STRIP_PREFIX") or "0").lower() not in ("0", "false", "no")
+PREVIEW_MAX_CONNECTIONS = int(os.getenv("PREVIEW_MAX_CONNECTIONS", "256"))
+PREVIEW_MAX_KEEPALIVE = int(os.getenv("PREVIEW_MAX_KEEPALIVE", "64"))       # idle upstream connections kept open
+PREVIEW_KEEPALIVE_EXPIRY = float(os.getenv("PREVIEW_KEEPALIVE_EXPIRY", "30"))
+PREVIEW_CONNECT_TIMEOUT = float(os.getenv("PREVIEW_CONNECT_TIMEOUT", "5"))
+PREVIEW_READ_TIMEOUT = float(os.getenv("PREVIEW_READ_TIMEOUT", "300"))      # long enough for SSE / long polls
+
+# Event-loop watchdog (opt-in): log the stack of any callback that blocks the loop
+# longer than LOOP_BLOCK_THRESHOLD_MS; same call site is logged once per LOOP_BLOCK_LOG_REPEAT s.
+LOOP_WATCHDOG = (os.getenv("LOOP_WATCHDOG") or "0").lower() in ("1", "true", "yes")
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_BLOCK_LOG_REPEAT = float(os.getenv("LOOP_BLOCK_LOG_REPEAT", "60"))
 
 # Optional: filesystem watcher (watchfiles)
 WATCH_ENABLED = True
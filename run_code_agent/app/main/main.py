@@ -1,12 +1,25 @@
 # app/main/main.py
 from __future__ import annotations
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .routers.health import router as health_router
+from .routers.preview import router as preview_router
 from .routers.ws import router as ws_router
+from .services.metrics import start_runtime_metrics, stop_runtime_metrics
+from .services.preview import close_client as close_preview_client
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    runtime_metrics = start_runtime_metrics()  # loop lag + thread pool instrumentation
+    yield
+    await stop_runtime_metrics(runtime_metrics)
+    await close_preview_client()  # drop pooled upstream connections
 
-app = FastAPI(title="WS Backend by Email Workspace", version="1.3.0")
+
+app = FastAPI(title="WS Backend by Email Workspace", version="1.3.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,5 +32,8 @@ app.add_middleware(
 # HTTP routes
 app.include_router(health_router)
 
+# Dev-server previews (HTTP + HMR websockets), /preview/{session_id}/...
+app.include_router(preview_router)
+
 # WebSocket route
 app.include_router(ws_router)
@@ -3,24 +3,44 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import time
+from collections import deque
+from pathlib import Path
 from typing import Any, Optional
 
-from ..config import WORKSPACE_ROOT
+from ..config import DEV_LOG_BACKLOG, WORKSPACE_ROOT
 from ..utils.proc import stop_process
+from ..utils.sandbox import DevSandbox
 
 class Session:
     def __init__(self, session_id: str):
         self.id = session_id
         self.created_at = time.time()
         self.dev_proc: Optional[Any] = None  # asyncio.subprocess.Process or subprocess.Popen
+        self.sandbox: Optional[DevSandbox] = None  # cgroup/rlimit limits of dev_proc's tree
         self.cwd = WORKSPACE_ROOT  # will switch to user folder on init
         self.email: Optional[str] = None
         self.last_dev_start_at: float = 0.0
         self.log_task: Optional[asyncio.Task] = None
+        # dev log events are buffered until the client subscribes with start_dev (see PRESTART_DEV)
+        self.dev_log_subscribed = False
+        self.dev_log_backlog: deque[dict[str, Any]] = deque(maxlen=DEV_LOG_BACKLOG)
+        self.dev_log_dropped = 0
+        self.dev_prestarted_at: Optional[float] = None
+        # timings/counters parsed from the current dev process' output (services.dev_logs.DevLogMetrics)
+        self.dev_log_metrics: Optional[Any] = None
         self.fs_task: Optional[asyncio.Task] = None
         # informational only (UI convenience)
         self.dev_port: Optional[int] = None
         self.dev_url: Optional[str] = None
+        # /preview/{id}/ proxy counters (services.preview.PreviewMetrics), created on first request
+        self.preview_metrics: Optional[Any] = None
+        # workspace search: index root this session holds a reference on, running searches by req_id
+        self.search_root: Optional[Path] = None
+        self.search_tasks: dict[str, asyncio.Task] = {}
+        # workspace this session holds a services.usage.USAGE reference on
+        self.usage_root: Optional[Path] = None
+        # snapshot create/restore/delete running under the workspace setup lock
+        self.snapshot_tasks: set[asyncio.Task] = set()
 
 class Sessions:
     def __init__(self):
@@ -39,6 +59,14 @@ class Sessions:
         async with self._lock:
             return self._sessions.get(sid)
 
+    def snapshot(self) -> list[Session]:
+        """Lock-free copy for sync callers on the loop (metrics collectors)."""
+        return list(self._sessions.values())
+
+    async def list(self) -> list[Session]:
+        async with self._lock:
+            return list(self._sessions.values())
+
     async def remove(self, sid: str):
         async with self._lock:
             sess = self._sessions.pop(sid, None)
@@ -47,9 +75,12 @@ class Sessions:
         # stop dev process
         if sess.dev_proc:
             await stop_process(sess.dev_proc)
+        if sess.sandbox:
+            await asyncio.to_thread(sess.sandbox.release)
+            sess.sandbox = None
         # stop tasks
-        for task in (sess.log_task, sess.fs_task):
+        for task in (sess.log_task, sess.fs_task, *sess.search_tasks.values(), *sess.snapshot_tasks):
             if task and not task.done():
                 task.cancel()
-                with contextlib.suppress(Exception):
+                with contextlib.suppress(asyncio.CancelledError, Exception):
                     await task
@@ -1,6 +1,6 @@
 # app/main/models/ws_protocol.py
 from __future__ import annotations
-from typing import Literal, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel
 
 class WSBase(BaseModel):
@@ -20,6 +20,7 @@ class ListTreeReq(WSBase):
 class ReadFileReq(WSBase):
     type: Literal["read_file"]
     path: str
+    if_none_match: Optional[str] = None  # etag from a previous read
 
 class WriteFileReq(WSBase):
     type: Literal["write_file"]
@@ -27,6 +28,51 @@ class WriteFileReq(WSBase):
     content: str
     create_if_missing: bool = True
 
+class ReadFilesReq(WSBase):
+    type: Literal["read_files"]
+    paths: List[str]
+    if_none_match: Optional[Dict[str, str]] = None  # path -> etag
+
+class WriteFileItem(BaseModel):
+    path: str
+    content: str
+    create_if_missing: bool = True
+
+class WriteFilesReq(WSBase):
+    type: Literal["write_files"]
+    files: List[WriteFileItem]
+
+class SearchFilesReq(WSBase):
+    type: Literal["search_files"]
+    query: str
+    limit: int = 50
+
+class SearchTextReq(WSBase):
+    type: Literal["search_text"]
+    query: str
+    regex: bool = False
+    case_sensitive: bool = False
+    max_results: int = 200
+
+class CancelSearchReq(WSBase):
+    type: Literal["cancel_search"]
+    target_req_id: str
+
+class SnapshotCreateReq(WSBase):
+    type: Literal["snapshot_create"]
+    label: Optional[str] = None
+
+class SnapshotListReq(WSBase):
+    type: Literal["snapshot_list"]
+
+class SnapshotRestoreReq(WSBase):
+    type: Literal["snapshot_restore"]
+    snapshot_id: str
+
+class SnapshotDeleteReq(WSBase):
+    type: Literal["snapshot_delete"]
+    snapshot_id: str
+
 class ChatReq(WSBase):
     type: Literal["chat"]
     message: str
@@ -41,4 +87,8 @@ class SetCwdReq(WSBase):
     type: Literal["set_cwd"]
     cwd: str  # relative to WORKSPACE_ROOT
 
-AllowedReq = InitReq | ListTreeReq | ReadFileReq | WriteFileReq | ChatReq | StartDevReq | StopDevReq | SetCwdReq
+AllowedReq = (
+    InitReq | ListTreeReq | ReadFileReq | WriteFileReq | ReadFilesReq | WriteFilesReq
+    | SearchFilesReq | SearchTextReq | CancelSearchReq
+    | SnapshotCreateReq | SnapshotListReq | SnapshotRestoreReq | SnapshotDeleteReq | ChatReq | StartDevReq | StopDevReq | SetCwdReq
+)
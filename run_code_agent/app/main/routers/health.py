@@ -1,15 +1,64 @@
 # app/main/routers/health.py
 from __future__ import annotations
-from fastapi import APIRouter
-from ..config import WORKSPACE_ROOT, WATCH_ENABLED, MAX_READ_BYTES, MAX_WRITE_BYTES
+import asyncio
+import hmac
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from ..config import WORKSPACE_ROOT, WATCH_ENABLED, MAX_READ_BYTES, MAX_WRITE_BYTES, WORKER_ID, DEV_SANDBOX, ADMIN_TOKEN
+from ..services.state import STATE
+from ..services.file_cache import CONTENT_CACHE
+from ..services.search import SEARCH_INDEXES
+from ..services.usage import USAGE
+from ..services.preview import pool_info
+from ..services.sessions import SESSIONS
+from ..services import metrics as runtime_metrics
+from ..utils.metrics import REGISTRY
 
 router = APIRouter()
 
+
+def require_admin(request: Request) -> None:
+    """Bearer ADMIN_TOKEN; the /admin routes do not exist while it is unset."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="E_UNAUTHORIZED", headers={"WWW-Authenticate": "Bearer"})
+
+
 @router.get("/healthz")
 async def health():
+    sessions = await SESSIONS.list()
+    # reads cgroup files or scans /proc; keep it off the loop
+    dev_usage = await asyncio.to_thread(lambda: {s.id: s.sandbox.usage() for s in sessions if s.sandbox})
     return {
         "ok": True,
         "workspace_root": str(WORKSPACE_ROOT),
         "watch_enabled": WATCH_ENABLED,
+        "worker_id": WORKER_ID,
+        "state_backend": STATE.name,
         "limits": {"read": MAX_READ_BYTES, "write": MAX_WRITE_BYTES},
+        "content_cache": CONTENT_CACHE.stats(),
+        "search_index": SEARCH_INDEXES.stats(),
+        "usage": USAGE.report(),
+        "loop_watchdog": runtime_metrics.WATCHDOG.stats() if runtime_metrics.WATCHDOG else None,
+        "dev_sandbox": {"mode": DEV_SANDBOX, "sessions": dev_usage},
+        "dev_logs": {s.id: s.dev_log_metrics.snapshot() for s in sessions if s.dev_log_metrics is not None},
+        "preview": {
+            "pool": pool_info(),
+            "sessions": {
+                s.id: s.preview_metrics.snapshot()
+                for s in sessions if s.preview_metrics is not None
+            },
+        },
     }
+
+@router.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def admin_usage():
+    """Disk usage per workspace (folders are named after emails)."""
+    return USAGE.report(detail=True)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition (counters, histograms, loop lag, process stats)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
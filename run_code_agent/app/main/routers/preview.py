@@ -0,0 +1,40 @@
+# app/main/routers/preview.py
+from __future__ import annotations
+from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi.responses import RedirectResponse
+
+from ..services.preview import preview_prefix, proxy_http, proxy_ws
+from ..services.sessions import SESSIONS
+
+router = APIRouter()
+
+_METHODS = ["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"]
+
+
+async def _session(session_id: str):
+    sess = await SESSIONS.get(session_id)
+    if not sess:
+        # sessions live on the worker that accepted their /ws; route by affinity
+        raise HTTPException(status_code=404, detail="E_SESSION_NOT_FOUND")
+    return sess
+
+
+@router.api_route("/preview/{session_id}", methods=_METHODS)
+async def preview_root(session_id: str, request: Request):
+    # relative asset URLs only resolve under the trailing slash
+    query = request.url.query
+    return RedirectResponse(preview_prefix(session_id) + "/" + (f"?{query}" if query else ""), status_code=307)
+
+
+@router.api_route("/preview/{session_id}/{path:path}", methods=_METHODS)
+async def preview_http(session_id: str, path: str, request: Request):
+    return await proxy_http(request, await _session(session_id))
+
+
+@router.websocket("/preview/{session_id}/{path:path}")
+async def preview_ws(ws: WebSocket, session_id: str, path: str):
+    sess = await SESSIONS.get(session_id)
+    if not sess:
+        await ws.close(code=1008)
+        return
+    await proxy_ws(ws, sess)
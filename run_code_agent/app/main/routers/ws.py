@@ -7,7 +7,7 @@ import json
 import time
 import traceback
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, get_args, get_type_hints
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 
@@ -15,28 +15,46 @@ from ..config import (
     DEFAULT_CLONE_URL,
     WORKSPACE_ROOT,
     DEFAULT_EXCLUDES,
-    MAX_READ_BYTES,
-    MAX_WRITE_BYTES,
+    MAX_BATCH_FILES,
+    PRESTART_DEV,
+    WORKER_ID,
+    SEARCH_MAX_RESULTS,
+    SEARCH_RESULT_CHUNK,
 )
 from ..models.ws_protocol import (
-    InitReq, ListTreeReq, ReadFileReq, WriteFileReq, ChatReq,
-    StartDevReq, StopDevReq, SetCwdReq,
+    InitReq, ListTreeReq, ReadFileReq, WriteFileReq, ReadFilesReq, WriteFilesReq,
+    SearchFilesReq, SearchTextReq, CancelSearchReq,
+    SnapshotCreateReq, SnapshotListReq, SnapshotRestoreReq, SnapshotDeleteReq,
+    ChatReq, StartDevReq, StopDevReq, SetCwdReq, AllowedReq,
 )
 from ..services.sessions import SESSIONS
-from ..services.dev import start_dev_process, pump_dev_logs
+from ..services.state import STATE
+from ..services.dev import (
+    admit_dev, dev_running, start_dev_process, stop_dev_process,
+    pump_dev_logs, subscribe_dev_logs,
+)
+from ..services.preview import preview_prefix
+from ..services.metrics import (
+    MeteredLock, SETUP_SECONDS, WS_CONNECTIONS, WS_FRAMES_DROPPED, WS_LATENCY, WS_REQUESTS,
+)
+from ..services.fs_io import read_text_file, write_text_file, read_files, write_files
 from ..services.fs_tree import walk_tree
 from ..services.fs_watch import fs_watcher
+from ..services.search import SEARCH_INDEXES, WorkspaceIndex, stream_text_matches
+from ..services.usage import USAGE
+from ..services.snapshots import create_snapshot, list_snapshots, restore_snapshot, delete_snapshot
 from ..utils.paths import email_to_folder, safe_join, require_init
-from ..utils.text import looks_text
 from ..services.workspace import clear_directory, sync_repo_into
-from ..utils.proc import stop_process
 
 router = APIRouter()
 
-# ---------- in-memory "active project per email" ----------
-CURRENT_PROJECT_BY_EMAIL: dict[str, str] = {}
-SETUP_LOCK_BY_EMAIL: dict[str, asyncio.Lock] = {}
-
+# message types that get their own metrics label
+_WS_TYPES = {
+    arg
+    for cls in get_args(AllowedReq)
+    for arg in get_args(get_type_hints(cls).get("type"))
+    if isinstance(arg, str)
+} | {"setup_workspace"}
 
 def _dir_is_empty(p: Path) -> bool:
     try:
@@ -46,35 +64,30 @@ def _dir_is_empty(p: Path) -> bool:
         return True
 
 
-def _get_setup_lock(email_key: str) -> asyncio.Lock:
-    lock = SETUP_LOCK_BY_EMAIL.get(email_key)
-    if not lock:
-        lock = asyncio.Lock()
-        SETUP_LOCK_BY_EMAIL[email_key] = lock
-    return lock
-
-
-class LockedWS:
-    """Tiny wrapper to serialize ws.send_json calls."""
-    def __init__(self, ws: WebSocket, lock: asyncio.Lock):
-        self.ws = ws
-        self.lock = lock
-
-    async def send_json(self, payload: Dict[str, Any]):
-        async with self.lock:
-            await self.ws.send_json(payload)
+def _search_index(sess) -> WorkspaceIndex:
+    """Index of the session's current workspace; moves the session's reference on cwd change."""
+    if sess.search_root != sess.cwd:
+        if sess.search_root is not None:
+            SEARCH_INDEXES.release(sess.search_root)
+        SEARCH_INDEXES.acquire(sess.cwd)
+        sess.search_root = sess.cwd
+    return SEARCH_INDEXES.get(sess.cwd)
 
 
 @router.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
     await ws.accept()
 
-    send_lock = asyncio.Lock()
-    lws = LockedWS(ws, send_lock)  # for passing into dev log pump & watchers
+    send_lock = MeteredLock()
+    WS_CONNECTIONS.inc()
 
     async def send(payload: Dict[str, Any]):
         async with send_lock:
-            await ws.send_json(payload)
+            try:
+                await ws.send_json(payload)
+            except Exception:
+                WS_FRAMES_DROPPED.inc(reason="send_failed")
+                raise
 
     # background setup job (clear + clone) keyed by email
     async def setup_workspace(sess, user_root: Path, req_id: str | None, repo_url: str):
@@ -82,30 +95,117 @@ async def ws_endpoint(ws: WebSocket):
             await send({"type": "setup_log", "line": line})
 
         email_key = sess.email or "unknown"
-        lock = _get_setup_lock(email_key)
-        async with lock:  # avoid two tabs racing for same email
+        async with STATE.setup_lock(email_key):  # avoid two tabs (on any worker) racing for same email
             try:
                 await setup_log("[setup] clearing workspace...")
+                started = time.perf_counter()
                 await clear_directory(user_root)
+                SETUP_SECONDS.observe(time.perf_counter() - started, phase="clear")
 
                 await setup_log(f"[setup] cloning {repo_url} into workspace...")
                 # workspace sync uses setup_log callback (no dev_log here)
+                started = time.perf_counter()
                 await sync_repo_into(user_root, repo_url, on_log=setup_log)
+                SETUP_SECONDS.observe(time.perf_counter() - started, phase="clone")
+                SEARCH_INDEXES.reset(user_root)
+                USAGE.reset(user_root)
 
                 # start watcher after files exist
                 if not getattr(sess, "fs_task", None) or sess.fs_task.done():
-                    sess.fs_task = asyncio.create_task(fs_watcher(sess, lws, send_lock))
+                    sess.fs_task = asyncio.create_task(fs_watcher(sess, ws, send_lock))
 
                 await send({"type": "setup_ok", "cwd": str(user_root)})
                 await setup_log("[setup] done.")
+                await prestart_dev(sess)
             except asyncio.CancelledError:
                 await setup_log("[setup] cancelled")
                 raise
             except Exception as e:
                 await send({"type": "error", "req_id": req_id, "message": f"setup_failed: {e}"})
 
+    def ensure_log_pump(sess):
+        if not getattr(sess, "log_task", None) or sess.log_task.done():
+            sess.log_task = asyncio.create_task(pump_dev_logs(sess, ws, send_lock))
+
+    async def prestart_dev(sess):
+        """
+        PRESTART_DEV: start install + dev server before the client asks, if admission allows.
+        Logs stay buffered until start_dev subscribes.
+        """
+        if not PRESTART_DEV or dev_running(sess) or not await admit_dev(speculative=True):
+            return
+        res = await start_dev_process(sess)
+        if res.get("ok") and dev_running(sess):
+            sess.dev_prestarted_at = time.time()
+            ensure_log_pump(sess)
+
+    def start_snapshot_task(sess, req_id, reply, fn, *args):
+        """
+        Run a snapshot operation under the workspace setup lock in its own task:
+        a large restore must not hold up the socket's other requests.
+        """
+        async def _run():
+            try:
+                async with STATE.setup_lock(sess.email or "unknown"):
+                    res = await asyncio.to_thread(fn, *args)
+                await send({**reply(res), "req_id": req_id})
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as he:
+                await send({"type": "error", "req_id": req_id, "message": he.detail})
+            except Exception as e:
+                await send({"type": "error", "req_id": req_id, "message": f"{e.__class__.__name__}: {e}"})
+
+        task = asyncio.create_task(_run())
+        sess.snapshot_tasks.add(task)
+        task.add_done_callback(sess.snapshot_tasks.discard)
+
+    async def run_file_search(sess, idx: WorkspaceIndex, req: SearchFilesReq, key: str):
+        req_id = req.req_id
+        try:
+            await idx.ready.wait()
+            items = await asyncio.to_thread(
+                idx.search_files, req.query, min(SEARCH_MAX_RESULTS, max(1, req.limit))
+            )
+            await send({"type": "search_files_ok", "req_id": req_id, "items": items})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await send({"type": "error", "req_id": req_id, "message": f"search_failed: {e}"})
+        finally:
+            sess.search_tasks.pop(key, None)
+
+    async def run_text_search(sess, idx: WorkspaceIndex, req: SearchTextReq, key: str):
+        """Stream search_text_result chunks, then one search_text_done."""
+        req_id = req.req_id
+        try:
+            await idx.ready.wait()
+
+            async def on_chunk(items):
+                await send({"type": "search_text_result", "req_id": req_id, "items": items})
+
+            res = await stream_text_matches(
+                idx,
+                req.query,
+                regex=req.regex,
+                case_sensitive=req.case_sensitive,
+                max_results=min(SEARCH_MAX_RESULTS, max(1, req.max_results)),
+                chunk_size=SEARCH_RESULT_CHUNK,
+                on_chunk=on_chunk,
+            )
+            await send({"type": "search_text_done", "req_id": req_id, **res})
+        except asyncio.CancelledError:
+            with contextlib.suppress(Exception):
+                await send({"type": "search_text_done", "req_id": req_id, "cancelled": True})
+            raise
+        except Exception as e:
+            await send({"type": "error", "req_id": req_id, "message": f"search_failed: {e}"})
+        finally:
+            sess.search_tasks.pop(key, None)
+
     # create session
     sess = await SESSIONS.create()
+    await STATE.claim_session(sess.id, None)
     await send({"type": "session_init", "session_id": sess.id, "cwd": str(getattr(sess, "cwd", WORKSPACE_ROOT))})
 
     # keepalive pings (optional; safe to remove if your infra doesn't need it)
@@ -114,6 +214,11 @@ async def ws_endpoint(ws: WebSocket):
             while True:
                 await asyncio.sleep(20)
                 await send({"type": "ping", "ts": time.time()})
+                with contextlib.suppress(Exception):
+                    await STATE.claim_session(sess.id, sess.email)
+                if sess.email:
+                    with contextlib.suppress(Exception):
+                        await STATE.claim_affinity(sess.email)
         except Exception:
             pass
 
@@ -133,6 +238,8 @@ async def ws_endpoint(ws: WebSocket):
 
             t = data.get("type")
             req_id = data.get("req_id")
+            started = time.perf_counter()
+            outcome = "ok"
 
             try:
                 if t == "init":
@@ -146,6 +253,13 @@ async def ws_endpoint(ws: WebSocket):
                     sess.email = req.email
                     sess.project_id = req.project_id
                     sess.cwd = user_root
+                    if sess.usage_root != user_root:
+                        if sess.usage_root is not None:
+                            USAGE.untrack(sess.usage_root)
+                        USAGE.track(user_root)
+                        sess.usage_root = user_root
+                    await STATE.claim_session(sess.id, req.email)
+                    affinity_worker = await STATE.claim_affinity(req.email)
 
                     await send({
                         "type": "init_ok",
@@ -153,12 +267,14 @@ async def ws_endpoint(ws: WebSocket):
                         "email": req.email,
                         "project_id": req.project_id,
                         "cwd": str(user_root),
+                        "worker_id": WORKER_ID,
+                        "affinity_worker": affinity_worker,
                     })
 
                     # Decide whether to (re)setup:
                     setup_mode = (getattr(req, "setup", None) or data.get("setup") or "auto").lower()
                     repo_url = getattr(req, "repo_url", None) or data.get("repo_url") or DEFAULT_CLONE_URL
-                    remembered = CURRENT_PROJECT_BY_EMAIL.get(req.email)
+                    remembered = await STATE.get_current_project(req.email)
 
                     should_setup = (
                         setup_mode == "force" or
@@ -166,58 +282,55 @@ async def ws_endpoint(ws: WebSocket):
                     )
 
                     # remember current project_id (prevents wiping on reloads when unchanged)
-                    CURRENT_PROJECT_BY_EMAIL[req.email] = req.project_id
+                    await STATE.set_current_project(req.email, req.project_id)
 
                     if should_setup:
                         # Stop previous dev/log/watch before resetting
-                        if getattr(sess, "dev_proc", None):
-                            await stop_process(sess.dev_proc)
-                            sess.dev_proc = None
+                        await stop_dev_process(sess)
                         if getattr(sess, "log_task", None) and not sess.log_task.done():
                             sess.log_task.cancel()
-                            with contextlib.suppress(Exception):
+                            with contextlib.suppress(asyncio.CancelledError, Exception):
                                 await sess.log_task
                             sess.log_task = None
                         if getattr(sess, "fs_task", None) and not sess.fs_task.done():
                             sess.fs_task.cancel()
-                            with contextlib.suppress(Exception):
+                            with contextlib.suppress(asyncio.CancelledError, Exception):
                                 await sess.fs_task
                             sess.fs_task = None
 
                         prev = getattr(sess, "setup_task", None)
                         if prev and not prev.done():
                             prev.cancel()
-                            with contextlib.suppress(Exception):
+                            with contextlib.suppress(asyncio.CancelledError, Exception):
                                 await prev
                         sess.setup_task = asyncio.create_task(setup_workspace(sess, user_root, req_id, repo_url))
                     else:
                         # No reset needed; ensure watcher is running
                         if not getattr(sess, "fs_task", None) or sess.fs_task.done():
-                            sess.fs_task = asyncio.create_task(fs_watcher(sess, lws, send_lock))
+                            sess.fs_task = asyncio.create_task(fs_watcher(sess, ws, send_lock))
+                        await prestart_dev(sess)
 
                 elif t == "setup_workspace":
                     # explicit reset from client
                     require_init(sess)
                     repo_url = data.get("repo_url") or DEFAULT_CLONE_URL
 
-                    if getattr(sess, "dev_proc", None):
-                        await stop_process(sess.dev_proc)
-                        sess.dev_proc = None
+                    await stop_dev_process(sess)
                     if getattr(sess, "log_task", None) and not sess.log_task.done():
                         sess.log_task.cancel()
-                        with contextlib.suppress(Exception):
+                        with contextlib.suppress(asyncio.CancelledError, Exception):
                             await sess.log_task
                         sess.log_task = None
                     if getattr(sess, "fs_task", None) and not sess.fs_task.done():
                         sess.fs_task.cancel()
-                        with contextlib.suppress(Exception):
+                        with contextlib.suppress(asyncio.CancelledError, Exception):
                             await sess.fs_task
                         sess.fs_task = None
 
                     prev = getattr(sess, "setup_task", None)
                     if prev and not prev.done():
                         prev.cancel()
-                        with contextlib.suppress(Exception):
+                        with contextlib.suppress(asyncio.CancelledError, Exception):
                             await prev
                     sess.setup_task = asyncio.create_task(setup_workspace(sess, sess.cwd, req_id, repo_url))
                     await send({"type": "setup_started", "req_id": req_id})
@@ -237,34 +350,109 @@ async def ws_endpoint(ws: WebSocket):
                 elif t == "read_file":
                     require_init(sess)
                     req = ReadFileReq(**data)
-                    f = safe_join(sess.cwd, req.path)
-                    if not f.exists() or not f.is_file():
-                        await send({"type": "error", "req_id": req_id, "message": "file not found"})
-                        continue
-                    rawb = f.read_bytes()
-                    if len(rawb) > MAX_READ_BYTES:
-                        await send({"type": "error", "req_id": req_id, "message": "E_FILE_TOO_LARGE"})
-                        continue
-                    if not looks_text(rawb):
-                        await send({"type": "error", "req_id": req_id, "message": "E_BINARY_NOT_ALLOWED"})
+                    content, etag, encoding = await asyncio.to_thread(
+                        read_text_file, sess.cwd, req.path, req.if_none_match
+                    )
+                    if content is None:
+                        await send({"type": "not_modified", "req_id": req_id, "path": req.path, "etag": etag})
                         continue
-                    await send({"type": "read_file_ok", "req_id": req_id, "path": req.path, "content": rawb.decode("utf-8", errors="strict")})
+                    await send({
+                        "type": "read_file_ok",
+                        "req_id": req_id,
+                        "path": req.path,
+                        "etag": etag,
+                        "encoding": encoding,
+                        "content": content,
+                    })
 
                 elif t == "write_file":
                     require_init(sess)
                     req = WriteFileReq(**data)
-                    f = safe_join(sess.cwd, req.path)
-                    b = req.content.encode("utf-8")
-                    if len(b) > MAX_WRITE_BYTES:
-                        await send({"type": "error", "req_id": req_id, "message": "E_FILE_TOO_LARGE"})
+                    etag = await asyncio.to_thread(write_text_file, sess.cwd, req.path, req.content, req.create_if_missing)
+                    await send({"type": "write_file_ok", "req_id": req_id, "path": req.path, "etag": etag})
+
+                elif t == "read_files":
+                    require_init(sess)
+                    req = ReadFilesReq(**data)
+                    if len(req.paths) > MAX_BATCH_FILES:
+                        await send({"type": "error", "req_id": req_id, "message": "E_BATCH_TOO_LARGE"})
                         continue
-                    if not f.exists():
-                        if not req.create_if_missing:
-                            await send({"type": "error", "req_id": req_id, "message": "file does not exist"})
-                            continue
-                        f.parent.mkdir(parents=True, exist_ok=True)
-                    f.write_bytes(b)
-                    await send({"type": "write_file_ok", "req_id": req_id, "path": req.path})
+                    files = await read_files(sess.cwd, req.paths, req.if_none_match)
+                    await send({"type": "read_files_ok", "req_id": req_id, "files": files})
+
+                elif t == "write_files":
+                    # all-or-nothing: either every file is written or none is
+                    require_init(sess)
+                    req = WriteFilesReq(**data)
+                    if len(req.files) > MAX_BATCH_FILES:
+                        await send({"type": "error", "req_id": req_id, "message": "E_BATCH_TOO_LARGE"})
+                        continue
+                    written = await write_files(
+                        sess.cwd, [(f.path, f.content, f.create_if_missing) for f in req.files]
+                    )
+                    await send({"type": "write_files_ok", "req_id": req_id, "files": written})
+
+                elif t == "search_files":
+                    require_init(sess)
+                    # the first index build can take a while: answer from a task, not the receive loop
+                    req = SearchFilesReq(**data)
+                    key = req_id or f"search-{time.monotonic_ns()}"
+                    prev = sess.search_tasks.pop(key, None)
+                    if prev and not prev.done():
+                        prev.cancel()
+                    sess.search_tasks[key] = asyncio.create_task(
+                        run_file_search(sess, _search_index(sess), req, key)
+                    )
+
+                elif t == "search_text":
+                    # results stream back as search_text_result chunks; cancel with cancel_search
+                    require_init(sess)
+                    req = SearchTextReq(**data)
+                    key = req_id or f"search-{time.monotonic_ns()}"
+                    prev = sess.search_tasks.pop(key, None)
+                    if prev and not prev.done():
+                        prev.cancel()
+                    sess.search_tasks[key] = asyncio.create_task(
+                        run_text_search(sess, _search_index(sess), req, key)
+                    )
+
+                elif t == "cancel_search":
+                    req = CancelSearchReq(**data)
+                    task = sess.search_tasks.get(req.target_req_id)
+                    if task and not task.done():
+                        task.cancel()
+                    await send({"type": "cancel_search_ok", "req_id": req_id, "target_req_id": req.target_req_id})
+
+                elif t == "snapshot_create":
+                    require_init(sess)
+                    req = SnapshotCreateReq(**data)
+                    start_snapshot_task(
+                        sess, req_id, lambda snap: {"type": "snapshot_create_ok", "snapshot": snap},
+                        create_snapshot, sess.cwd, req.label,
+                    )
+
+                elif t == "snapshot_list":
+                    require_init(sess)
+                    _ = SnapshotListReq(**data)
+                    snaps = await asyncio.to_thread(list_snapshots, sess.cwd)
+                    await send({"type": "snapshot_list_ok", "req_id": req_id, "snapshots": snaps})
+
+                elif t == "snapshot_restore":
+                    # rewrites only files that differ; the watcher reports them as usual
+                    require_init(sess)
+                    req = SnapshotRestoreReq(**data)
+                    start_snapshot_task(
+                        sess, req_id, lambda res: {"type": "snapshot_restore_ok", **res},
+                        restore_snapshot, sess.cwd, req.snapshot_id,
+                    )
+
+                elif t == "snapshot_delete":
+                    require_init(sess)
+                    req = SnapshotDeleteReq(**data)
+                    start_snapshot_task(
+                        sess, req_id, lambda _, sid=req.snapshot_id: {"type": "snapshot_delete_ok", "snapshot_id": sid},
+                        delete_snapshot, sess.cwd, req.snapshot_id,
+                    )
 
                 elif t == "chat":
                     req = ChatReq(**data)
@@ -273,18 +461,22 @@ async def ws_endpoint(ws: WebSocket):
                 elif t == "start_dev":
                     require_init(sess)
                     _ = StartDevReq(**data)
+                    if not dev_running(sess) and not await admit_dev():
+                        raise HTTPException(status_code=503, detail="E_DEV_CAPACITY")
+                    prestarted = sess.dev_prestarted_at is not None
                     res = await start_dev_process(sess)
-                    await send({"type": "start_dev_ok", "req_id": req_id, **res})
-                    if not getattr(sess, "log_task", None) or sess.log_task.done():
-                        # dev logs only; pump writes dev_log/dev_url via lws
-                        sess.log_task = asyncio.create_task(pump_dev_logs(sess, lws))
+                    if res.get("ok"):
+                        res["preview_url"] = preview_prefix(sess.id) + "/"
+                    await send({"type": "start_dev_ok", "req_id": req_id, "prestarted": prestarted, **res})
+                    # dev logs only; buffered lines (pre-start) are flushed first
+                    ensure_log_pump(sess)
+                    await subscribe_dev_logs(sess, ws, send_lock)
 
                 elif t == "stop_dev":
                     require_init(sess)
                     _ = StopDevReq(**data)
                     if getattr(sess, "dev_proc", None):
-                        await stop_process(sess.dev_proc)
-                        sess.dev_proc = None
+                        await stop_dev_process(sess)
                     await send({"type": "stop_dev_ok", "req_id": req_id})
 
                 elif t == "set_cwd":
@@ -297,34 +489,42 @@ async def ws_endpoint(ws: WebSocket):
                     await send({"type": "set_cwd_ok", "req_id": req_id, "cwd": str(new_cwd)})
 
                 else:
+                    outcome = "rejected"
                     await send({"type": "error", "req_id": req_id, "message": f"unknown type: {t}"})
 
             except HTTPException as he:
+                outcome = "rejected"
                 await send({"type": "error", "req_id": req_id, "message": he.detail})
             except Exception as e:
+                outcome = "error"
                 await send({
                     "type": "error",
                     "req_id": req_id,
                     "message": f"{e.__class__.__name__}: {e}",
                     "trace": traceback.format_exc(),
                 })
+            finally:
+                label = t if t in _WS_TYPES else "unknown"  # bounded label set
+                WS_REQUESTS.inc(type=label, outcome=outcome)
+                WS_LATENCY.observe(time.perf_counter() - started, type=label)
 
     except WebSocketDisconnect:
         pass
     finally:
-        with contextlib.suppress(Exception):
+        WS_CONNECTIONS.dec()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
             ping_task.cancel(); await ping_task
 
         setup_t = getattr(sess, "setup_task", None)
         if setup_t and not setup_t.done():
             setup_t.cancel()
-            with contextlib.suppress(Exception):
+            with contextlib.suppress(asyncio.CancelledError, Exception):
                 await setup_t
 
         # stop dev proc on disconnect
         if getattr(sess, "dev_proc", None):
             with contextlib.suppress(Exception):
-                await stop_process(sess.dev_proc)
+                await stop_dev_process(sess)
             sess.dev_proc = None
 
         # cancel watcher/log tasks
@@ -332,9 +532,22 @@ async def ws_endpoint(ws: WebSocket):
             t = getattr(sess, attr, None)
             if t and not t.done():
                 t.cancel()
-                with contextlib.suppress(Exception):
+                with contextlib.suppress(asyncio.CancelledError, Exception):
                     await t
                 setattr(sess, attr, None)
 
+        for t in [*sess.search_tasks.values(), *sess.snapshot_tasks]:
+            t.cancel()
+        if sess.search_root is not None:
+            SEARCH_INDEXES.release(sess.search_root)
+            sess.search_root = None
+        if sess.usage_root is not None:
+            USAGE.untrack(sess.usage_root)
+            sess.usage_root = None
+
         with contextlib.suppress(Exception):
             await SESSIONS.remove(sess.id)
+        with contextlib.suppress(Exception):
+            await STATE.release_session(sess.id)
+            if sess.email and not any(s.email == sess.email for s in await SESSIONS.list()):
+                await STATE.release_affinity(sess.email)
@@ -10,9 +10,20 @@ import traceback
 from typing import Any
 
 from fastapi import WebSocket
-from ..config import DEV_CMD
+from ..config import (
+    DEV_CMD,
+    MAX_DEV_PROCESSES,
+    PRESTART_HEADROOM,
+    PRESTART_IDLE_TIMEOUT,
+    PRESTART_MAX_LOAD,
+)
 from ..utils.paths import find_free_port
-from ..utils.proc import readline_exec, readline_popen
+from ..utils.proc import readline_exec, readline_popen, stop_process
+from ..utils.sandbox import DevSandbox
+from .dev_logs import DevLogMetrics, DevLogParser
+from .metrics import WS_FRAMES_DROPPED, observe_dev_event
+from .preview import preview_prefix
+from .usage import USAGE
 
 # -- Detect URLs printed by dev servers (Vite/Next/CRA etc.)
 ANSI_RE = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")  # strip ANSI escapes
@@ -21,6 +32,26 @@ URL_RE = re.compile(
     re.IGNORECASE,
 )
 
+def dev_running(sess) -> bool:
+    proc = getattr(sess, "dev_proc", None)
+    return proc is not None and getattr(proc, "returncode", None) is None
+
+async def admit_dev(speculative: bool = False) -> bool:
+    """
+    Admission check for a new dev process on this worker. Speculative starts
+    leave PRESTART_HEADROOM slots for explicit start_dev and back off when the
+    host is already busy.
+    """
+    from .sessions import SESSIONS
+    if MAX_DEV_PROCESSES:
+        running = sum(1 for s in await SESSIONS.list() if dev_running(s))
+        if running >= MAX_DEV_PROCESSES - (PRESTART_HEADROOM if speculative else 0):
+            return False
+    if speculative and hasattr(os, "getloadavg"):
+        if os.getloadavg()[0] / (os.cpu_count() or 1) > PRESTART_MAX_LOAD:
+            return False
+    return True
+
 async def start_dev_process(sess) -> dict[str, Any]:
     now = time.time()
     if now - sess.last_dev_start_at < 1.5:
@@ -52,18 +83,26 @@ async def start_dev_process(sess) -> dict[str, Any]:
     sess.dev_port = port
     sess.dev_url = None  # let log detection set the real URL
 
+    base_path = preview_prefix(sess.id) + "/"
     env = {
         **os.environ,
         "FORCE_COLOR": "1",
         "PORT": str(port),       # used by many CLIs (Next/CRA)
         "VITE_PORT": str(port),  # some CLIs read this
         "BROWSER": "none",
+        # where /preview/{session}/ serves the app; templates may pass it to Vite `base` / Next `basePath`
+        "PREVIEW_BASE_PATH": base_path,
         "NPM_CONFIG_PROGRESS": "false", "npm_config_progress": "false",
         "NPM_CONFIG_FUND": "false",     "npm_config_fund": "false",
     }
 
-    cmd_str = DEV_CMD
+    cmd_str = DEV_CMD.replace("{base}", shlex.quote(base_path))
+
+    # the previous process exited on its own; its cgroup is still around
+    if sess.sandbox:
+        await stop_dev_process(sess)
 
+    sandbox = None
     try:
         if os.name == "nt":
             proc = subprocess.Popen(
@@ -78,6 +117,9 @@ async def start_dev_process(sess) -> dict[str, Any]:
             )
             sess.dev_proc = proc
         else:
+            # limits apply to the whole process group: npm, node, esbuild ...
+            sandbox = DevSandbox.create(sess.id)
+            preexec = sandbox.preexec() if sandbox else None
             if "&&" in cmd_str or "|" in cmd_str:
                 proc = await asyncio.create_subprocess_shell(
                     cmd_str,
@@ -86,6 +128,7 @@ async def start_dev_process(sess) -> dict[str, Any]:
                     stderr=asyncio.subprocess.STDOUT,
                     env=env,
                     start_new_session=True,
+                    preexec_fn=preexec,
                 )
             else:
                 proc = await asyncio.create_subprocess_exec(
@@ -95,9 +138,15 @@ async def start_dev_process(sess) -> dict[str, Any]:
                     stderr=asyncio.subprocess.STDOUT,
                     env=env,
                     start_new_session=True,
+                    preexec_fn=preexec,
                 )
             sess.dev_proc = proc
+            if sandbox:
+                sandbox.attach(proc.pid)
+                sess.sandbox = sandbox
     except Exception as e:
+        if sandbox and sess.sandbox is not sandbox:
+            await asyncio.to_thread(sandbox.release)
         return {
             "ok": False,
             "message": f"{e.__class__.__name__}: {e}\n{traceback.format_exc()}",
@@ -110,19 +159,73 @@ async def start_dev_process(sess) -> dict[str, Any]:
         "cwd": str(cwd),
         "dev_port": port,
         "dev_url": sess.dev_url,  # None for now; will be sent via 'dev_url' event when detected
+        "sandbox": sess.sandbox.mode if sess.sandbox else None,
     }
 
+async def stop_dev_process(sess) -> None:
+    """Stop the session's dev process tree, drop its sandbox (cgroup) and log subscription."""
+    if getattr(sess, "dev_proc", None):
+        await stop_process(sess.dev_proc)
+        sess.dev_proc = None
+    unsubscribe_dev_logs(sess)
+    sess.dev_prestarted_at = None
+    sandbox, sess.sandbox = sess.sandbox, None
+    if sandbox:
+        await asyncio.to_thread(sandbox.release)
+
+async def _emit(sess, ws: WebSocket, send_lock: asyncio.Lock, payload: dict[str, Any]) -> None:
+    """Send a dev event, or keep it in the backlog until the client subscribes."""
+    if not sess.dev_log_subscribed:
+        if len(sess.dev_log_backlog) == sess.dev_log_backlog.maxlen:
+            sess.dev_log_dropped += 1
+            WS_FRAMES_DROPPED.inc(reason="dev_backlog")
+        sess.dev_log_backlog.append(payload)
+        return
+    async with send_lock:
+        await ws.send_json(payload)
+
+async def subscribe_dev_logs(sess, ws: WebSocket, send_lock: asyncio.Lock) -> None:
+    """Flush buffered dev events (in order) and forward new ones live from now on."""
+    async with send_lock:
+        # no await between taking the backlog and flipping the flag: the pump sees one or the other
+        backlog = list(sess.dev_log_backlog)
+        dropped = sess.dev_log_dropped
+        sess.dev_log_backlog.clear()
+        sess.dev_log_dropped = 0
+        sess.dev_log_subscribed = True
+        sess.dev_prestarted_at = None
+        if dropped:
+            await ws.send_json({"type": "dev_log", "line": f"[dev] {dropped} earlier log lines dropped"})
+            if sess.dev_url and not any(p["type"] == "dev_url" for p in backlog):
+                await ws.send_json({"type": "dev_url", "url": sess.dev_url})
+        for payload in backlog:
+            await ws.send_json(payload)
+
+def _workspace_rel(sess, file: str) -> str:
+    """Absolute paths inside the workspace become workspace-relative (what read_file takes)."""
+    root = str(sess.cwd).rstrip("/") + "/"
+    return file[len(root):] if file.startswith(root) else file
+
+def unsubscribe_dev_logs(sess) -> None:
+    sess.dev_log_subscribed = False
+    sess.dev_log_backlog.clear()
+    sess.dev_log_dropped = 0
+
 async def pump_dev_logs(sess, ws: WebSocket, send_lock: asyncio.Lock):
     """
     Stream dev logs. While streaming, auto-detect and broadcast the dev server URL once:
       -> send { "type": "dev_url", "url": "http://localhost:5174/" }
     Works even if the dev server switches ports (Vite: "Port 5173 is in use, trying another one...").
+    Until the client subscribes (start_dev), events are buffered instead of sent.
+    Recognised lines also produce { "type": "dev_event", "kind": ... } (see services.dev_logs).
     """
     try:
         proc = sess.dev_proc
         if not proc:
             return
         reader = readline_popen if isinstance(proc, subprocess.Popen) else readline_exec
+        parser = DevLogParser()
+        metrics = sess.dev_log_metrics = DevLogMetrics()
 
         while True:
             line = await reader(proc, timeout=1.0)
@@ -134,12 +237,25 @@ async def pump_dev_logs(sess, ws: WebSocket, send_lock: asyncio.Lock):
                     if m:
                         # Use exactly what the dev server prints (e.g., http://localhost:5174/)
                         sess.dev_url = m.group(1)
-                        async with send_lock:
-                            await ws.send_json({"type": "dev_url", "url": sess.dev_url})
+                        await _emit(sess, ws, send_lock, {"type": "dev_url", "url": sess.dev_url})
 
                 # Forward the log line
-                async with send_lock:
-                    await ws.send_json({"type": "dev_log", "line": line})
+                await _emit(sess, ws, send_lock, {"type": "dev_log", "line": line})
+
+                for ev in parser.feed(plain):
+                    if ev["kind"] == "error":
+                        ev["file"] = _workspace_rel(sess, ev["file"])
+                    elif ev["kind"] == "install" and ev.get("phase") == "done":
+                        # node_modules changed; the watcher does not see it
+                        USAGE.refresh_excluded(sess.cwd)
+                    metrics.record(ev)
+                    observe_dev_event(ev)
+                    await _emit(sess, ws, send_lock, {"type": "dev_event", **ev})
+
+            # Pre-started but never claimed: give the slot back
+            if sess.dev_prestarted_at and time.time() - sess.dev_prestarted_at > PRESTART_IDLE_TIMEOUT:
+                await stop_dev_process(sess)
+                break
 
             # Process ended?
             rc = getattr(proc, "returncode", None)
@@ -0,0 +1,371 @@
+# app/main/services/dev_logs.py
+"""
+Structured parsing of dev-server output (ANSI already stripped).
+
+Each parser recognises one tool's lines and returns events such as
+  {"kind": "ready",   "tool": "vite", "ms": 532}
+  {"kind": "rebuild", "tool": "next", "ms": 240, "ok": True}
+  {"kind": "hmr",     "tool": "vite", "action": "update", "paths": ["/src/App.tsx"]}
+  {"kind": "error",   "tool": "webpack", "file": "src/App.js", "line": 12, "col": 5, "message": "..."}
+  {"kind": "install", "tool": "npm", "phase": "done", "ms": 45000, "packages": 1234}
+which pump_dev_logs sends as {"type": "dev_event", ...} and folds into DevLogMetrics.
+
+Parsers are tried in registration order and every parser sees every line (one
+command can run npm, then Vite). Add one with @register_parser.
+"""
+from __future__ import annotations
+import abc
+import re
+import time
+from typing import Any, Optional
+
+Event = dict[str, Any]
+
+_SRC_EXT = r"(?:[cm]?[jt]sx?|vue|svelte|astro|css|scss|sass|less|html|json|mdx?)"
+# path/to/file.tsx:12:5  |  path/to/file.tsx (12:5)  |  path/to/file.tsx(12,5)
+_LOCATION_RE = re.compile(
+    rf"(?P<file>(?:[A-Za-z]:)?[\w./@~+\-\\\[\]()]*?\.{_SRC_EXT})"
+    r"(?:[:(]\s*|\s+\()(?P<line>\d+)[:,](?P<col>\d+)\)?"
+)
+_MESSAGE_MAX = 500
+
+
+def _duration_ms(value: str, unit: str) -> int:
+    v = float(value)
+    unit = unit.lower()
+    if unit in ("s", "sec", "secs", "second", "seconds"):
+        v *= 1000
+    elif unit in ("m", "min", "mins", "minute", "minutes"):
+        v *= 60_000
+    return int(round(v))
+
+
+def _location(line: str) -> Optional[dict[str, Any]]:
+    m = _LOCATION_RE.search(line)
+    if not m:
+        return None
+    file = m.group("file")
+    return {
+        "file": file[2:] if file.startswith("./") else file,
+        "line": int(m.group("line")),
+        "col": int(m.group("col")),
+        "rest": line[m.end():].strip(" :-"),
+    }
+
+
+class LogParser(abc.ABC):
+    """Base class: `feed` gets one plain log line and returns zero or more events."""
+    tool = "generic"
+
+    @abc.abstractmethod
+    def feed(self, line: str) -> list[Event]:
+        ...
+
+
+class _ErrorContext:
+    """
+    Errors span lines: a header ("Failed to compile.", "ERROR in ...") is followed
+    by a location and then the message. Open a short window after a header and
+    emit one error per location found in it.
+    """
+    def __init__(self, window: int = 6):
+        self.window = window
+        self.left = 0
+        self.header = ""
+        self.pending: Optional[dict[str, Any]] = None
+
+    def open(self, header: str) -> None:
+        self.left = self.window
+        self.header = header
+
+    def feed(self, tool: str, line: str) -> list[Event]:
+        out: list[Event] = []
+        if self.pending is not None:
+            # message on the line after the location (Next, CRA)
+            loc, self.pending = self.pending, None
+            text = line.strip()
+            out.append(_error(tool, loc, text if text else (loc["rest"] or self.header)))
+            return out
+        if self.left <= 0:
+            return out
+        self.left -= 1
+        loc = _location(line)
+        if loc is None:
+            return out
+        if loc["rest"]:
+            out.append(_error(tool, loc, loc["rest"]))
+        else:
+            self.pending = loc
+        return out
+
+
+def _error(tool: str, loc: dict[str, Any], message: str) -> Event:
+    return {
+        "kind": "error",
+        "tool": tool,
+        "file": loc["file"],
+        "line": loc["line"],
+        "col": loc["col"],
+        "message": message[:_MESSAGE_MAX],
+    }
+
+
+class ViteParser(LogParser):
+    tool = "vite"
+    _READY = re.compile(r"\bVITE\s+v[\d.]+.*?ready in\s+([\d.]+)\s*(ms|s)\b", re.I)
+    _HMR = re.compile(r"\[vite\]\s+(hmr update|page reload|hmr invalidate)\s+(.+)$", re.I)
+    _ERROR = re.compile(r"\[vite\].*?(internal server error|error)|\[plugin:vite:[^\]]+\]|Transform failed with", re.I)
+    # babel/esbuild plugins: "[plugin:vite:react-babel] /src/App.tsx: Unexpected token (3:4)"
+    _PLUGIN_ERROR = re.compile(rf"\[plugin:[^\]]+\]\s+(\S+\.{_SRC_EXT}):\s+(.+?)\s+\((\d+):(\d+)\)\s*$")
+
+    def __init__(self):
+        self.errors = _ErrorContext()
+
+    def feed(self, line: str) -> list[Event]:
+        m = self._READY.search(line)
+        if m:
+            return [{"kind": "ready", "tool": self.tool, "ms": _duration_ms(m.group(1), m.group(2))}]
+        m = self._HMR.search(line)
+        if m:
+            action = {"hmr update": "update", "page reload": "reload"}.get(m.group(1).lower(), "invalidate")
+            paths = [p for p in re.split(r",\s*", re.sub(r"\s*\(x\d+\)$", "", m.group(2).strip())) if p]
+            return [{"kind": "hmr", "tool": self.tool, "action": action, "paths": paths}]
+        m = self._PLUGIN_ERROR.search(line)
+        if m:
+            return [_error(self.tool, {"file": m.group(1), "line": int(m.group(3)), "col": int(m.group(4))}, m.group(2))]
+        if self._ERROR.search(line):
+            self.errors.open(line.strip())
+        return self.errors.feed(self.tool, line)
+
+
+class NextParser(LogParser):
+    tool = "next"
+    _READY = re.compile(r"(?:✓\s*)?Ready in\s+([\d.]+)\s*(ms|s)\b", re.I)
+    _LEGACY_READY = re.compile(r"^-\s*ready\s+started server", re.I)
+    _COMPILED = re.compile(r"(?:✓|-\s*event)?\s*compiled\b.*?\bin\s+([\d.]+)\s*(ms|s)\b(?:\s*\((\d+) modules\))?", re.I)
+    _COMPILING = re.compile(r"(?:○|-\s*wait)\s*compiling\s+(\S+)", re.I)
+    _ERROR = re.compile(r"^\s*(?:⨯|-\s*error\b)|Failed to compile|Type error:|Module not found", re.I)
+
+    def __init__(self):
+        self.errors = _ErrorContext()
+        self.route: Optional[str] = None
+
+    def feed(self, line: str) -> list[Event]:
+        m = self._READY.search(line)
+        if m and "VITE" not in line:
+            return [{"kind": "ready", "tool": self.tool, "ms": _duration_ms(m.group(1), m.group(2))}]
+        if self._LEGACY_READY.search(line):
+            return [{"kind": "ready", "tool": self.tool, "ms": None}]
+        m = self._COMPILING.search(line)
+        if m:
+            self.route = m.group(1)
+            return []
+        if re.search(r"\bnext\b|○|✓|⨯|^-\s*(?:event|wait|error)", line, re.I):
+            m = self._COMPILED.search(line)
+            if m:
+                ev: Event = {"kind": "rebuild", "tool": self.tool, "ms": _duration_ms(m.group(1), m.group(2)), "ok": True}
+                if m.group(3):
+                    ev["modules"] = int(m.group(3))
+                if self.route:
+                    ev["route"] = self.route
+                self.route = None
+                return [ev]
+        if self._ERROR.search(line):
+            self.errors.open(line.strip())
+        return self.errors.feed(self.tool, line)
+
+
+class WebpackParser(LogParser):
+    """Create React App / plain webpack-dev-server."""
+    tool = "webpack"
+    _STARTING = re.compile(r"Starting the development server", re.I)
+    _COMPILED = re.compile(r"webpack(?: [\d.]+)? compiled(?: (successfully)| with (\d+) errors?| with (\d+) warnings?)?.*?\bin\s+([\d.]+)\s*(ms|s)\b", re.I)
+    _CRA_OK = re.compile(r"^Compiled successfully!?$|^Compiled with warnings\.?$", re.I)
+    _ERROR = re.compile(r"^Failed to compile\.?$|^ERROR in\b|Module not found: Error", re.I)
+    _ESLINT = re.compile(r"^\s*Line\s+(\d+):(\d+):\s+(.+)$")
+
+    def __init__(self):
+        self.errors = _ErrorContext()
+        self.started: Optional[float] = None
+        self.file: Optional[str] = None
+
+    def feed(self, line: str) -> list[Event]:
+        if self._STARTING.search(line):
+            self.started = time.monotonic()
+            return []
+        m = self._COMPILED.search(line)
+        if m:
+            errors = int(m.group(2) or 0)
+            first = self.started is not None
+            self.started = None
+            ms = _duration_ms(m.group(4), m.group(5))
+            kind = "ready" if first and not errors else "rebuild"
+            ev: Event = {"kind": kind, "tool": self.tool, "ms": ms}
+            if kind == "rebuild":
+                ev["ok"] = errors == 0
+            return [ev]
+        if self._CRA_OK.search(line.strip()):
+            if self.started is not None:
+                ms = int((time.monotonic() - self.started) * 1000)
+                self.started = None
+                return [{"kind": "ready", "tool": self.tool, "ms": ms}]
+            return []
+        # CRA/eslint: "./src/App.js" on one line, then "  Line 12:5:  'x' is not defined  no-undef"
+        stripped = line.strip()
+        if re.fullmatch(rf"\.?/?[\w./@\-]+\.{_SRC_EXT}", stripped):
+            self.file = stripped[2:] if stripped.startswith("./") else stripped
+            return []
+        m = self._ESLINT.match(line)
+        if m and self.file:
+            return [_error(self.tool, {"file": self.file, "line": int(m.group(1)), "col": int(m.group(2))}, m.group(3).strip())]
+        if self._ERROR.search(stripped):
+            self.errors.open(stripped)
+            # "ERROR in ./src/App.js 12:5" carries the location itself
+            m = re.search(rf"ERROR in\s+(\S+\.{_SRC_EXT})\s+(\d+):(\d+)(?:-\d+)?", stripped)
+            if m:
+                self.errors.pending = {
+                    "file": m.group(1)[2:] if m.group(1).startswith("./") else m.group(1),
+                    "line": int(m.group(2)), "col": int(m.group(3)), "rest": "",
+                }
+                return []
+        return self.errors.feed(self.tool, line)
+
+
+class InstallParser(LogParser):
+    """npm / yarn / pnpm install progress and completion."""
+    tool = "npm"
+    _NPM_DONE = re.compile(r"^(?:added (\d+) packages?.*?|up to date.*?)(?:audited (\d+) packages? )?in\s+([\d.]+)\s*(ms|s|m)\b", re.I)
+    _NPM_ERR = re.compile(r"^npm (?:ERR!|error)\s+(.*)$", re.I)
+    _YARN_STEP = re.compile(r"^\[(\d)/(\d)\]\s+(.+?)\.*$")
+    _DONE_IN = re.compile(r"^(?:✨\s*)?Done in\s+([\d.]+)\s*(ms|s|m)\b", re.I)
+    _PNPM_PROGRESS = re.compile(r"^Progress: resolved (\d+), reused (\d+), downloaded (\d+), added (\d+)(, done)?")
+
+    def __init__(self):
+        self.failed = False
+
+    def feed(self, line: str) -> list[Event]:
+        s = line.strip()
+        m = self._NPM_DONE.search(s)
+        if m:
+            ev: Event = {"kind": "install", "tool": "npm", "phase": "done", "ms": _duration_ms(m.group(3), m.group(4))}
+            if m.group(1):
+                ev["packages"] = int(m.group(1))
+            return [ev]
+        m = self._PNPM_PROGRESS.search(s)
+        if m:
+            resolved, reused, downloaded, added = (int(m.group(i)) for i in range(1, 5))
+            return [{
+                "kind": "install", "tool": "pnpm", "phase": "done" if m.group(5) else "progress",
+                "resolved": resolved, "reused": reused, "downloaded": downloaded, "added": added,
+            }]
+        m = self._YARN_STEP.search(s)
+        if m:
+            return [{"kind": "install", "tool": "yarn", "phase": "progress",
+                     "step": int(m.group(1)), "steps": int(m.group(2)), "label": m.group(3)}]
+        m = self._DONE_IN.search(s)
+        if m:
+            return [{"kind": "install", "tool": "yarn/pnpm", "phase": "done", "ms": _duration_ms(m.group(1), m.group(2))}]
+        m = self._NPM_ERR.search(s)
+        if m and not self.failed:
+            # npm prints a dozen ERR! lines per failure; report the first
+            self.failed = True
+            return [{"kind": "install", "tool": "npm", "phase": "failed", "message": m.group(1)[:_MESSAGE_MAX]}]
+        return []
+
+
+PARSERS: list[type[LogParser]] = []
+
+
+def register_parser(cls: type[LogParser]) -> type[LogParser]:
+    PARSERS.append(cls)
+    return cls
+
+
+for _cls in (InstallParser, ViteParser, NextParser, WebpackParser):
+    register_parser(_cls)
+
+
+class DevLogParser:
+    """All registered parsers for one dev process (they keep per-process state)."""
+    def __init__(self):
+        self.parsers = [cls() for cls in PARSERS]
+
+    def feed(self, line: str) -> list[Event]:
+        out: list[Event] = []
+        seen: set[tuple] = set()
+        for p in self.parsers:
+            try:
+                events = p.feed(line)
+            except Exception:
+                continue  # a parser bug must not break log streaming
+            for ev in events:
+                if ev["kind"] == "error":
+                    # generic headers ("Failed to compile.") can open several parsers' windows
+                    key = (ev["file"], ev["line"], ev["col"])
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                out.append(ev)
+        return out
+
+
+class DevLogMetrics:
+    """Per-session dev-server timings and counters folded from dev events."""
+    def __init__(self):
+        self.tool: Optional[str] = None
+        self.ready_ms: Optional[int] = None
+        self.install_ms: Optional[int] = None
+        self.install_failed = False
+        self.rebuilds = 0
+        self.rebuild_failures = 0
+        self.rebuild_ms_total = 0
+        self.rebuild_ms_max = 0
+        self.rebuild_ms_last: Optional[int] = None
+        self.hmr_updates = 0
+        self.page_reloads = 0
+        self.errors = 0
+        self.last_error: Optional[Event] = None
+
+    def record(self, ev: Event) -> None:
+        kind = ev.get("kind")
+        if kind == "ready":
+            self.tool = ev.get("tool")
+            self.ready_ms = ev.get("ms")
+        elif kind == "rebuild":
+            self.rebuilds += 1
+            if not ev.get("ok", True):
+                self.rebuild_failures += 1
+            ms = ev.get("ms") or 0
+            self.rebuild_ms_total += ms
+            self.rebuild_ms_max = max(self.rebuild_ms_max, ms)
+            self.rebuild_ms_last = ms
+        elif kind == "hmr":
+            if ev.get("action") == "reload":
+                self.page_reloads += 1
+            else:
+                self.hmr_updates += 1
+        elif kind == "error":
+            self.errors += 1
+            self.last_error = {k: ev.get(k) for k in ("tool", "file", "line", "col", "message")}
+        elif kind == "install":
+            if ev.get("phase") == "done" and ev.get("ms") is not None:
+                self.install_ms = ev["ms"]
+            elif ev.get("phase") == "failed":
+                self.install_failed = True
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "tool": self.tool,
+            "ready_ms": self.ready_ms,
+            "install_ms": self.install_ms,
+            "install_failed": self.install_failed,
+            "rebuilds": self.rebuilds,
+            "rebuild_failures": self.rebuild_failures,
+            "rebuild_ms_avg": round(self.rebuild_ms_total / self.rebuilds, 1) if self.rebuilds else None,
+            "rebuild_ms_max": self.rebuild_ms_max or None,
+            "rebuild_ms_last": self.rebuild_ms_last,
+            "hmr_updates": self.hmr_updates,
+            "page_reloads": self.page_reloads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
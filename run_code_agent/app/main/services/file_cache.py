@@ -0,0 +1,141 @@
+# app/main/services/file_cache.py
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from ..config import CONTENT_CACHE_MAX_BYTES, CONTENT_CACHE_MAX_ENTRIES
+from ..utils.text import SAMPLE_BYTES, TextInfo, classify
+
+# (st_ino, st_mtime_ns, st_size) -- changes whenever the file is replaced or rewritten
+FileIdentity = tuple[int, int, int]
+
+
+def identity_of(st: os.stat_result) -> FileIdentity:
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def content_etag(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@dataclass
+class CachedFile:
+    identity: FileIdentity
+    etag: str
+    info: TextInfo
+    content: Optional[str]  # decoded text; None for binary/undecodable files
+    nbytes: int
+
+
+class ContentCache:
+    """
+    Bounded LRU of decoded file contents keyed by absolute path.
+    An entry is only served while the file identity (inode, mtime, size) still matches;
+    the fs watcher and write paths also invalidate explicitly.
+    Thread-safe: readers run in worker threads.
+    """
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, CachedFile] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, identity: FileIdentity) -> Optional[CachedFile]:
+        with self._lock:
+            entry = self._items.get(path)
+            if entry is None or entry.identity != identity:
+                self.misses += 1
+                return None
+            self._items.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def put(self, path: str, entry: CachedFile) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(path, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._items[path] = entry
+            self._bytes += entry.nbytes
+            while self._items and (self._bytes > self.max_bytes or len(self._items) > self.max_entries):
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, path: str) -> None:
+        """Drop `path` and, if it was a directory, everything below it."""
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._items if k == path or k.startswith(prefix)]:
+                self._bytes -= self._items.pop(key).nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+class TextInfoCache:
+    """LRU of TextInfo per file identity; only head/tail samples are ever read."""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, tuple[FileIdentity, TextInfo]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, identity: FileIdentity) -> Optional[TextInfo]:
+        with self._lock:
+            hit = self._items.get(path)
+            if hit is None or hit[0] != identity:
+                return None
+            self._items.move_to_end(path)
+            return hit[1]
+
+    def put(self, path: str, identity: FileIdentity, info: TextInfo) -> None:
+        with self._lock:
+            self._items[path] = (identity, info)
+            self._items.move_to_end(path)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, path: str) -> None:
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._items if k == path or k.startswith(prefix)]:
+                del self._items[key]
+
+
+CONTENT_CACHE = ContentCache(CONTENT_CACHE_MAX_BYTES, CONTENT_CACHE_MAX_ENTRIES)
+TEXT_INFO_CACHE = TextInfoCache(CONTENT_CACHE_MAX_ENTRIES * 4)
+
+
+def classify_path(path: Path, st: Optional[os.stat_result] = None) -> TextInfo:
+    """Classify a file from its head and tail samples, cached per file identity (sync)."""
+    st = st or path.stat()
+    key, ident = str(path), identity_of(st)
+    info = TEXT_INFO_CACHE.get(key, ident)
+    if info is not None:
+        return info
+    with open(path, "rb") as fh:
+        head = fh.read(SAMPLE_BYTES)
+        tail = b""
+        if st.st_size > 2 * SAMPLE_BYTES:
+            fh.seek(-SAMPLE_BYTES, os.SEEK_END)
+            tail = fh.read(SAMPLE_BYTES)
+        elif st.st_size > SAMPLE_BYTES:
+            tail = fh.read()
+    info = classify(head, tail)
+    TEXT_INFO_CACHE.put(key, ident, info)
+    return info
+
+
+def invalidate_path(path: str) -> None:
+    CONTENT_CACHE.invalidate(path)
+    TEXT_INFO_CACHE.invalidate(path)
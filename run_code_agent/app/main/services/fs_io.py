@@ -0,0 +1,262 @@
+# app/main/services/fs_io.py
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import stat as _stat
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from fastapi import HTTPException
+
+from ..config import MAX_READ_BYTES, MAX_WRITE_BYTES
+from ..utils.paths import safe_join
+from ..utils.text import TextInfo, classify_bytes, decode_text
+from .usage import check_quota, record_writes
+from .file_cache import (
+    CONTENT_CACHE, TEXT_INFO_CACHE, CachedFile, classify_path, content_etag, identity_of, invalidate_path,
+)
+
+
+def read_text_file(
+    root: Path, rel: str, if_none_match: Optional[str] = None
+) -> tuple[Optional[str], str, Optional[str]]:
+    """
+    Read a workspace file as text (sync; call via a thread).
+    Returns (content, etag, encoding); content is None when `if_none_match` equals the current etag.
+    Served from CONTENT_CACHE while the file identity is unchanged.
+    """
+    f = safe_join(root, rel)
+    try:
+        st = f.stat()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="file not found")
+    if not _stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="file not found")
+    if st.st_size > MAX_READ_BYTES:
+        raise HTTPException(status_code=413, detail="E_FILE_TOO_LARGE")
+
+    key, ident = str(f), identity_of(st)
+    entry = CONTENT_CACHE.get(key, ident)
+    if entry is None:
+        info = TEXT_INFO_CACHE.get(key, ident)
+        if info is not None and not info.is_text:
+            raise HTTPException(status_code=415, detail="E_BINARY_NOT_ALLOWED")
+        rawb = f.read_bytes()
+        if len(rawb) > MAX_READ_BYTES:
+            raise HTTPException(status_code=413, detail="E_FILE_TOO_LARGE")
+        info = info or classify_bytes(rawb)
+        content = None
+        if info.is_text and info.encoding:
+            try:
+                content = decode_text(rawb, info)
+            except UnicodeDecodeError:
+                info = TextInfo(True, None)
+        entry = CachedFile(ident, content_etag(rawb), info, content, len(rawb))
+        CONTENT_CACHE.put(key, entry)
+        TEXT_INFO_CACHE.put(key, ident, info)
+
+    if not entry.info.is_text:
+        raise HTTPException(status_code=415, detail="E_BINARY_NOT_ALLOWED")
+    if entry.content is None:
+        raise HTTPException(status_code=415, detail="E_UNSUPPORTED_ENCODING")
+    if if_none_match and if_none_match == entry.etag:
+        return None, entry.etag, entry.info.encoding
+    return entry.content, entry.etag, entry.info.encoding
+
+
+def _encoding_for_write(f: Path) -> str:
+    """Keep the encoding (and BOM) of an existing text file; new files are UTF-8."""
+    try:
+        info = classify_path(f)
+    except OSError:
+        return "utf-8"
+    return info.encoding if info.is_text and info.encoding else "utf-8"
+
+
+def _remember_written(f: Path, content: str, b: bytes, encoding: str) -> str:
+    """Prime the caches with freshly written bytes; returns the new etag."""
+    etag = content_etag(b)
+    invalidate_path(str(f))
+    with contextlib.suppress(OSError):
+        ident = identity_of(f.stat())
+        info = TextInfo(True, encoding, bom=encoding in ("utf-8-sig", "utf-16", "utf-32"))
+        CONTENT_CACHE.put(str(f), CachedFile(ident, etag, info, content, len(b)))
+        TEXT_INFO_CACHE.put(str(f), ident, info)
+    return etag
+
+
+def write_text_file(root: Path, rel: str, content: str, create_if_missing: bool = True) -> str:
+    """Write text to a workspace file (sync; call via a thread). Returns the new etag."""
+    f = safe_join(root, rel)
+    encoding = _encoding_for_write(f) if f.is_file() else "utf-8"
+    b = content.encode(encoding)
+    if len(b) > MAX_WRITE_BYTES:
+        raise HTTPException(status_code=413, detail="E_FILE_TOO_LARGE")
+    if not f.exists():
+        if not create_if_missing:
+            raise HTTPException(status_code=404, detail="file does not exist")
+    change = [(f.relative_to(root).as_posix(), len(b))]
+    check_quota(root, change)
+    f.parent.mkdir(parents=True, exist_ok=True)
+    f.write_bytes(b)
+    record_writes(root, change)
+    return _remember_written(f, content, b, encoding)
+
+
+async def read_files(
+    root: Path,
+    paths: Iterable[str],
+    if_none_match: Optional[dict[str, str]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Read many files concurrently. Failures are reported per path:
+      [{"path": ..., "ok": True, "etag": ..., "content": ...}
+       | {"path": ..., "ok": True, "etag": ..., "not_modified": True}
+       | {"path": ..., "ok": False, "message": ...}]
+    """
+    etags = if_none_match or {}
+
+    async def _one(rel: str) -> dict[str, Any]:
+        try:
+            content, etag, encoding = await asyncio.to_thread(read_text_file, root, rel, etags.get(rel))
+            if content is None:
+                return {"path": rel, "ok": True, "etag": etag, "not_modified": True}
+            return {"path": rel, "ok": True, "etag": etag, "encoding": encoding, "content": content}
+        except HTTPException as he:
+            return {"path": rel, "ok": False, "message": he.detail}
+        except Exception as e:
+            return {"path": rel, "ok": False, "message": f"{e.__class__.__name__}: {e}"}
+
+    return list(await asyncio.gather(*(_one(p) for p in paths)))
+
+
+def _tmp_sibling(target: Path, tag: str) -> Path:
+    return target.with_name(f".{target.name}.{tag}-{uuid.uuid4().hex[:8]}")
+
+
+async def write_files(root: Path, files: list[tuple[str, str, bool]]) -> list[dict[str, str]]:
+    """
+    All-or-nothing write of many files: (path, content, create_if_missing).
+      1) validate every entry (paths, sizes, existence) before touching disk
+      2) stage contents into temp siblings concurrently
+      3) rename temps over targets; on failure, restore what was replaced
+    Raises HTTPException on the first validation/staging error; nothing is changed then.
+    Returns [{"path": ..., "etag": ...}] in request order.
+    """
+    staged: list[tuple[str, Path, bytes]] = []
+    texts: dict[Path, tuple[str, str]] = {}
+    seen: set[Path] = set()
+    for rel, content, create_if_missing in files:
+        f = safe_join(root, rel)
+        if f in seen:
+            raise HTTPException(status_code=400, detail=f"E_DUPLICATE_PATH: {rel}")
+        seen.add(f)
+        encoding = _encoding_for_write(f) if f.is_file() else "utf-8"
+        b = content.encode(encoding)
+        if len(b) > MAX_WRITE_BYTES:
+            raise HTTPException(status_code=413, detail=f"E_FILE_TOO_LARGE: {rel}")
+        if f.is_dir():
+            raise HTTPException(status_code=400, detail=f"E_IS_DIRECTORY: {rel}")
+        if not f.exists() and not create_if_missing:
+            raise HTTPException(status_code=404, detail=f"file does not exist: {rel}")
+        staged.append((rel, f, b))
+        texts[f] = (content, encoding)
+
+    changes = [(f.relative_to(root).as_posix(), len(b)) for _, f, b in staged]
+    await asyncio.to_thread(check_quota, root, changes)
+
+    created_dirs: list[Path] = []
+    temps: dict[Path, Path] = {}
+
+    def _stage(f: Path, b: bytes) -> None:
+        tmp = _tmp_sibling(f, "tmp")
+        temps[f] = tmp
+        with open(tmp, "wb") as fh:
+            fh.write(b)
+        with contextlib.suppress(OSError):
+            # keep the permissions of the file being replaced
+            os.chmod(tmp, f.stat().st_mode & 0o7777)
+
+    def _mkdirs() -> None:
+        for _, f, _ in staged:
+            missing = []
+            p = f.parent
+            while not p.exists():
+                missing.append(p)
+                p = p.parent
+            for d in reversed(missing):
+                d.mkdir(exist_ok=True)
+                created_dirs.append(d)
+
+    def _discard() -> None:
+        for tmp in temps.values():
+            with contextlib.suppress(OSError):
+                tmp.unlink()
+        for d in reversed(created_dirs):
+            with contextlib.suppress(OSError):
+                d.rmdir()
+
+    def _commit() -> None:
+        # (target, backup or None if target did not exist)
+        done: list[tuple[Path, Path | None]] = []
+        try:
+            for _, f, _ in staged:
+                backup = None
+                if f.exists():
+                    backup = _tmp_sibling(f, "bak")
+                    try:
+                        os.link(f, backup)
+                    except OSError:
+                        os.replace(f, backup)
+                done.append((f, backup))
+                os.replace(temps[f], f)
+        except Exception:
+            for f, backup in reversed(done):
+                with contextlib.suppress(OSError):
+                    if backup is not None:
+                        os.replace(backup, f)
+                    else:
+                        f.unlink()
+            raise
+        finally:
+            for _, backup in done:
+                if backup is not None:
+                    with contextlib.suppress(OSError):
+                        backup.unlink()
+
+    async def _apply() -> None:
+        try:
+            await asyncio.to_thread(_mkdirs)
+            results = await asyncio.gather(
+                *(asyncio.to_thread(_stage, f, b) for _, f, b in staged), return_exceptions=True
+            )
+            for r in results:
+                if isinstance(r, BaseException):
+                    raise r
+            await asyncio.to_thread(_commit)
+        except BaseException:
+            await asyncio.to_thread(_discard)
+            raise
+
+    # Worker threads cannot be interrupted: if the caller is cancelled, let the
+    # job commit or roll back completely before the cancellation propagates.
+    job = asyncio.ensure_future(_apply())
+    cancelled = False
+    while True:
+        try:
+            await asyncio.shield(job)
+            break
+        except asyncio.CancelledError:
+            if job.done():
+                raise
+            cancelled = True
+    record_writes(root, changes)
+    if cancelled:
+        raise asyncio.CancelledError
+    written = []
+    for rel, f, b in staged:
+        content, encoding = texts[f]
+        written.append({"path": rel, "etag": _remember_written(f, content, b, encoding)})
+    return written
@@ -7,6 +7,10 @@ from typing import Any
 from fastapi import WebSocket
 from ..config import WATCH_ENABLED, DEFAULT_EXCLUDES
 from ..utils.paths import safe_join
+from .file_cache import invalidate_path
+from .metrics import FS_WATCH_EVENTS
+from .search import SEARCH_INDEXES
+from .usage import USAGE
 
 # Optional dependency types
 try:
@@ -36,9 +40,13 @@ async def fs_watcher(sess, ws: WebSocket, send_lock: asyncio.Lock):
         return
     try:
         async for changes in awatch(sess.cwd, watch_filter=_should_watch):
+            changed = [Path(p) for _, p in changes]
+            SEARCH_INDEXES.notify(sess.cwd, changed)
+            USAGE.notify(sess.cwd, changed)
             events = []
             for ch, p in changes:
                 pp = Path(p)
+                invalidate_path(str(pp))
                 try:
                     rel = str(pp.resolve().relative_to(sess.cwd))
                 except Exception:
@@ -51,6 +59,7 @@ async def fs_watcher(sess, ws: WebSocket, send_lock: asyncio.Lock):
                     mtime = None
                     is_dir = False
                 events.append({"event": _change_name(ch), "path": rel, "is_dir": is_dir, "mtime": mtime})
+                FS_WATCH_EVENTS.inc(event=events[-1]["event"])
             if events:
                 async with send_lock:
                     await ws.send_json({"type": "fs_batch", "events": events, "session_id": sess.id})
@@ -0,0 +1,202 @@
+# app/main/services/metrics.py
+"""
+Service metrics exposed on /metrics (see utils/metrics.py for the registry).
+
+Besides the counters/histograms updated by the ws router, dev pump and
+watcher, this module owns the runtime probes: event-loop lag sampling, an
+instrumented default thread pool (queue wait of asyncio.to_thread work) and
+process CPU/RSS read at scrape time. With LOOP_WATCHDOG on, stalls longer than
+LOOP_BLOCK_THRESHOLD_MS are counted and their blocking stacks logged.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+
+from ..config import LOOP_BLOCK_LOG_REPEAT, LOOP_BLOCK_THRESHOLD_MS, LOOP_WATCHDOG
+from ..utils.loop_watchdog import LoopWatchdog
+from ..utils.metrics import REGISTRY, SLOW_BUCKETS, Sample
+
+WS_CONNECTIONS = REGISTRY.gauge("rca_ws_connections", "Open /ws connections")
+WS_REQUESTS = REGISTRY.counter("rca_ws_requests_total", "ws messages handled", ("type", "outcome"))
+WS_LATENCY = REGISTRY.histogram("rca_ws_request_seconds", "Time to handle one ws message (until its handler returns)", ("type",))
+WS_SEND_WAITERS = REGISTRY.gauge("rca_ws_send_waiters", "Frames waiting for a connection's send lock (send queue depth)")
+WS_SEND_WAIT = REGISTRY.histogram("rca_ws_send_wait_seconds", "Time a frame waited for the send lock")
+WS_FRAMES_DROPPED = REGISTRY.counter("rca_ws_frames_dropped_total", "Frames not delivered", ("reason",))
+
+SETUP_SECONDS = REGISTRY.histogram("rca_setup_seconds", "Workspace setup phases", ("phase",), buckets=SLOW_BUCKETS)
+DEV_EVENT_SECONDS = REGISTRY.histogram(
+    "rca_dev_seconds", "Dev server timings parsed from its output", ("kind",), buckets=(0.05, *SLOW_BUCKETS)
+)
+DEV_ERRORS = REGISTRY.counter("rca_dev_errors_total", "Compile errors reported by dev servers", ("tool",))
+FS_WATCH_EVENTS = REGISTRY.counter("rca_fs_watch_events_total", "File changes seen by the watcher", ("event",))
+
+LOOP_LAG = REGISTRY.histogram(
+    "rca_event_loop_lag_seconds", "Delay of a timer callback beyond its deadline",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+LOOP_LAG_MAX = REGISTRY.gauge("rca_event_loop_lag_max_seconds", "Largest loop lag in the last sampling window")
+LOOP_STALLS = REGISTRY.histogram(
+    "rca_event_loop_stall_seconds", "Loop stalls over LOOP_BLOCK_THRESHOLD_MS (watchdog)",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+LOOP_BLOCKING_STACKS = REGISTRY.counter(
+    "rca_event_loop_blocking_calls_total", "Stalls caught in progress by the watchdog, by call site", ("site",)
+)
+THREADPOOL_WAIT = REGISTRY.histogram(
+    "rca_threadpool_queue_wait_seconds", "Time to_thread work waited for a worker thread",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+THREADPOOL_RUN = REGISTRY.histogram("rca_threadpool_run_seconds", "Run time of to_thread work")
+
+LOOP_LAG_INTERVAL = 0.25
+LOOP_LAG_WINDOW = 60.0
+
+
+class MeteredLock(asyncio.Lock):
+    """asyncio.Lock for ws sends that reports waiters and wait time."""
+
+    async def acquire(self) -> bool:
+        if not self.locked():
+            return await super().acquire()
+        WS_SEND_WAITERS.inc()
+        started = time.perf_counter()
+        try:
+            return await super().acquire()
+        finally:
+            WS_SEND_WAITERS.dec()
+            WS_SEND_WAIT.observe(time.perf_counter() - started)
+
+
+class InstrumentedThreadPool(ThreadPoolExecutor):
+    """Default executor that records queue wait and run time of each job."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued = time.perf_counter()
+
+        def _run():
+            started = time.perf_counter()
+            THREADPOOL_WAIT.observe(started - queued)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                THREADPOOL_RUN.observe(time.perf_counter() - started)
+
+        return super().submit(_run)
+
+    def queue_depth(self) -> int:
+        return self._work_queue.qsize()
+
+
+_executor: Optional[InstrumentedThreadPool] = None
+WATCHDOG: Optional[LoopWatchdog] = None
+
+
+async def _sample_loop_lag() -> None:
+    loop = asyncio.get_running_loop()
+    window_max, window_start = 0.0, loop.time()
+    while True:
+        before = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - before - LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(lag)
+        window_max = max(window_max, lag)
+        LOOP_LAG_MAX.set(window_max)
+        if loop.time() - window_start >= LOOP_LAG_WINDOW:
+            window_max, window_start = 0.0, loop.time()
+
+
+def start_runtime_metrics() -> asyncio.Task:
+    """Install the instrumented default executor and start loop-lag sampling (call from lifespan)."""
+    global _executor, WATCHDOG
+    loop = asyncio.get_running_loop()
+    _executor = InstrumentedThreadPool(thread_name_prefix="rca-io")
+    loop.set_default_executor(_executor)
+    if LOOP_WATCHDOG:
+        WATCHDOG = LoopWatchdog(
+            LOOP_BLOCK_THRESHOLD_MS / 1000,
+            repeat=LOOP_BLOCK_LOG_REPEAT,
+            on_stall=LOOP_STALLS.observe,
+            on_stack=lambda site: LOOP_BLOCKING_STACKS.inc(site=_short_site(site)),
+        )
+        WATCHDOG.start()
+    return asyncio.create_task(_sample_loop_lag(), name="loop_lag_monitor")
+
+
+async def stop_runtime_metrics(task: asyncio.Task) -> None:
+    global WATCHDOG
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+    if WATCHDOG is not None:
+        await WATCHDOG.stop()
+        WATCHDOG = None
+
+
+def _short_site(site: str) -> str:
+    # ".../site-packages/foo/bar.py:12" -> "foo/bar.py:12"; keeps the label readable
+    path, _, line = site.rpartition(":")
+    parts = path.replace("\\", "/").split("/")
+    return "/".join(parts[-2:]) + ":" + line
+
+
+def observe_dev_event(ev: dict[str, Any]) -> None:
+    kind = ev.get("kind")
+    if kind == "error":
+        DEV_ERRORS.inc(tool=str(ev.get("tool")))
+        return
+    if kind == "install":
+        if ev.get("phase") != "done":
+            return
+    elif kind not in ("ready", "rebuild"):
+        return
+    if ev.get("ms") is not None:
+        DEV_EVENT_SECONDS.observe(ev["ms"] / 1000, kind=kind)
+
+
+# ---- scrape-time collectors ----
+def _threadpool_queue() -> Iterable[Sample]:
+    if _executor is not None:
+        yield "rca_threadpool_queue_depth", {}, _executor.queue_depth()
+
+
+def _threadpool_threads() -> Iterable[Sample]:
+    if _executor is not None:
+        yield "rca_threadpool_threads", {}, len(_executor._threads)
+
+
+def _process() -> Iterable[Sample]:
+    import resource
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    yield "rca_process_cpu_seconds_total", {"mode": "user"}, ru.ru_utime
+    yield "rca_process_cpu_seconds_total", {"mode": "system"}, ru.ru_stime
+
+
+def _process_memory() -> Iterable[Sample]:
+    with open("/proc/self/statm") as fh:
+        rss_pages = int(fh.read().split()[1])
+    yield "rca_process_resident_memory_bytes", {}, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _process_fds() -> Iterable[Sample]:
+    yield "rca_process_open_fds", {}, len(os.listdir("/proc/self/fd"))
+
+
+def _sessions() -> Iterable[Sample]:
+    from .sessions import SESSIONS
+    from .dev import dev_running
+    sessions = SESSIONS.snapshot()
+    yield "rca_sessions", {"state": "all"}, len(sessions)
+    yield "rca_sessions", {"state": "initialized"}, sum(1 for s in sessions if s.email)
+    yield "rca_sessions", {"state": "dev_running"}, sum(1 for s in sessions if dev_running(s))
+
+
+REGISTRY.collector("rca_threadpool_queue_depth", "Jobs waiting in the default thread pool", "gauge", _threadpool_queue)
+REGISTRY.collector("rca_threadpool_threads", "Threads started by the default thread pool", "gauge", _threadpool_threads)
+REGISTRY.collector("rca_process_cpu_seconds_total", "CPU time of the server process", "counter", _process)
+REGISTRY.collector("rca_process_resident_memory_bytes", "RSS of the server process", "gauge", _process_memory)
+REGISTRY.collector("rca_process_open_fds", "Open file descriptors", "gauge", _process_fds)
+REGISTRY.collector("rca_sessions", "ws sessions on this worker", "gauge", _sessions)
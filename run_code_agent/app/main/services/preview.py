@@ -0,0 +1,343 @@
+# app/main/services/preview.py
+"""
+Reverse proxy for dev-server previews: /preview/{session_id}/... is forwarded to
+the session's dev server, so the browser only ever talks to this service.
+
+HTTP goes through one shared httpx client (keep-alive pool, bodies streamed in
+both directions, compressed responses passed through untouched). WebSocket
+upgrades (Vite/Next HMR) are bridged frame by frame to an upstream connection
+opened with the same subprotocols.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import time
+from typing import Any, AsyncIterator, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.websockets import WebSocketDisconnect
+
+from ..config import (
+    PREVIEW_CONNECT_TIMEOUT,
+    PREVIEW_KEEPALIVE_EXPIRY,
+    PREVIEW_MAX_CONNECTIONS,
+    PREVIEW_MAX_KEEPALIVE,
+    PREVIEW_READ_TIMEOUT,
+    PREVIEW_STRIP_PREFIX,
+    PREVIEW_UPSTREAM_HOST,
+)
+
+try:  # websockets >= 13
+    from websockets.asyncio.client import connect as _ws_connect  # type: ignore
+    _WS_HEADERS_KW = "additional_headers"
+except Exception:  # pragma: no cover
+    from websockets import connect as _ws_connect  # type: ignore
+    _WS_HEADERS_KW = "extra_headers"
+
+# RFC 7230 hop-by-hop headers, never forwarded
+_HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+}
+_FORWARDED = ("x-forwarded-for", "x-forwarded-host", "x-forwarded-proto", "x-forwarded-prefix")
+# request headers passed to upstream websockets (the rest is generated by the client)
+_WS_FORWARD = {"cookie", "authorization", "user-agent", "accept-language"}
+
+
+def preview_prefix(session_id: str) -> str:
+    return f"/preview/{session_id}"
+
+
+class PreviewMetrics:
+    """Per-session counters for proxied traffic (reported by /healthz)."""
+    def __init__(self):
+        self.requests = 0
+        self.inflight = 0
+        self.upstream_errors = 0
+        self.status: dict[str, int] = {}  # "2xx" -> count
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.ttfb_ms_total = 0.0
+        self.ttfb_ms_max = 0.0
+        self.ws_open = 0
+        self.ws_total = 0
+        self.ws_frames_in = 0
+        self.ws_frames_out = 0
+        self.last_request_at: Optional[float] = None
+
+    def record_response(self, status: int, ttfb_ms: float) -> None:
+        key = f"{status // 100}xx"
+        self.status[key] = self.status.get(key, 0) + 1
+        self.ttfb_ms_total += ttfb_ms
+        self.ttfb_ms_max = max(self.ttfb_ms_max, ttfb_ms)
+
+    def snapshot(self) -> dict[str, Any]:
+        answered = sum(self.status.values())
+        return {
+            "requests": self.requests,
+            "inflight": self.inflight,
+            "upstream_errors": self.upstream_errors,
+            "status": dict(self.status),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ttfb_ms_avg": round(self.ttfb_ms_total / answered, 2) if answered else None,
+            "ttfb_ms_max": round(self.ttfb_ms_max, 2),
+            "ws_open": self.ws_open,
+            "ws_total": self.ws_total,
+            "ws_frames_in": self.ws_frames_in,
+            "ws_frames_out": self.ws_frames_out,
+            "last_request_at": self.last_request_at,
+        }
+
+
+def metrics_for(sess) -> PreviewMetrics:
+    m = getattr(sess, "preview_metrics", None)
+    if m is None:
+        m = sess.preview_metrics = PreviewMetrics()
+    return m
+
+
+# ---- shared upstream pool ----
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=PREVIEW_MAX_CONNECTIONS,
+                max_keepalive_connections=PREVIEW_MAX_KEEPALIVE,
+                keepalive_expiry=PREVIEW_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(PREVIEW_READ_TIMEOUT, connect=PREVIEW_CONNECT_TIMEOUT),
+            follow_redirects=False,
+            trust_env=False,  # never route localhost traffic through HTTP(S)_PROXY
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        with contextlib.suppress(Exception):
+            await _client.aclose()
+        _client = None
+
+
+def pool_info() -> dict[str, Any]:
+    return {
+        "open": _client is not None and not _client.is_closed,
+        "max_connections": PREVIEW_MAX_CONNECTIONS,
+        "max_keepalive": PREVIEW_MAX_KEEPALIVE,
+        "keepalive_expiry": PREVIEW_KEEPALIVE_EXPIRY,
+    }
+
+
+# ---- helpers ----
+def _upstream_port(sess) -> int:
+    proc = getattr(sess, "dev_proc", None)
+    if proc is None or getattr(proc, "returncode", None) is not None:
+        raise HTTPException(status_code=503, detail="E_DEV_NOT_RUNNING")
+    # the port the server actually printed wins (Vite moves on when the requested one is taken)
+    if sess.dev_url:
+        with contextlib.suppress(ValueError):
+            port = urlsplit(sess.dev_url).port
+            if port:
+                return port
+    if not sess.dev_port:
+        raise HTTPException(status_code=503, detail="E_DEV_NOT_RUNNING")
+    return sess.dev_port
+
+
+def _upstream_target(scope: dict[str, Any], session_id: str) -> str:
+    """Raw (still percent-encoded) path + query to request upstream."""
+    raw = scope.get("raw_path")
+    path = raw.decode("latin-1") if raw else scope["path"]
+    if PREVIEW_STRIP_PREFIX:
+        path = path[len(preview_prefix(session_id)):] or "/"
+    query = scope.get("query_string") or b""
+    return path + ("?" + query.decode("latin-1") if query else "")
+
+
+def _connection_tokens(values: list[str]) -> set[str]:
+    """Headers named in Connection are hop-by-hop too."""
+    return {t.strip().lower() for v in values for t in v.split(",") if t.strip()}
+
+
+def _request_headers(request: Request, session_id: str) -> list[tuple[str, str]]:
+    # Host is left to httpx (localhost:port), which dev servers' host checks accept
+    drop = _HOP_BY_HOP | _connection_tokens(request.headers.getlist("connection")) | {"host", *_FORWARDED}
+    out = [(k, v) for k, v in request.headers.items() if k.lower() not in drop]
+    client = request.client.host if request.client else ""
+    prior = request.headers.get("x-forwarded-for")
+    values = {
+        "x-forwarded-for": f"{prior}, {client}" if prior else client,
+        "x-forwarded-host": request.headers.get("x-forwarded-host") or request.headers.get("host", ""),
+        "x-forwarded-proto": request.headers.get("x-forwarded-proto") or request.url.scheme,
+        "x-forwarded-prefix": preview_prefix(session_id),
+    }
+    return out + [(h, values[h]) for h in _FORWARDED]
+
+
+def _rewrite_location(value: str, session_id: str, port: int) -> str:
+    """Keep redirects inside the preview prefix."""
+    if not PREVIEW_STRIP_PREFIX:
+        return value
+    parts = urlsplit(value)
+    if parts.scheme in ("http", "https") and parts.port == port and parts.hostname in ("localhost", "127.0.0.1", "::1", PREVIEW_UPSTREAM_HOST):
+        value = parts.path or "/"
+        if parts.query:
+            value += "?" + parts.query
+    if value.startswith("/") and not value.startswith("//"):
+        return preview_prefix(session_id) + value
+    return value
+
+
+def _response_headers(upstream: httpx.Response, session_id: str, port: int) -> list[tuple[bytes, bytes]]:
+    drop = _HOP_BY_HOP | _connection_tokens(upstream.headers.get_list("connection"))
+    out = []
+    for k, v in upstream.headers.multi_items():
+        lk = k.lower()
+        if lk in drop:
+            continue
+        if lk == "location":
+            v = _rewrite_location(v, session_id, port)
+        out.append((lk.encode("latin-1"), v.encode("latin-1")))
+    return out
+
+
+# ---- HTTP ----
+async def proxy_http(request: Request, sess) -> StreamingResponse:
+    port = _upstream_port(sess)
+    m = metrics_for(sess)
+    m.requests += 1
+    m.last_request_at = time.time()
+
+    async def _request_body() -> AsyncIterator[bytes]:
+        async for chunk in request.stream():
+            m.bytes_in += len(chunk)
+            yield chunk
+
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    client = _get_client()
+    upstream_req = client.build_request(
+        request.method,
+        f"http://{PREVIEW_UPSTREAM_HOST}:{port}{_upstream_target(request.scope, sess.id)}",
+        headers=_request_headers(request, sess.id),
+        content=_request_body() if has_body else None,
+    )
+
+    started = time.perf_counter()
+    m.inflight += 1
+    try:
+        upstream = await client.send(upstream_req, stream=True)
+    except httpx.TimeoutException:
+        m.inflight -= 1
+        m.upstream_errors += 1
+        m.record_response(504, (time.perf_counter() - started) * 1000)
+        raise HTTPException(status_code=504, detail="E_PREVIEW_UPSTREAM_TIMEOUT")
+    except httpx.HTTPError:
+        m.inflight -= 1
+        m.upstream_errors += 1
+        m.record_response(502, (time.perf_counter() - started) * 1000)
+        raise HTTPException(status_code=502, detail="E_PREVIEW_UPSTREAM")
+    m.record_response(upstream.status_code, (time.perf_counter() - started) * 1000)
+
+    closed = False
+
+    async def _close_upstream() -> None:
+        # runs from the body's finally and as the response's background task; the
+        # latter covers a client that disconnects while the body is parked at a yield
+        # (Starlette cancels the send, the generator is only finalized by GC)
+        nonlocal closed
+        if closed:
+            return
+        closed = True
+        m.inflight -= 1
+        await upstream.aclose()
+
+    async def _response_body() -> AsyncIterator[bytes]:
+        try:
+            # raw: content-encoding stays as the dev server sent it
+            async for chunk in upstream.aiter_raw():
+                m.bytes_out += len(chunk)
+                yield chunk
+        except httpx.HTTPError:
+            m.upstream_errors += 1
+        finally:
+            await _close_upstream()
+
+    response = StreamingResponse(
+        _response_body(), status_code=upstream.status_code, background=BackgroundTask(_close_upstream)
+    )
+    # raw_headers keeps repeated headers (Set-Cookie) and the upstream Content-Length
+    response.raw_headers = _response_headers(upstream, sess.id, port)
+    return response
+
+
+# ---- WebSocket ----
+async def proxy_ws(ws: WebSocket, sess) -> None:
+    m = metrics_for(sess)
+    try:
+        port = _upstream_port(sess)
+    except HTTPException:
+        await ws.close(code=1013)  # try again later
+        return
+
+    offered = [p.strip() for p in ws.headers.get("sec-websocket-protocol", "").split(",") if p.strip()]
+    headers = [(k, v) for k, v in ws.headers.items() if k.lower() in _WS_FORWARD]
+    url = f"ws://{PREVIEW_UPSTREAM_HOST}:{port}{_upstream_target(ws.scope, sess.id)}"
+    try:
+        upstream = await _ws_connect(
+            url,
+            subprotocols=offered or None,
+            open_timeout=PREVIEW_CONNECT_TIMEOUT,
+            max_size=None,
+            compression=None,
+            **{_WS_HEADERS_KW: headers},
+        )
+    except Exception:
+        m.upstream_errors += 1
+        await ws.close(code=1011)
+        return
+
+    await ws.accept(subprotocol=upstream.subprotocol)
+    m.ws_open += 1
+    m.ws_total += 1
+
+    async def _client_to_upstream():
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                return
+            data = msg.get("text") if msg.get("text") is not None else msg.get("bytes")
+            if data is not None:
+                await upstream.send(data)
+                m.ws_frames_in += 1
+
+    async def _upstream_to_client():
+        async for data in upstream:
+            if isinstance(data, str):
+                await ws.send_text(data)
+            else:
+                await ws.send_bytes(data)
+            m.ws_frames_out += 1
+
+    tasks = [asyncio.create_task(_client_to_upstream()), asyncio.create_task(_upstream_to_client())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+            with contextlib.suppress(asyncio.CancelledError, WebSocketDisconnect, Exception):
+                await t
+        m.ws_open -= 1
+        with contextlib.suppress(Exception):
+            await upstream.close()
+        with contextlib.suppress(Exception):
+            await ws.close()
@@ -0,0 +1,577 @@
+# app/main/services/search.py
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+try:  # Python 3.11+
+    from re import _constants as _sre, _parser as _sre_parse
+except ImportError:  # pragma: no cover
+    import sre_constants as _sre  # type: ignore[no-redef]
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+from ..config import (
+    DEFAULT_EXCLUDES,
+    SEARCH_FILE_TIMEOUT_MS,
+    SEARCH_MAX_FILE_BYTES,
+    SEARCH_MAX_INDEX_BYTES,
+    SEARCH_MAX_TOTAL_INDEX_BYTES,
+    SEARCH_MAX_WORKSPACES,
+    SEARCH_QUERY_TIMEOUT_MS,
+    SEARCH_REGEX_MAX_LINE,
+)
+from ..utils.regex_worker import RegexWorker
+from .file_cache import classify_path
+
+_IGNORED_NAMES = DEFAULT_EXCLUDES | {".DS_Store"}
+_LINE_PREVIEW = 300
+
+# rough memory cost used for SEARCH_MAX_INDEX_BYTES accounting
+_POSTING_BYTES = 4     # one uint32 file id in a posting array
+_GRAM_BYTES = 200      # dict slot + key tuple + empty array
+_DOC_BYTES = 120       # per indexed file, plus its path
+_COMPACT_MIN = 100_000  # dead postings tolerated before compacting
+
+Gram = tuple[str, str, str]
+
+
+def _excluded(rel: str) -> bool:
+    return any(part in _IGNORED_NAMES for part in rel.split("/"))
+
+
+def _grams(folded: str) -> set[Gram]:
+    """Distinct trigrams of an already casefolded string."""
+    return set(zip(folded, folded[1:], folded[2:]))
+
+
+def _read_text(p: Path, st: Optional[os.stat_result] = None) -> Optional[str]:
+    """Decoded contents of a searchable text file, None otherwise."""
+    with contextlib.suppress(OSError, UnicodeDecodeError):
+        st = st or p.stat()
+        if st.st_size > SEARCH_MAX_FILE_BYTES:
+            return None
+        info = classify_path(p, st)
+        if info.is_text and info.encoding:
+            return p.read_bytes().decode(info.encoding)
+    return None
+
+
+# ---- query planning ----
+_REPEATS = {_sre.MAX_REPEAT, _sre.MIN_REPEAT, getattr(_sre, "POSSESSIVE_REPEAT", _sre.MAX_REPEAT)}
+
+
+def _regex_literals(parsed) -> list[str]:
+    """Literal runs every match must contain (top level, groups, repeats with min >= 1)."""
+    runs: list[str] = []
+    cur: list[str] = []
+
+    def flush():
+        if len(cur) >= 3:
+            runs.append("".join(cur))
+        cur.clear()
+
+    for op, av in parsed:
+        if op is _sre.LITERAL:
+            cur.append(chr(av))
+            continue
+        flush()
+        if op is _sre.SUBPATTERN:
+            runs += _regex_literals(av[-1])
+        elif op is getattr(_sre, "ATOMIC_GROUP", None):
+            runs += _regex_literals(av)
+        elif op in _REPEATS and av[0] >= 1:
+            runs += _regex_literals(av[2])
+    flush()
+    return runs
+
+
+def _regex_unsafe(parsed, repeated: bool = False) -> bool:
+    """Constructs that backtrack exponentially: nested repeats, alternation under a repeat, backrefs."""
+    for op, av in parsed:
+        if op in _REPEATS:
+            many = av[1] > 1
+            if repeated and many:
+                return True
+            if _regex_unsafe(av[2], repeated or many):
+                return True
+        elif op is _sre.SUBPATTERN:
+            if _regex_unsafe(av[-1], repeated):
+                return True
+        elif op is getattr(_sre, "ATOMIC_GROUP", None):
+            if _regex_unsafe(av, repeated):
+                return True
+        elif op is _sre.BRANCH:
+            if repeated:
+                return True
+            if any(_regex_unsafe(branch, repeated) for branch in av[1]):
+                return True
+        elif op in (_sre.GROUPREF, _sre.GROUPREF_EXISTS):
+            return True
+    return False
+
+
+class TextQuery:
+    """
+    A compiled search_text query: the trigrams a matching file must contain
+    (empty = every file is a candidate) and how to find hits in one file.
+    Literals are matched in the search thread. Regexes match within a line (the
+    first SEARCH_REGEX_MAX_LINE chars of it) in a killable child process
+    (utils/regex_worker.py); a regex without a 3-char literal, or one that can
+    backtrack exponentially, is rejected up front.
+    """
+    def __init__(self, query: str, *, regex: bool = False, case_sensitive: bool = False):
+        if not query:
+            raise ValueError("E_EMPTY_QUERY")
+        self.query = query
+        self.regex = regex
+        self.case_sensitive = case_sensitive
+        self.grams: set[Gram] = set()
+        if regex:
+            flags = re.MULTILINE | (0 if case_sensitive else re.IGNORECASE)
+            self.pattern = re.compile(query, flags)
+            parsed = _sre_parse.parse(query, flags)
+            if _regex_unsafe(parsed):
+                raise ValueError("E_REGEX_UNSAFE")
+            literals = _regex_literals(parsed)
+            if not literals:
+                raise ValueError("E_REGEX_NEEDS_LITERAL")
+            for lit in literals:
+                self.grams |= _grams(lit.casefold())
+        else:
+            folded = query.casefold()
+            # casefold compares like re.IGNORECASE as long as no character expands (ß -> ss)
+            self.needle = query if case_sensitive else (folded if len(folded) == len(query) else None)
+            self.folded = re.compile(re.escape(query), re.IGNORECASE)
+            self.grams = _grams(folded)
+
+    def literal_hits(self, text: str, deadline: float) -> Iterator[tuple[int, int, int]]:
+        """(line number, start, end) of the first hit on each matching line; TimeoutError past `deadline`."""
+        haystack, needle, folded = text, self.needle, None
+        if not self.case_sensitive:
+            haystack = text.casefold() if needle is not None else text
+            # offsets must line up with `text`: fall back to the regex when casefold changed the length
+            if needle is None or len(haystack) != len(text):
+                folded = self.folded
+        pos, line_no, counted_to = 0, 1, 0
+        while pos < len(text):
+            if folded is not None:
+                m = folded.search(text, pos)
+                if not m:
+                    return
+                start, end = m.start(), max(m.end(), m.start() + 1)
+            else:
+                start = haystack.find(needle, pos)
+                if start < 0:
+                    return
+                end = start + len(needle)
+            line_no += text.count("\n", counted_to, start)
+            counted_to = start
+            yield line_no, start, end
+            line_end = text.find("\n", start)
+            pos = len(text) if line_end < 0 else max(line_end + 1, end)  # one hit per line
+            if time.monotonic() > deadline:
+                raise TimeoutError
+
+
+class WorkspaceIndex:
+    """
+    Trigram index of one workspace: every file path, plus for each text file up
+    to SEARCH_MAX_FILE_BYTES the set of its (casefolded) trigrams, stored as
+    posting lists trigram -> file ids. A text query only reads and verifies the
+    files whose ids are in every posting list of the query's trigrams. File
+    contents are not kept; postings count against SEARCH_MAX_INDEX_BYTES.
+
+    Built once in a worker thread, then kept current from fs watcher events.
+    Changed/deleted files leave dead ids in the postings until enough of them
+    pile up to compact.
+    """
+    def __init__(self, root: Path, max_bytes: int = SEARCH_MAX_INDEX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ready = asyncio.Event()
+        self._paths: dict[str, str] = {}  # rel -> lowercased rel
+        self._ids: dict[str, int] = {}  # rel -> live file id
+        self._docs: list[Optional[str]] = []  # file id -> rel (None once dead)
+        self._doc_grams: list[int] = []  # file id -> number of postings it holds
+        self._postings: dict[Gram, array] = {}
+        self._live = 0
+        self._dead = 0
+        self._skipped: set[str] = set()  # text files left out by the byte budget
+        self.nbytes = 0
+        self._lock = threading.Lock()
+
+    # ---- maintenance (sync; run in threads) ----
+    def build(self) -> None:
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d not in _IGNORED_NAMES]
+            for name in filenames:
+                if name in _IGNORED_NAMES:
+                    continue
+                self._add(Path(dirpath) / name)
+
+    def _rel(self, p: Path) -> Optional[str]:
+        try:
+            return p.relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def _add(self, p: Path) -> None:
+        rel = self._rel(p)
+        if rel is None or _excluded(rel):
+            return
+        try:
+            if p.is_symlink():
+                return
+            st = p.stat()
+        except OSError:
+            return
+        text = _read_text(p, st)
+        grams = _grams(text.casefold()) if text is not None else None
+        with self._lock:
+            self._paths[rel] = rel.lower()
+            self._drop(rel)
+            if grams is None:
+                return
+            cost = _DOC_BYTES + len(rel) + _POSTING_BYTES * len(grams)
+            if self.nbytes + cost > self.max_bytes:
+                self._skipped.add(rel)
+                return
+            doc_id = len(self._docs)
+            self._docs.append(rel)
+            self._doc_grams.append(len(grams))
+            self._ids[rel] = doc_id
+            postings = self._postings
+            for g in grams:
+                arr = postings.get(g)
+                if arr is None:
+                    arr = postings[g] = array("I")
+                    cost += _GRAM_BYTES
+                arr.append(doc_id)
+            self._live += len(grams)
+            self.nbytes += cost
+
+    def _drop(self, rel: str) -> None:
+        # holding _lock
+        self._skipped.discard(rel)
+        doc_id = self._ids.pop(rel, None)
+        if doc_id is None:
+            return
+        self._docs[doc_id] = None
+        n = self._doc_grams[doc_id]
+        self._live -= n
+        self._dead += n
+        if self._dead > max(_COMPACT_MIN, self._live):
+            self._compact()
+
+    def _compact(self) -> None:
+        """Renumber live files and drop dead ids from every posting list (holding _lock)."""
+        remap: dict[int, int] = {}
+        docs: list[Optional[str]] = []
+        doc_grams: list[int] = []
+        for old, rel in enumerate(self._docs):
+            if rel is not None:
+                remap[old] = len(docs)
+                docs.append(rel)
+                doc_grams.append(self._doc_grams[old])
+        postings: dict[Gram, array] = {}
+        for g, arr in self._postings.items():
+            kept = array("I", [remap[i] for i in arr if i in remap])
+            if kept:
+                postings[g] = kept
+        self._docs, self._doc_grams, self._postings = docs, doc_grams, postings
+        self._ids = {rel: i for i, rel in enumerate(docs)}
+        self._dead = 0
+        self.nbytes = (
+            _POSTING_BYTES * self._live + _GRAM_BYTES * len(postings)
+            + sum(_DOC_BYTES + len(rel) for rel in docs)
+        )
+
+    def _remove(self, rel: str) -> None:
+        prefix = rel + "/"
+        with self._lock:
+            for key in [k for k in self._paths if k == rel or k.startswith(prefix)]:
+                del self._paths[key]
+                self._drop(key)
+
+    def apply(self, changed: list[Path]) -> None:
+        """Re-sync the given absolute paths (created, modified or deleted)."""
+        for p in changed:
+            rel = self._rel(p)
+            if rel is None or _excluded(rel):
+                continue
+            if p.is_dir():
+                for dirpath, dirnames, filenames in os.walk(p):
+                    dirnames[:] = [d for d in dirnames if d not in _IGNORED_NAMES]
+                    for name in filenames:
+                        self._add(Path(dirpath) / name)
+            elif p.is_file():
+                self._add(p)
+            else:
+                self._remove(rel)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "files": len(self._paths),
+                "indexed": len(self._ids),
+                "skipped": len(self._skipped),
+                "trigrams": len(self._postings),
+                "bytes": self.nbytes,
+            }
+
+    # ---- queries (sync; run in threads) ----
+    def search_files(self, query: str, limit: int) -> list[dict[str, Any]]:
+        """Fuzzy filename match: query chars must appear in order; tighter/basename hits rank first."""
+        q = query.strip().lower()
+        if not q:
+            return []
+        pattern = re.compile(".*?".join(re.escape(ch) for ch in q))
+        with self._lock:
+            paths = list(self._paths.items())
+        scored = []
+        for rel, low in paths:
+            m = pattern.search(low)
+            if not m:
+                continue
+            base_at = low.rfind("/") + 1
+            score = (
+                0 if q in low[base_at:] else 1,  # substring of the file name
+                m.end() - m.start(),             # span of the match
+                0 if m.start() >= base_at else 1,
+                len(low),
+            )
+            scored.append((score, rel))
+        scored.sort()
+        return [{"path": rel} for _, rel in scored[:limit]]
+
+    def candidates(self, grams: set[Gram]) -> list[str]:
+        """Paths of indexed files containing every trigram in `grams` (all of them if empty)."""
+        with self._lock:
+            if not grams:
+                return sorted(self._ids)
+            lists = []
+            for g in grams:
+                arr = self._postings.get(g)
+                if arr is None:
+                    return []
+                lists.append(arr)
+            lists.sort(key=len)
+            ids = set(lists[0])
+            for arr in lists[1:]:
+                ids.intersection_update(arr)
+                if not ids:
+                    return []
+            docs = self._docs
+            return sorted(rel for rel in (docs[i] for i in ids) if rel is not None)
+
+    def iter_text_matches(
+        self,
+        query: TextQuery,
+        *,
+        cancelled: Optional[threading.Event] = None,
+        report: Optional[dict[str, Any]] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Yield one match per line: {"path", "line", "col", "text"}. Each candidate
+        file gets SEARCH_FILE_TIMEOUT_MS, the whole query SEARCH_QUERY_TIMEOUT_MS;
+        files cut short are counted in report["timed_out_files"], a query cut
+        short sets report["timed_out"].
+        """
+        report = report if report is not None else {}
+        report.setdefault("timed_out_files", 0)
+        query_deadline = time.monotonic() + SEARCH_QUERY_TIMEOUT_MS / 1000
+        worker = RegexWorker(query.pattern, SEARCH_REGEX_MAX_LINE) if query.regex else None
+        try:
+            for rel in self.candidates(query.grams):
+                if cancelled is not None and cancelled.is_set():
+                    return
+                now = time.monotonic()
+                if now > query_deadline:
+                    report["timed_out"] = True
+                    return
+                text = _read_text(self.root / rel)
+                if text is None:
+                    continue
+                timeout = min(query_deadline - now, SEARCH_FILE_TIMEOUT_MS / 1000)
+                if worker is not None:
+                    hits = worker.match(text, timeout, cancelled)
+                    if hits is None:
+                        if cancelled is not None and cancelled.is_set():
+                            return
+                        report["timed_out_files"] += 1
+                        continue
+                else:
+                    hits = query.literal_hits(text, now + timeout)
+                try:
+                    for line_no, start, _end in hits:
+                        line_start = text.rfind("\n", 0, start) + 1
+                        line_end = text.find("\n", start)
+                        if line_end < 0:
+                            line_end = len(text)
+                        yield {
+                            "path": rel,
+                            "line": line_no,
+                            "col": start - line_start + 1,
+                            "text": text[line_start:line_end][:_LINE_PREVIEW],
+                        }
+                        if cancelled is not None and cancelled.is_set():
+                            return
+                except TimeoutError:
+                    report["timed_out_files"] += 1
+        finally:
+            if worker is not None:
+                worker.close()
+
+
+class SearchIndexes:
+    """
+    Per-workspace indexes shared by every session bound to the same folder.
+    At most `max_workspaces` are kept and their postings together stay under
+    `max_total_bytes`; the least recently used index is dropped first (it is
+    rebuilt if that workspace searches again).
+    """
+    def __init__(self, max_workspaces: int, max_total_bytes: int = SEARCH_MAX_TOTAL_INDEX_BYTES):
+        self.max_workspaces = max_workspaces
+        self.max_total_bytes = max_total_bytes
+        self._items: OrderedDict[Path, WorkspaceIndex] = OrderedDict()
+        self._refs: dict[Path, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def acquire(self, root: Path) -> None:
+        """Register a session interested in `root` (released on disconnect/cwd change)."""
+        self._refs[root] = self._refs.get(root, 0) + 1
+
+    def get(self, root: Path) -> WorkspaceIndex:
+        """Return the index for `root`, starting a background build on first use."""
+        idx = self._items.get(root)
+        if idx is None:
+            idx = self._start(root)
+        self._items.move_to_end(root)
+        return idx
+
+    def release(self, root: Path) -> None:
+        n = self._refs.get(root, 0) - 1
+        if n > 0:
+            self._refs[root] = n
+            return
+        self._refs.pop(root, None)
+        self._items.pop(root, None)  # nobody watches it any more; it would go stale
+
+    def reset(self, root: Path) -> None:
+        """Rebuild after the workspace was replaced wholesale (setup/clone)."""
+        if root in self._items:
+            self._start(root)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workspaces": len(self._items),
+            "bytes": sum(idx.nbytes for idx in self._items.values()),
+            "max_bytes": self.max_total_bytes,
+        }
+
+    def _enforce_budget(self) -> None:
+        total = sum(idx.nbytes for idx in self._items.values())
+        while total > self.max_total_bytes and len(self._items) > 1:
+            _, idx = self._items.popitem(last=False)
+            total -= idx.nbytes
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _start(self, root: Path) -> WorkspaceIndex:
+        idx = WorkspaceIndex(root, min(SEARCH_MAX_INDEX_BYTES, self.max_total_bytes))
+        self._items[root] = idx
+
+        async def _build():
+            with contextlib.suppress(Exception):
+                await asyncio.to_thread(idx.build)
+            idx.ready.set()
+            self._enforce_budget()
+
+        self._spawn(_build())
+        while len(self._items) > self.max_workspaces:
+            self._items.popitem(last=False)
+        return idx
+
+    def notify(self, root: Path, changed: list[Path]) -> None:
+        """Feed watcher changes to the index of `root`, if one exists."""
+        idx = self._items.get(root)
+        if idx is None or not changed:
+            return
+
+        async def _apply():
+            await idx.ready.wait()
+            with contextlib.suppress(Exception):
+                await asyncio.to_thread(idx.apply, changed)
+            self._enforce_budget()
+
+        self._spawn(_apply())
+
+
+SEARCH_INDEXES = SearchIndexes(SEARCH_MAX_WORKSPACES)
+
+
+async def stream_text_matches(
+    idx: WorkspaceIndex,
+    query: str,
+    *,
+    regex: bool,
+    case_sensitive: bool,
+    max_results: int,
+    chunk_size: int,
+    on_chunk: Callable[[list[dict[str, Any]]], Awaitable[None]],
+) -> dict[str, Any]:
+    """
+    Run a text search in a worker thread and hand results to `on_chunk` in batches.
+    Invalid or rejected queries raise before any work starts (re.error, ValueError
+    "E_REGEX_UNSAFE" / "E_REGEX_NEEDS_LITERAL"). Cancelling the awaiting task stops
+    the scan at the next hit or line.
+    Returns {"total": n, "truncated": bool, "timed_out_files": n}.
+    """
+    text_query = TextQuery(query, regex=regex, case_sensitive=case_sensitive)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    state: dict[str, Any] = {"total": 0, "truncated": False}
+    report: dict[str, Any] = {}
+
+    def _run():
+        batch: list[dict[str, Any]] = []
+        try:
+            for hit in idx.iter_text_matches(text_query, cancelled=cancelled, report=report):
+                if state["total"] >= max_results:
+                    state["truncated"] = True
+                    break
+                state["total"] += 1
+                batch.append(hit)
+                if len(batch) >= chunk_size:
+                    loop.call_soon_threadsafe(queue.put_nowait, batch)
+                    batch = []
+            if batch:
+                loop.call_soon_threadsafe(queue.put_nowait, batch)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    worker = asyncio.ensure_future(asyncio.to_thread(_run))
+    try:
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                break
+            await on_chunk(batch)
+        await worker  # surfaces read errors etc.
+    finally:
+        cancelled.set()
+    if report.get("timed_out"):
+        state["truncated"] = True
+    state["timed_out_files"] = report.get("timed_out_files", 0)
+    return state
@@ -0,0 +1,228 @@
+# app/main/services/snapshots.py
+"""
+Workspace snapshots (all functions are sync; call via asyncio.to_thread).
+
+Layout under SNAPSHOT_ROOT/<workspace folder name>-<hash of its resolved path>/:
+  objects/ab/cdef...   immutable file contents, addressed by blake2b hash
+  manifests/<id>.json  {"id", "label", "created_at", "files": {rel: [hash, size, mtime_ns, mode]}}
+
+Identical contents are stored once and shared by every snapshot. Objects are
+reflinked from the workspace when the filesystem supports it, copied otherwise.
+They are never hardlinked into the workspace: tools that rewrite files in place
+would otherwise modify the snapshot too.
+Excluded folders (node_modules, .git, build output ...) are neither captured nor touched.
+"""
+from __future__ import annotations
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat as _stat
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional
+
+from fastapi import HTTPException
+
+from ..config import DEFAULT_EXCLUDES, SNAPSHOT_MAX_PER_WORKSPACE, SNAPSHOT_ROOT
+from ..utils.cow import clone_file
+
+_IGNORED_NAMES = DEFAULT_EXCLUDES | {".DS_Store"}
+_SNAPSHOT_ID_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}$")
+_CHUNK = 1024 * 1024
+
+
+def _store(root: Path) -> Path:
+    # the folder name alone is not unique (every user's "app"): stores sharing a
+    # directory would prune and garbage-collect each other's objects
+    resolved = root.resolve()
+    key = hashlib.blake2b(str(resolved).encode(), digest_size=8).hexdigest()
+    return SNAPSHOT_ROOT / f"{resolved.name or 'root'}-{key}"
+
+
+def _hash_file(p: Path) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(p, "rb") as fh:
+        while chunk := fh.read(_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _object_path(store: Path, digest: str) -> Path:
+    return store / "objects" / digest[:2] / digest[2:]
+
+
+def _walk_files(root: Path) -> dict[str, os.stat_result]:
+    out: dict[str, os.stat_result] = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in _IGNORED_NAMES]
+        for name in filenames:
+            if name in _IGNORED_NAMES:
+                continue
+            p = Path(dirpath) / name
+            try:
+                st = p.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if _stat.S_ISREG(st.st_mode):
+                out[p.relative_to(root).as_posix()] = st
+    return out
+
+
+def _load_manifest(store: Path, snapshot_id: str) -> dict[str, Any]:
+    if not _SNAPSHOT_ID_RE.match(snapshot_id or ""):
+        raise HTTPException(status_code=400, detail="E_BAD_SNAPSHOT_ID")
+    p = store / "manifests" / f"{snapshot_id}.json"
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="E_SNAPSHOT_NOT_FOUND")
+
+
+def _manifests(store: Path) -> list[dict[str, Any]]:
+    d = store / "manifests"
+    if not d.is_dir():
+        return []
+    out = []
+    for p in d.glob("*.json"):
+        with contextlib.suppress(Exception):
+            out.append(json.loads(p.read_text(encoding="utf-8")))
+    out.sort(key=lambda m: (m.get("created_at") or 0, m.get("id")))
+    return out
+
+
+def _summary(m: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": m["id"],
+        "label": m.get("label"),
+        "created_at": m.get("created_at"),
+        "files": len(m.get("files", {})),
+        "bytes": sum(e[1] for e in m.get("files", {}).values()),
+    }
+
+
+def _put_object(store: Path, src: Path) -> tuple[str, str]:
+    """Clone `src` into the object store; returns (digest, "reflink"|"copy"|"shared")."""
+    tmp_dir = store / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_dir / uuid.uuid4().hex
+    # hash the private clone, not the live file, so the object always matches its name
+    how = clone_file(src, tmp)
+    digest = _hash_file(tmp)
+    obj = _object_path(store, digest)
+    if obj.exists():
+        tmp.unlink()
+        return digest, "shared"
+    obj.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, obj)
+    return digest, how
+
+
+def create_snapshot(root: Path, label: Optional[str] = None) -> dict[str, Any]:
+    store = _store(root)
+    (store / "manifests").mkdir(parents=True, exist_ok=True)
+    previous = _manifests(store)
+    # reuse hashes of files whose stat is unchanged since the latest snapshot
+    known: dict[str, list] = previous[-1]["files"] if previous else {}
+
+    files: dict[str, list] = {}
+    counts = {"reused": 0, "shared": 0, "reflink": 0, "copy": 0}
+    for rel, st in _walk_files(root).items():
+        prev = known.get(rel)
+        if prev and prev[1] == st.st_size and prev[2] == st.st_mtime_ns and _object_path(store, prev[0]).exists():
+            files[rel] = [prev[0], st.st_size, st.st_mtime_ns, _stat.S_IMODE(st.st_mode)]
+            counts["reused"] += 1
+            continue
+        try:
+            digest, how = _put_object(store, root / rel)
+        except FileNotFoundError:
+            continue  # deleted while we were walking
+        files[rel] = [digest, st.st_size, st.st_mtime_ns, _stat.S_IMODE(st.st_mode)]
+        counts[how] += 1
+
+    now = time.time()
+    snapshot_id = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now)) + "-" + uuid.uuid4().hex[:6]
+    manifest = {"id": snapshot_id, "label": label, "created_at": now, "files": files}
+    tmp = store / "manifests" / f".{snapshot_id}.tmp"
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, store / "manifests" / f"{snapshot_id}.json")
+
+    # keep the newest N snapshots
+    excess = len(previous) + 1 - SNAPSHOT_MAX_PER_WORKSPACE
+    if excess > 0:
+        for m in previous[:excess]:
+            (store / "manifests" / f"{m['id']}.json").unlink(missing_ok=True)
+        _gc_objects(store)
+
+    return {**_summary(manifest), **counts}
+
+
+def list_snapshots(root: Path) -> list[dict[str, Any]]:
+    return [_summary(m) for m in _manifests(_store(root))]
+
+
+def restore_snapshot(root: Path, snapshot_id: str) -> dict[str, Any]:
+    """Make the (non-excluded) workspace match the snapshot, touching only differing files."""
+    store = _store(root)
+    manifest = _load_manifest(store, snapshot_id)
+    wanted: dict[str, list] = manifest["files"]
+    current = _walk_files(root)
+    written = unchanged = deleted = 0
+
+    for rel in current.keys() - wanted.keys():
+        with contextlib.suppress(FileNotFoundError):
+            (root / rel).unlink()
+            deleted += 1
+            # prune directories emptied by the deletion (never the root or excluded dirs)
+            parent = (root / rel).parent
+            while parent != root:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+    for rel, (digest, size, mtime_ns, mode) in wanted.items():
+        target = root / rel
+        st = current.get(rel)
+        if st is not None and st.st_size == size:
+            if st.st_mtime_ns == mtime_ns or _hash_file(target) == digest:
+                unchanged += 1
+                continue
+        obj = _object_path(store, digest)
+        if not obj.exists():
+            raise HTTPException(status_code=500, detail=f"E_SNAPSHOT_CORRUPT: missing object for {rel}")
+        if target.is_dir():
+            shutil.rmtree(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.restore-{uuid.uuid4().hex[:8]}")
+        clone_file(obj, tmp)
+        os.chmod(tmp, mode)
+        os.utime(tmp, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp, target)
+        written += 1
+
+    return {"id": snapshot_id, "written": written, "deleted": deleted, "unchanged": unchanged}
+
+
+def delete_snapshot(root: Path, snapshot_id: str) -> None:
+    store = _store(root)
+    _load_manifest(store, snapshot_id)
+    (store / "manifests" / f"{snapshot_id}.json").unlink(missing_ok=True)
+    _gc_objects(store)
+
+
+def _gc_objects(store: Path) -> None:
+    live = {e[0] for m in _manifests(store) for e in m.get("files", {}).values()}
+    objects = store / "objects"
+    if not objects.is_dir():
+        return
+    for sub in objects.iterdir():
+        for obj in sub.iterdir():
+            if sub.name + obj.name not in live:
+                obj.unlink(missing_ok=True)
+        with contextlib.suppress(OSError):
+            sub.rmdir()
@@ -0,0 +1,341 @@
+# app/main/services/state.py
+"""
+Shared state for ws sessions, so several uvicorn workers (and hosts) can serve
+the same workspaces:
+  - current project per email      (decides whether init must re-clone)
+  - setup lock per email           (only one worker may wipe/clone/restore a folder)
+  - session ownership records      (which worker holds which session; re-claimed by
+                                    keepalive pings, expire SESSION_TTL after a crash)
+  - email -> worker affinity       (lets an ingress route an email's tabs to one worker)
+
+Backends: "memory" (single process, default), "sqlite" (one file shared by the
+workers of a host), "redis" (anything speaking SET NX PX / GET / DEL / PEXPIRE).
+"""
+from __future__ import annotations
+import abc
+import asyncio
+import contextlib
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from . import _singleton
+from ..config import (
+    AFFINITY_TTL,
+    REDIS_URL,
+    SESSION_TTL,
+    STATE_BACKEND,
+    STATE_LOCK_TTL,
+    STATE_SQLITE_PATH,
+    WORKER_ID,
+)
+
+
+class StateBackend(abc.ABC):
+    name = "base"
+
+    @abc.abstractmethod
+    async def get_current_project(self, email: str) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    async def set_current_project(self, email: str, project_id: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def claim_session(self, session_id: str, email: Optional[str]) -> None:
+        """Record this worker as the session's owner for SESSION_TTL; claiming again extends it."""
+
+    @abc.abstractmethod
+    async def release_session(self, session_id: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def claim_affinity(self, email: str) -> str:
+        """Bind `email` to this worker unless another worker holds a live binding; returns the owner."""
+
+    @abc.abstractmethod
+    async def release_affinity(self, email: str) -> None:
+        ...
+
+    # -- cross-process lease locks --
+    @abc.abstractmethod
+    async def _try_lock(self, name: str, token: str, ttl: float) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def _refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def _unlock(self, name: str, token: str) -> None:
+        ...
+
+    @contextlib.asynccontextmanager
+    async def setup_lock(self, email: str) -> AsyncIterator[None]:
+        """
+        Lease lock: polled with backoff, extended in the background while held,
+        so a crashed worker only blocks others for STATE_LOCK_TTL seconds.
+        """
+        name = f"setup:{email}"
+        token = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        delay = 0.05
+        while not await self._try_lock(name, token, STATE_LOCK_TTL):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        async def _keep():
+            while True:
+                await asyncio.sleep(STATE_LOCK_TTL / 3)
+                with contextlib.suppress(Exception):
+                    await self._refresh_lock(name, token, STATE_LOCK_TTL)
+
+        keeper = asyncio.create_task(_keep())
+        try:
+            yield
+        finally:
+            keeper.cancel()
+            with contextlib.suppress(Exception):
+                await self._unlock(name, token)
+
+
+class MemoryStateBackend(StateBackend):
+    """Single-process state (the previous module-level dicts)."""
+    name = "memory"
+
+    def __init__(self):
+        self._projects: dict[str, str] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._leases: dict[str, tuple[str, float]] = {}
+        self._sessions: dict[str, Optional[str]] = {}
+
+    async def get_current_project(self, email: str) -> Optional[str]:
+        return self._projects.get(email)
+
+    async def set_current_project(self, email: str, project_id: str) -> None:
+        self._projects[email] = project_id
+
+    async def claim_session(self, session_id: str, email: Optional[str]) -> None:
+        self._sessions[session_id] = email
+
+    async def release_session(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    async def claim_affinity(self, email: str) -> str:
+        return WORKER_ID
+
+    async def release_affinity(self, email: str) -> None:
+        return None
+
+    async def _try_lock(self, name: str, token: str, ttl: float) -> bool:
+        held = self._leases.get(name)
+        if held and held[1] > time.monotonic():
+            return False
+        self._leases[name] = (token, time.monotonic() + ttl)
+        return True
+
+    async def _refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        held = self._leases.get(name)
+        if not held or held[0] != token:
+            return False
+        self._leases[name] = (token, time.monotonic() + ttl)
+        return True
+
+    async def _unlock(self, name: str, token: str) -> None:
+        held = self._leases.get(name)
+        if held and held[0] == token:
+            del self._leases[name]
+
+    @contextlib.asynccontextmanager
+    async def setup_lock(self, email: str) -> AsyncIterator[None]:
+        # one process: a plain asyncio.Lock, no polling
+        lock = self._locks.get(email)
+        if not lock:
+            lock = self._locks[email] = asyncio.Lock()
+        async with lock:
+            yield
+
+
+class SqliteStateBackend(StateBackend):
+    """State in one SQLite file (WAL), shared by all workers on a host."""
+    name = "sqlite"
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS current_project (email TEXT PRIMARY KEY, project_id TEXT NOT NULL, updated_at REAL);
+    CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, email TEXT, worker_id TEXT NOT NULL, created_at REAL, expires_at REAL);
+    CREATE TABLE IF NOT EXISTS affinity (email TEXT PRIMARY KEY, worker_id TEXT NOT NULL, expires_at REAL NOT NULL);
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(self._SCHEMA)
+            columns = {row[1] for row in db.execute("PRAGMA table_info(sessions)")}
+            if "expires_at" not in columns:  # file created before session leases
+                db.execute("ALTER TABLE sessions ADD COLUMN expires_at REAL")
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+        db.execute("PRAGMA busy_timeout=10000")
+        return db
+
+    async def _run(self, fn):
+        def _call():
+            db = self._connect()
+            try:
+                return fn(db)
+            finally:
+                db.close()
+        return await asyncio.to_thread(_call)
+
+    async def get_current_project(self, email: str) -> Optional[str]:
+        row = await self._run(lambda db: db.execute(
+            "SELECT project_id FROM current_project WHERE email = ?", (email,)).fetchone())
+        return row[0] if row else None
+
+    async def set_current_project(self, email: str, project_id: str) -> None:
+        await self._run(lambda db: db.execute(
+            "INSERT INTO current_project (email, project_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(email) DO UPDATE SET project_id = excluded.project_id, updated_at = excluded.updated_at",
+            (email, project_id, time.time())))
+
+    async def claim_session(self, session_id: str, email: Optional[str]) -> None:
+        def _claim(db: sqlite3.Connection) -> None:
+            now = time.time()
+            db.execute(
+                "INSERT INTO sessions (session_id, email, worker_id, created_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET email = excluded.email, worker_id = excluded.worker_id, "
+                "expires_at = excluded.expires_at",
+                (session_id, email, WORKER_ID, now, now + SESSION_TTL))
+            # rows of workers that died without release_session (NULL: written before leases)
+            db.execute("DELETE FROM sessions WHERE expires_at IS NULL OR expires_at < ?", (now,))
+        await self._run(_claim)
+
+    async def release_session(self, session_id: str) -> None:
+        await self._run(lambda db: db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)))
+
+    async def claim_affinity(self, email: str) -> str:
+        def _claim(db: sqlite3.Connection) -> str:
+            now = time.time()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT worker_id, expires_at FROM affinity WHERE email = ?", (email,)).fetchone()
+                if row and row[0] != WORKER_ID and row[1] > now:
+                    owner = row[0]
+                else:
+                    db.execute(
+                        "INSERT INTO affinity (email, worker_id, expires_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(email) DO UPDATE SET worker_id = excluded.worker_id, expires_at = excluded.expires_at",
+                        (email, WORKER_ID, now + AFFINITY_TTL))
+                    owner = WORKER_ID
+                db.execute("COMMIT")
+                return owner
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return await self._run(_claim)
+
+    async def release_affinity(self, email: str) -> None:
+        await self._run(lambda db: db.execute(
+            "DELETE FROM affinity WHERE email = ? AND worker_id = ?", (email, WORKER_ID)))
+
+    async def _try_lock(self, name: str, token: str, ttl: float) -> bool:
+        def _try(db: sqlite3.Connection) -> bool:
+            now = time.time()
+            cur = db.execute(
+                "INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE locks.expires_at < ?",
+                (name, token, now + ttl, now))
+            return cur.rowcount == 1
+        return await self._run(_try)
+
+    async def _refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        cur = await self._run(lambda db: db.execute(
+            "UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?", (time.time() + ttl, name, token)))
+        return cur.rowcount == 1
+
+    async def _unlock(self, name: str, token: str) -> None:
+        await self._run(lambda db: db.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, token)))
+
+
+class RedisStateBackend(StateBackend):
+    """
+    State in Redis or a Redis-compatible server. Only GET/SET(NX,PX)/DEL/PEXPIRE/EXPIRE
+    are used (no Lua), so lightweight stand-ins work too.
+    """
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "rca:"):
+        try:
+            import redis.asyncio as aioredis  # type: ignore
+        except Exception as e:  # pragma: no cover
+            raise RuntimeError("STATE_BACKEND=redis requires the 'redis' package") from e
+        self.r = aioredis.from_url(url, decode_responses=True)
+        self.p = prefix
+
+    async def get_current_project(self, email: str) -> Optional[str]:
+        return await self.r.get(f"{self.p}project:{email}")
+
+    async def set_current_project(self, email: str, project_id: str) -> None:
+        await self.r.set(f"{self.p}project:{email}", project_id)
+
+    async def claim_session(self, session_id: str, email: Optional[str]) -> None:
+        # re-claimed by keepalive pings; expires SESSION_TTL after a crash
+        await self.r.set(f"{self.p}session:{session_id}", f"{WORKER_ID}|{email or ''}", px=int(SESSION_TTL * 1000))
+
+    async def release_session(self, session_id: str) -> None:
+        await self.r.delete(f"{self.p}session:{session_id}")
+
+    async def claim_affinity(self, email: str) -> str:
+        key = f"{self.p}affinity:{email}"
+        ttl_ms = int(AFFINITY_TTL * 1000)
+        if await self.r.set(key, WORKER_ID, nx=True, px=ttl_ms):
+            return WORKER_ID
+        owner = await self.r.get(key)
+        if owner == WORKER_ID:
+            await self.r.pexpire(key, ttl_ms)
+            return WORKER_ID
+        if owner is None and await self.r.set(key, WORKER_ID, nx=True, px=ttl_ms):
+            return WORKER_ID
+        return owner or WORKER_ID
+
+    async def release_affinity(self, email: str) -> None:
+        key = f"{self.p}affinity:{email}"
+        if await self.r.get(key) == WORKER_ID:
+            await self.r.delete(key)
+
+    async def _try_lock(self, name: str, token: str, ttl: float) -> bool:
+        return bool(await self.r.set(f"{self.p}lock:{name}", token, nx=True, px=int(ttl * 1000)))
+
+    async def _refresh_lock(self, name: str, token: str, ttl: float) -> bool:
+        key = f"{self.p}lock:{name}"
+        if await self.r.get(key) != token:
+            return False
+        return bool(await self.r.pexpire(key, int(ttl * 1000)))
+
+    async def _unlock(self, name: str, token: str) -> None:
+        # GET+DEL is not atomic; the lease bounds the window in which this could race
+        key = f"{self.p}lock:{name}"
+        if await self.r.get(key) == token:
+            await self.r.delete(key)
+
+
+def build_state_backend(kind: str) -> StateBackend:
+    kind = (kind or "memory").lower()
+    if kind == "sqlite":
+        return SqliteStateBackend(STATE_SQLITE_PATH)
+    if kind == "redis":
+        return RedisStateBackend(REDIS_URL)
+    return MemoryStateBackend()
+
+
+STATE: StateBackend = _singleton.setdefault("state", build_state_backend(STATE_BACKEND))
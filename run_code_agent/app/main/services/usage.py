@@ -0,0 +1,289 @@
+# app/main/services/usage.py
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import shutil
+import stat as _stat
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from fastapi import HTTPException
+
+from ..config import (
+    DEFAULT_EXCLUDES,
+    QUOTA_ACTION,
+    QUOTA_EVICT_DIRS,
+    USAGE_REFRESH_DEBOUNCE,
+    WORKSPACE_QUOTA_BYTES,
+)
+
+_IGNORED_NAMES = DEFAULT_EXCLUDES | {".DS_Store"}
+
+
+def _du(path: Path) -> tuple[int, int]:
+    """(bytes, files) of a subtree; symlinks are not followed."""
+    total = files = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            with contextlib.suppress(OSError):
+                st = os.lstat(os.path.join(dirpath, name))
+                if _stat.S_ISREG(st.st_mode):
+                    total += st.st_size
+                    files += 1
+    return total, files
+
+
+class WorkspaceUsage:
+    """
+    Byte/file totals of one workspace folder without periodic full walks.
+
+    Regular paths are tracked per file and updated from watcher events and
+    write paths. Excluded folders (node_modules, .next ...) are invisible to
+    the watcher, so each one is kept as a measured subtree total that is
+    re-measured only when marked stale (install finished, eviction).
+    """
+    def __init__(self, root: Path):
+        self.root = root
+        self._files: dict[str, int] = {}
+        self._bytes = 0
+        self._excluded: dict[str, tuple[int, int]] = {}  # rel dir -> (bytes, files)
+        self._lock = threading.Lock()
+        self.ready = False
+        self.measured_at: Optional[float] = None
+
+    # ---- sync; run in threads ----
+    def baseline(self) -> None:
+        files: dict[str, int] = {}
+        excluded: dict[str, tuple[int, int]] = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            base = Path(dirpath)
+            keep = []
+            for d in dirnames:
+                if d in _IGNORED_NAMES:
+                    excluded[(base / d).relative_to(self.root).as_posix()] = _du(base / d)
+                else:
+                    keep.append(d)
+            dirnames[:] = keep
+            for name in filenames:
+                with contextlib.suppress(OSError):
+                    st = os.lstat(base / name)
+                    if _stat.S_ISREG(st.st_mode):
+                        files[(base / name).relative_to(self.root).as_posix()] = st.st_size
+        with self._lock:
+            self._files = files
+            self._bytes = sum(files.values())
+            self._excluded = excluded
+            self.ready = True
+            self.measured_at = time.time()
+
+    def refresh_excluded(self) -> None:
+        """Re-measure excluded subtrees only (e.g. after npm install)."""
+        found: dict[str, tuple[int, int]] = {}
+        for dirpath, dirnames, _ in os.walk(self.root):
+            base = Path(dirpath)
+            keep = []
+            for d in dirnames:
+                if d in _IGNORED_NAMES:
+                    found[(base / d).relative_to(self.root).as_posix()] = _du(base / d)
+                else:
+                    keep.append(d)
+            dirnames[:] = keep
+        with self._lock:
+            self._excluded = found
+
+    def _set(self, rel: str, size: Optional[int]) -> None:
+        old = self._files.pop(rel, None)
+        if old is not None:
+            self._bytes -= old
+        if size is not None:
+            self._files[rel] = size
+            self._bytes += size
+
+    def apply(self, changed: list[Path]) -> None:
+        """Re-stat paths reported by the watcher (created, modified or deleted)."""
+        for p in changed:
+            try:
+                rel = p.relative_to(self.root).as_posix()
+            except ValueError:
+                continue
+            if any(part in _IGNORED_NAMES for part in rel.split("/")):
+                continue
+            try:
+                st = os.lstat(p)
+            except OSError:
+                st = None
+            with self._lock:
+                if st is None:
+                    prefix = rel + "/"
+                    for key in [k for k in self._files if k == rel or k.startswith(prefix)]:
+                        self._set(key, None)
+                elif _stat.S_ISREG(st.st_mode):
+                    self._set(rel, st.st_size)
+            if st is not None and _stat.S_ISDIR(st.st_mode):
+                for dirpath, dirnames, filenames in os.walk(p):
+                    dirnames[:] = [d for d in dirnames if d not in _IGNORED_NAMES]
+                    self.apply([Path(dirpath) / n for n in filenames])
+
+    def record_write(self, rel: str, size: int) -> None:
+        with self._lock:
+            self._set(rel, size)
+
+    def size_of(self, rel: str) -> int:
+        with self._lock:
+            return self._files.get(rel, 0)
+
+    def totals(self) -> dict[str, Any]:
+        with self._lock:
+            ex_bytes = sum(b for b, _ in self._excluded.values())
+            ex_files = sum(n for _, n in self._excluded.values())
+            return {
+                "ready": self.ready,
+                "bytes": self._bytes + ex_bytes,
+                "files": len(self._files) + ex_files,
+                "tracked_bytes": self._bytes,
+                "excluded": {k: {"bytes": b, "files": n} for k, (b, n) in self._excluded.items()},
+                "baseline_at": self.measured_at,
+            }
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._bytes + sum(b for b, _ in self._excluded.values())
+
+    def evict(self) -> int:
+        """Delete regenerable folders (QUOTA_EVICT_DIRS); returns bytes freed."""
+        with self._lock:
+            victims = [rel for rel in self._excluded if rel.rsplit("/", 1)[-1] in QUOTA_EVICT_DIRS]
+        freed = 0
+        for rel in victims:
+            with self._lock:
+                freed += self._excluded.get(rel, (0, 0))[0]
+            shutil.rmtree(self.root / rel, ignore_errors=True)
+        self.refresh_excluded()
+        return freed
+
+
+class UsageRegistry:
+    """Usage of workspaces with at least one session bound to them (track/untrack are refcounted)."""
+    def __init__(self, refresh_debounce: float = USAGE_REFRESH_DEBOUNCE):
+        self.refresh_debounce = refresh_debounce
+        self._items: dict[Path, WorkspaceUsage] = {}
+        self._refs: dict[Path, int] = {}
+        self._pending: dict[Path, asyncio.TimerHandle] = {}  # debounced refresh_excluded
+        self._tasks: set[asyncio.Task] = set()  # keep references so tasks are not GC'd
+
+    def get(self, root: Path) -> Optional[WorkspaceUsage]:
+        return self._items.get(root)
+
+    def track(self, root: Path) -> WorkspaceUsage:
+        """Start tracking `root`; the baseline walk runs once in the background."""
+        self._refs[root] = self._refs.get(root, 0) + 1
+        u = self._items.get(root)
+        if u is None:
+            u = self._items[root] = WorkspaceUsage(root)
+            self._schedule(u.baseline)
+        return u
+
+    def untrack(self, root: Path) -> None:
+        """Drop a session's reference; the workspace is forgotten when none are left."""
+        n = self._refs.get(root, 0) - 1
+        if n > 0:
+            self._refs[root] = n
+            return
+        self._refs.pop(root, None)
+        self._items.pop(root, None)
+        handle = self._pending.pop(root, None)
+        if handle is not None:
+            handle.cancel()
+
+    def reset(self, root: Path) -> None:
+        """Re-baseline after the workspace was replaced wholesale (setup/clone)."""
+        u = self._items.get(root)
+        if u is not None:
+            self._schedule(u.baseline)
+
+    def refresh_excluded(self, root: Path) -> None:
+        """
+        Re-measure excluded subtrees after an install. Debounced: a burst of
+        install-done events costs one walk of node_modules.
+        """
+        if root not in self._items:
+            return
+        handle = self._pending.pop(root, None)
+        if handle is not None:
+            handle.cancel()
+
+        def _fire():
+            self._pending.pop(root, None)
+            u = self._items.get(root)
+            if u is not None and u.ready:
+                self._schedule(u.refresh_excluded)
+
+        self._pending[root] = asyncio.get_running_loop().call_later(self.refresh_debounce, _fire)
+
+    def notify(self, root: Path, changed: list[Path]) -> None:
+        u = self._items.get(root)
+        if u is not None and u.ready and changed:
+            self._schedule(u.apply, changed)
+
+    def _schedule(self, fn, *args) -> None:
+        async def _run():
+            with contextlib.suppress(Exception):
+                await asyncio.to_thread(fn, *args)
+        task = asyncio.get_running_loop().create_task(_run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def report(self, detail: bool = False) -> dict[str, Any]:
+        """
+        Aggregates over tracked workspaces. Workspace folders are named after
+        emails, so per-workspace totals are only included with `detail`
+        (served behind ADMIN_TOKEN, never on /healthz).
+        """
+        totals = {root.name: u.totals() for root, u in self._items.items()}
+        out: dict[str, Any] = {
+            "quota_bytes": WORKSPACE_QUOTA_BYTES or None,
+            "workspaces": len(totals),
+            "ready": sum(1 for t in totals.values() if t["ready"]),
+            "bytes": sum(t["bytes"] for t in totals.values()),
+            "files": sum(t["files"] for t in totals.values()),
+            "max_bytes": max((t["bytes"] for t in totals.values()), default=0),
+            "over_quota": sum(1 for t in totals.values() if WORKSPACE_QUOTA_BYTES and t["bytes"] > WORKSPACE_QUOTA_BYTES),
+        }
+        if detail:
+            out["by_workspace"] = totals
+        return out
+
+
+USAGE = UsageRegistry()
+
+
+def check_quota(root: Path, changes: list[tuple[str, int]]) -> None:
+    """
+    Raise E_QUOTA_EXCEEDED if writing `changes` [(rel, new_size)] would push the
+    workspace over WORKSPACE_QUOTA_BYTES. With QUOTA_ACTION=evict, regenerable
+    folders are deleted first. Sync; call from a worker thread.
+    """
+    if not WORKSPACE_QUOTA_BYTES:
+        return
+    u = USAGE.get(root)
+    if u is None or not u.ready:
+        return
+    delta = sum(size - u.size_of(rel) for rel, size in changes)
+    if delta <= 0 or u.total_bytes() + delta <= WORKSPACE_QUOTA_BYTES:
+        return
+    if QUOTA_ACTION == "evict":
+        u.evict()
+        if u.total_bytes() + delta <= WORKSPACE_QUOTA_BYTES:
+            return
+    raise HTTPException(status_code=507, detail="E_QUOTA_EXCEEDED")
+
+
+def record_writes(root: Path, changes: list[tuple[str, int]]) -> None:
+    u = USAGE.get(root)
+    if u is None:
+        return
+    for rel, size in changes:
+        u.record_write(rel, size)
@@ -0,0 +1,111 @@
+# app/main/utils/regex_worker.py
+"""
+User regexes run in a child process so a pattern that backtracks badly can be
+stopped: Python's re cannot be interrupted, but a process can be killed. The
+parent hands over one file at a time and waits up to that file's time limit;
+past it the child is killed and a fresh one serves the next file.
+
+The child is spawned (not forked: the server is multi-threaded) and imports
+only this module and the standard library.
+"""
+from __future__ import annotations
+import multiprocessing as mp
+import re
+import threading
+import time
+from typing import Optional
+
+_CTX = mp.get_context("spawn")
+_POLL = 0.05  # seconds between cancellation checks while waiting
+_STARTUP_TIMEOUT = 10.0  # interpreter start + compile; not charged to any file
+
+
+def _serve(conn, pattern: str, flags: int, max_line: int) -> None:
+    """Child loop: receive a text, reply with (line, start, end) of the first hit on each line."""
+    search = re.compile(pattern, flags).search
+    conn.send(True)  # ready
+    while True:
+        try:
+            text = conn.recv()
+        except EOFError:
+            return
+        if text is None:
+            return
+        hits = []
+        line_no, start, n = 0, 0, len(text)
+        while start <= n:
+            line_no += 1
+            end = text.find("\n", start)
+            if end < 0:
+                end = n
+            m = search(text, start, min(end, start + max_line))
+            if m:
+                hits.append((line_no, m.start(), max(m.end(), m.start() + 1)))
+            start = end + 1
+        conn.send(hits)
+
+
+class RegexWorker:
+    """One child process per search; not thread-safe (used from the search thread)."""
+
+    def __init__(self, pattern: re.Pattern, max_line: int):
+        self.pattern = pattern.pattern
+        self.flags = pattern.flags
+        self.max_line = max_line
+        self._proc = None
+        self._conn = None
+
+    def _spawn(self) -> None:
+        parent, child = _CTX.Pipe()
+        proc = _CTX.Process(
+            target=_serve, args=(child, self.pattern, self.flags, self.max_line),
+            name="search-regex", daemon=True,
+        )
+        proc.start()
+        child.close()
+        self._proc, self._conn = proc, parent
+        if not parent.poll(_STARTUP_TIMEOUT) or parent.recv() is not True:
+            self._kill()
+            raise RuntimeError("regex worker failed to start")
+
+    def match(
+        self, text: str, timeout: float, cancelled: Optional[threading.Event] = None
+    ) -> Optional[list[tuple[int, int, int]]]:
+        """Hits in `text`, or None when it took over `timeout` seconds or the search was cancelled."""
+        if self._proc is None:
+            self._spawn()
+        self._conn.send(text)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (cancelled is not None and cancelled.is_set()):
+                self._kill()
+                return None
+            if self._conn.poll(min(_POLL, remaining)):
+                try:
+                    return self._conn.recv()
+                except EOFError:  # child died (e.g. out of memory)
+                    self._kill()
+                    return None
+
+    def _kill(self) -> None:
+        proc, conn, self._proc, self._conn = self._proc, self._conn, None, None
+        if proc is None:
+            return
+        proc.kill()
+        proc.join()
+        conn.close()
+
+    def close(self) -> None:
+        proc, conn, self._proc, self._conn = self._proc, self._conn, None, None
+        if proc is None:
+            return
+        try:
+            conn.send(None)
+            proc.join(1)
+        except (OSError, ValueError):
+            pass
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+        conn.close()
@@ -0,0 +1,278 @@
+# app/main/utils/sandbox.py
+"""
+Resource isolation for dev processes (POSIX only).
+
+"cgroup": each session's dev process group runs in its own cgroup v2 child
+(<root>/dev-<session id>) with cpu.weight, an optional cpu.max, memory.max
+and pids.max. The child joins the cgroup from preexec_fn, before exec, so
+everything it forks (npm, node, esbuild ...) is accounted for.
+
+"rlimit": fallback when cgroup v2 is not usable. The child lowers its nice
+value in proportion to DEV_CPU_WEIGHT and caps its data segment (RLIMIT_DATA).
+It has no pids cap: RLIMIT_NPROC is per user, not per process tree.
+"""
+from __future__ import annotations
+import contextlib
+import errno
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+try:  # POSIX only; imported here because preexec_fn must not import in the child
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None  # type: ignore[assignment]
+
+from ..config import (
+    DEV_CGROUP_ROOT,
+    DEV_CPU_MAX_CORES,
+    DEV_CPU_WEIGHT,
+    DEV_MEMORY_MAX,
+    DEV_PIDS_MAX,
+    DEV_SANDBOX,
+)
+
+_CGROUP_MOUNT = Path("/sys/fs/cgroup")
+_CONTROLLERS = ("cpu", "memory", "pids")
+_CPU_PERIOD_US = 100_000
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# resolved once: Path of a cgroup whose children may use _CONTROLLERS, or False
+_root_cache: Any = None
+
+
+def _own_cgroup() -> Optional[Path]:
+    with contextlib.suppress(OSError):
+        for line in Path("/proc/self/cgroup").read_text().splitlines():
+            if line.startswith("0::"):
+                return _CGROUP_MOUNT / line[3:].lstrip("/")
+    return None
+
+
+def _enable_controllers(root: Path) -> None:
+    available = set((root / "cgroup.controllers").read_text().split())
+    missing = [c for c in _CONTROLLERS if c not in available]
+    if missing:
+        raise OSError(errno.ENOTSUP, f"cgroup controllers unavailable: {missing}")
+    enabled = set((root / "cgroup.subtree_control").read_text().split())
+    wanted = " ".join(f"+{c}" for c in _CONTROLLERS if c not in enabled)
+    if wanted:
+        (root / "cgroup.subtree_control").write_text(wanted)
+
+
+def _cgroup_root() -> Optional[Path]:
+    """
+    The cgroup dev sessions are created under. cgroup v2 only lets a group hand
+    controllers to children while it has no processes of its own, so when the
+    server still sits in that group it moves itself into a "server" leaf first
+    (what container init scripts do).
+    """
+    global _root_cache
+    if _root_cache is not None:
+        return _root_cache or None
+    _root_cache = False
+    if os.name == "nt" or not (_CGROUP_MOUNT / "cgroup.controllers").exists():
+        return None
+    root = Path(DEV_CGROUP_ROOT) if DEV_CGROUP_ROOT else _own_cgroup()
+    if root is None:
+        return None
+    try:
+        root.mkdir(exist_ok=True)
+        try:
+            _enable_controllers(root)
+        except OSError as e:
+            if e.errno != errno.EBUSY:
+                raise
+            leaf = root / "server"
+            leaf.mkdir(exist_ok=True)
+            (leaf / "cgroup.procs").write_text(str(os.getpid()))
+            _enable_controllers(root)
+    except OSError:
+        return None
+    _root_cache = root
+    return root
+
+
+def _nice_for_weight(weight: int) -> int:
+    # cgroup weight 100 == nice 0; each nice step is ~1.25x less CPU share
+    if weight >= 100:
+        return 0
+    return max(0, min(19, round(math.log(100 / max(weight, 1), 1.25))))
+
+
+def _rlimit_preexec() -> Callable[[], None]:
+    """
+    Child-side rlimit setup. Everything is computed here, in the parent: the
+    returned function only makes syscalls with prebuilt arguments (no imports,
+    no formatting, no context managers) since it runs between fork and exec.
+    """
+    nice = _nice_for_weight(DEV_CPU_WEIGHT)
+    if resource is None:
+        limits: tuple = ()
+    else:
+        limits = ((resource.RLIMIT_CORE, (0, 0)),)
+        if DEV_MEMORY_MAX:
+            limits += ((resource.RLIMIT_DATA, (DEV_MEMORY_MAX, DEV_MEMORY_MAX)),)
+        setrlimit = resource.setrlimit
+
+    def _fn() -> None:
+        if nice:
+            try:
+                os.nice(nice)
+            except OSError:
+                pass
+        for which, limit in limits:
+            try:
+                setrlimit(which, limit)
+            except (ValueError, OSError):
+                pass
+
+    return _fn
+
+
+class DevSandbox:
+    """Limits and usage accounting for one session's dev process tree."""
+
+    def __init__(self, session_id: str, cgroup: Optional[Path]):
+        self.session_id = session_id
+        self.cgroup = cgroup
+        self.mode = "cgroup" if cgroup else "rlimit"
+        self.pid: Optional[int] = None
+        self._last_cpu: Optional[tuple[float, float]] = None  # (monotonic, cpu seconds)
+
+    @classmethod
+    def create(cls, session_id: str) -> Optional["DevSandbox"]:
+        """None when sandboxing is off (or not supported on this OS)."""
+        if DEV_SANDBOX not in ("cgroup", "rlimit") or os.name == "nt":
+            return None
+        cgroup = None
+        root = _cgroup_root() if DEV_SANDBOX == "cgroup" else None
+        if root is not None:
+            cgroup = root / f"dev-{session_id}"
+            try:
+                cgroup.mkdir(exist_ok=True)
+                (cgroup / "cpu.weight").write_text(str(max(1, min(10000, DEV_CPU_WEIGHT))))
+                if DEV_CPU_MAX_CORES > 0:
+                    (cgroup / "cpu.max").write_text(f"{int(DEV_CPU_MAX_CORES * _CPU_PERIOD_US)} {_CPU_PERIOD_US}")
+                (cgroup / "memory.max").write_text(str(DEV_MEMORY_MAX) if DEV_MEMORY_MAX else "max")
+                with contextlib.suppress(OSError):
+                    (cgroup / "memory.swap.max").write_text("0")
+                (cgroup / "pids.max").write_text(str(DEV_PIDS_MAX) if DEV_PIDS_MAX else "max")
+            except OSError:
+                with contextlib.suppress(OSError):
+                    cgroup.rmdir()
+                cgroup = None
+        return cls(session_id, cgroup)
+
+    def preexec(self) -> Callable[[], None]:
+        """preexec_fn for the dev command: join the cgroup, or apply rlimits if that fails."""
+        procs = os.fsencode(self.cgroup / "cgroup.procs") if self.cgroup else None
+        apply_rlimits = _rlimit_preexec()
+
+        def _fn() -> None:
+            # runs in the forked child: no locks, no logging, no imports, never raise
+            if procs is not None:
+                try:
+                    fd = os.open(procs, os.O_WRONLY)
+                    try:
+                        os.write(fd, b"0")
+                        return
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+            apply_rlimits()
+
+        return _fn
+
+    def attach(self, pid: int) -> None:
+        """Record the spawned pid and check which mode actually took effect."""
+        self.pid = pid
+        self._last_cpu = None
+        if self.cgroup is not None:
+            with contextlib.suppress(OSError):
+                if str(pid) not in (self.cgroup / "cgroup.procs").read_text().split():
+                    self.mode = "rlimit"
+
+    # ---- usage ----
+    def _cgroup_usage(self) -> dict[str, Any]:
+        cg = self.cgroup
+        out: dict[str, Any] = {}
+        with contextlib.suppress(OSError, ValueError):
+            stat = dict(line.split() for line in (cg / "cpu.stat").read_text().splitlines())
+            out["cpu_seconds"] = int(stat["usage_usec"]) / 1e6
+            out["throttled_seconds"] = int(stat.get("throttled_usec", 0)) / 1e6
+        with contextlib.suppress(OSError, ValueError):
+            out["memory_bytes"] = int((cg / "memory.current").read_text())
+        with contextlib.suppress(OSError, ValueError):
+            out["memory_peak_bytes"] = int((cg / "memory.peak").read_text())
+        with contextlib.suppress(OSError, ValueError):
+            events = dict(line.split() for line in (cg / "memory.events").read_text().splitlines())
+            out["oom_kills"] = int(events.get("oom_kill", 0))
+        with contextlib.suppress(OSError, ValueError):
+            out["pids"] = int((cg / "pids.current").read_text())
+        return out
+
+    def _pgroup_usage(self) -> dict[str, Any]:
+        """Sum /proc stats of live processes in the dev process group (start_new_session)."""
+        cpu = 0.0
+        rss = 0
+        pids = 0
+        for entry in os.scandir("/proc"):
+            if not entry.name.isdigit():
+                continue
+            try:
+                raw = Path(entry.path, "stat").read_text()
+            except OSError:
+                continue
+            fields = raw[raw.rfind(")") + 2:].split()
+            # fields[0] is state (field 3 in proc(5)); pgrp is field 5, utime/stime 14/15, rss 24
+            if int(fields[2]) != self.pid:
+                continue
+            pids += 1
+            cpu += (int(fields[11]) + int(fields[12])) / _CLK_TCK
+            rss += int(fields[21]) * _PAGE
+        return {"cpu_seconds": cpu, "memory_bytes": rss, "pids": pids}
+
+    def usage(self) -> dict[str, Any]:
+        """Current usage plus CPU% since the previous call (sync; cheap)."""
+        if self.mode == "cgroup":
+            out = self._cgroup_usage()
+        elif self.pid and Path("/proc").is_dir():
+            out = self._pgroup_usage()
+        else:
+            out = {}
+        now = time.monotonic()
+        cpu = out.get("cpu_seconds")
+        if cpu is not None:
+            if self._last_cpu is not None and now > self._last_cpu[0]:
+                out["cpu_percent"] = round(100 * (cpu - self._last_cpu[1]) / (now - self._last_cpu[0]), 1)
+            self._last_cpu = (now, cpu)
+        out["mode"] = self.mode
+        out["limits"] = {
+            "cpu_weight": DEV_CPU_WEIGHT,
+            "cpu_max_cores": DEV_CPU_MAX_CORES or None,
+            "memory_bytes": DEV_MEMORY_MAX or None,
+            "pids": (DEV_PIDS_MAX or None) if self.mode == "cgroup" else None,
+        }
+        return out
+
+    def release(self) -> None:
+        """Kill anything left in the cgroup (daemons that escaped the process group) and remove it."""
+        self.pid = None
+        cg = self.cgroup
+        if cg is None:
+            return
+        with contextlib.suppress(OSError):
+            (cg / "cgroup.kill").write_text("1")  # Linux 5.14+
+        for _ in range(20):
+            try:
+                cg.rmdir()
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.05)  # members still exiting
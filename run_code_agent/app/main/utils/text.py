@@ -1,10 +1,93 @@
 # app/main/utils/text.py
 from __future__ import annotations
+from dataclasses import dataclass
+from typing import Optional
 
-def looks_text(data: bytes) -> bool:
-    if b"\x00" in data:
-        return False
-    if not data:
+# Bytes counted as "control" (everything below space except \t \n \v \f \r)
+_CTRL = bytes(b for b in range(32) if b < 9 or 13 < b < 32)
+_CTRL_RATIO = 0.05
+
+# Only head + tail are inspected for binary detection
+SAMPLE_BYTES = 8192
+
+# Longest first: the UTF-32 LE BOM starts with the UTF-16 LE one
+_BOMS = (
+    (b"\x00\x00\xfe\xff", "utf-32"),
+    (b"\xff\xfe\x00\x00", "utf-32"),
+    (b"\xef\xbb\xbf", "utf-8-sig"),
+    (b"\xfe\xff", "utf-16"),
+    (b"\xff\xfe", "utf-16"),
+)
+
+
+@dataclass(frozen=True)
+class TextInfo:
+    is_text: bool
+    encoding: Optional[str] = None  # Python codec; None if text-like but not a supported encoding
+    bom: bool = False
+
+
+BINARY = TextInfo(is_text=False)
+
+
+def _utf16_without_bom(head: bytes) -> Optional[str]:
+    """Mostly-ASCII UTF-16 has NULs in every other byte."""
+    half = len(head) // 2
+    if half < 2:
+        return None
+    even = head[0::2].count(0)
+    odd = head[1::2].count(0)
+    if odd > 0.4 * half and even < 0.05 * half:
+        return "utf-16-le"
+    if even > 0.4 * half and odd < 0.05 * half:
+        return "utf-16-be"
+    return None
+
+
+def _utf8_prefix_ok(head: bytes) -> bool:
+    """Validate a UTF-8 prefix that may end in the middle of a sequence."""
+    try:
+        head.decode("utf-8")
         return True
-    ctrl = sum(b < 9 or (13 < b < 32) for b in data)
-    return (ctrl / len(data)) < 0.05
+    except UnicodeDecodeError as e:
+        return e.start >= len(head) - 3 and e.reason == "unexpected end of data"
+
+
+def classify(head: bytes, tail: bytes = b"") -> TextInfo:
+    """
+    Classify content from a head sample (and optional tail sample) of a file.
+    Byte counting uses bytes.count/translate so it runs at C speed.
+    UTF-8 is only checked on the head; decode_text() does the full strict decode.
+    """
+    if not head:
+        return TextInfo(True, "utf-8")
+    for bom, enc in _BOMS:
+        if head.startswith(bom):
+            return TextInfo(True, enc, bom=True)
+
+    sample = head + tail
+    if b"\x00" in sample:
+        enc = _utf16_without_bom(head)
+        return TextInfo(True, enc) if enc else BINARY
+
+    ctrl = len(sample) - len(sample.translate(None, _CTRL))
+    if ctrl / len(sample) >= _CTRL_RATIO:
+        return BINARY
+    if sample.isascii() or _utf8_prefix_ok(head):
+        return TextInfo(True, "utf-8")
+    return TextInfo(True, None)
+
+
+def classify_bytes(data: bytes) -> TextInfo:
+    if len(data) <= 2 * SAMPLE_BYTES:
+        return classify(data)
+    return classify(data[:SAMPLE_BYTES], data[-SAMPLE_BYTES:])
+
+
+def decode_text(data: bytes, info: TextInfo) -> str:
+    """Strict decode with the detected encoding (raises UnicodeDecodeError)."""
+    return data.decode(info.encoding or "utf-8", errors="strict")
+
+
+def looks_text(data: bytes) -> bool:
+    return classify_bytes(data).is_text
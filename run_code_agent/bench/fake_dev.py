@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Stand-in dev server for benchmarks: prints Vite-style output at a fixed rate.
+
+Use it as the worker's DEV_CMD so start_dev exercises the log pump, parser and
+dev_log fan-out without npm:
+
+    DEV_CMD="python bench/fake_dev.py --lines-per-sec 200" uvicorn app.main.main:app
+
+Every option also reads an env var (FAKE_DEV_LINES_PER_SEC, ...) so the
+volume can be changed without editing DEV_CMD. Binds $PORT with a tiny HTTP
+server when --serve is given, so /preview traffic can be measured too.
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _env(name: str, default: str) -> str:
+    return os.getenv(f"FAKE_DEV_{name}", default)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    body = b"<!doctype html><html><body><div id=app>fake dev</div></body></html>"
+
+    def do_GET(self):  # noqa: N802
+        self.send_response(200)
+        self.send_header("content-type", "text/html")
+        self.send_header("content-length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):  # keep request logs out of the measured output
+        pass
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lines-per-sec", type=float, default=float(_env("LINES_PER_SEC", "50")))
+    ap.add_argument("--line-bytes", type=int, default=int(_env("LINE_BYTES", "120")))
+    ap.add_argument("--burst", type=int, default=int(_env("BURST", "1")), help="lines written per tick")
+    ap.add_argument("--install-lines", type=int, default=int(_env("INSTALL_LINES", "20")))
+    ap.add_argument("--ready-ms", type=int, default=int(_env("READY_MS", "300")))
+    ap.add_argument("--error-every", type=int, default=int(_env("ERROR_EVERY", "0")), help="emit a compile error every N lines (0 = never)")
+    ap.add_argument("--duration", type=float, default=float(_env("DURATION", "0")), help="exit after N seconds (0 = run until killed)")
+    ap.add_argument("--serve", action="store_true", default=_env("SERVE", "0") == "1")
+    args = ap.parse_args()
+
+    port = int(os.getenv("PORT") or 5173)
+    out = sys.stdout
+
+    # install phase (InstallParser: "added N packages ... in Xs")
+    for i in range(args.install_lines):
+        out.write(f"npm http fetch GET 200 https://registry.npmjs.org/pkg-{i} {random.randint(5, 90)}ms (cache hit)\n")
+    out.write(f"\nadded {max(1, args.install_lines) * 17} packages, and audited {max(1, args.install_lines) * 17 + 1} packages in 2s\n\n")
+    out.flush()
+
+    if args.serve:
+        server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    time.sleep(args.ready_ms / 1000)
+    out.write(f"\n  VITE v5.4.0  ready in {args.ready_ms} ms\n\n")
+    out.write(f"  ➜  Local:   http://localhost:{port}/\n")
+    out.write("  ➜  Network: use --host to expose\n")
+    out.flush()
+
+    # steady state: HMR updates padded to --line-bytes
+    interval = args.burst / args.lines_per_sec if args.lines_per_sec > 0 else None
+    deadline = time.monotonic() + args.duration if args.duration > 0 else None
+    n = 0
+    next_tick = time.monotonic()
+    while deadline is None or time.monotonic() < deadline:
+        if interval is None:
+            time.sleep(1)
+            continue
+        for _ in range(args.burst):
+            n += 1
+            if args.error_every and n % args.error_every == 0:
+                out.write(f"[plugin:vite:react-babel] /app/src/File{n % 50}.tsx: Unexpected token (12:4)\n")
+                continue
+            line = f"{time.strftime('%H:%M:%S')} [vite] hmr update /src/components/File{n % 50}.tsx"
+            k = 0
+            while len(line) < args.line_bytes:  # more updated modules, as Vite prints them
+                k += 1
+                line += f", /src/styles/part{k}.css"
+            out.write(line + "\n")
+        out.flush()
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.monotonic()  # can't keep up; don't burst to catch up
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except (KeyboardInterrupt, BrokenPipeError):
+        sys.exit(0)
@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+"""
+Load generator for the /ws workspace protocol.
+
+Opens --clients simulated editors against one worker. Each client:
+init (setup "skip"), seeds --files files, optionally runs start_dev, then
+sends a weighted mix of messages until --duration ends. Latency is measured
+from send to the first reply carrying the request's req_id. Pushed frames
+(dev_log, fs_batch ...) are counted per type.
+
+Server CPU/RSS, loop lag and thread-pool wait are sampled from /metrics
+once a second. The result is one JSON document (stdout or --out), so runs
+can be diffed across releases.
+
+    # against a running worker
+    python bench/ws_load.py --url ws://127.0.0.1:8000/ws --clients 50 --duration 60 --out run.json
+
+    # spawn a throwaway worker with bench/fake_dev.py as DEV_CMD
+    python bench/ws_load.py --spawn-server --clients 100 --dev-clients 20 --dev-lines-per-sec 200
+
+Needs websockets and httpx (both in requirements.txt).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+import websockets
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent
+
+DEFAULT_MIX = "read_file=50,list_tree=20,write_file=20,read_files=5,init=5"
+
+
+# ---- stats ----
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+def _summarize(samples: list[float], errors: int, elapsed: float) -> dict[str, Any]:
+    s = sorted(samples)
+    ms = lambda v: round(v * 1000, 3)  # noqa: E731
+    return {
+        "count": len(s),
+        "errors": errors,
+        "per_sec": round(len(s) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": ms(sum(s) / len(s)) if s else 0.0,
+        "p50_ms": ms(_percentile(s, 50)),
+        "p90_ms": ms(_percentile(s, 90)),
+        "p99_ms": ms(_percentile(s, 99)),
+        "max_ms": ms(s[-1]) if s else 0.0,
+    }
+
+
+class Results:
+    def __init__(self):
+        self.latency: dict[str, list[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.error_messages: Counter = Counter()
+        self.pushed: Counter = Counter()
+        self.pushed_bytes: Counter = Counter()
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.measuring = False  # setup traffic (seeding, first init) is excluded
+
+    def record(self, kind: str, seconds: float, ok: bool, message: Optional[str] = None) -> None:
+        if not self.measuring:
+            return
+        if ok:
+            self.latency[kind].append(seconds)
+        else:
+            self.errors[kind] += 1
+            if message:
+                self.error_messages[message[:80]] += 1
+
+
+# ---- one simulated client ----
+class Client:
+    def __init__(self, idx: int, args: argparse.Namespace, results: Results):
+        self.idx = idx
+        self.args = args
+        self.results = results
+        self.rng = random.Random(args.seed + idx)
+        self.email = f"bench-{idx}@bench.local"
+        self.paths = [f"src/bench/file_{k:04d}.ts" for k in range(args.files)]
+        self.pending: dict[str, asyncio.Future] = {}
+        self.seq = 0
+        self.ws = None
+        self.seeded = asyncio.Event()  # set once seeded (or failed)
+
+    def _content(self) -> str:
+        line = f"export const v{self.rng.randrange(1 << 30)} = {self.rng.random()};\n"
+        return (line * (self.args.file_bytes // len(line) + 1))[: self.args.file_bytes]
+
+    async def _reader(self) -> None:
+        async for raw in self.ws:
+            msg = json.loads(raw)
+            fut = self.pending.pop(msg.get("req_id") or "", None)
+            if fut is not None and not fut.done():
+                fut.set_result(msg)
+                continue
+            if self.results.measuring:
+                t = msg.get("type", "?")
+                self.results.pushed[t] += 1
+                self.results.pushed_bytes[t] += len(raw)
+
+    async def request(self, kind: str, payload: dict[str, Any], timeout: float) -> dict[str, Any]:
+        self.seq += 1
+        req_id = f"{self.idx}-{self.seq}"
+        fut = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = fut
+        started = time.perf_counter()
+        try:
+            await self.ws.send(json.dumps({"type": kind, "req_id": req_id, **payload}))
+            reply = await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(req_id, None)
+            self.results.record(kind, 0.0, False, "timeout")
+            raise
+        ok = reply.get("type") != "error"
+        self.results.record(kind, time.perf_counter() - started, ok, None if ok else str(reply.get("message")))
+        return reply
+
+    def _op(self, kind: str) -> dict[str, Any]:
+        if kind == "init":
+            return {"email": self.email, "project_id": "bench", "setup": "skip"}
+        if kind == "read_file":
+            return {"path": self.rng.choice(self.paths)}
+        if kind == "write_file":
+            return {"path": self.rng.choice(self.paths), "content": self._content()}
+        if kind == "read_files":
+            return {"paths": self.rng.sample(self.paths, min(len(self.paths), 10))}
+        if kind == "list_tree":
+            return {"path": "", "max_depth": 3}
+        if kind == "search_files":
+            return {"query": f"file_{self.rng.randrange(len(self.paths)):02d}"}
+        return {}
+
+    async def run(self, mix: list[tuple[str, float]], start_dev: bool, window: dict[str, float], ready: asyncio.Event) -> None:
+        """`window["deadline"]` is set before `ready` fires, once every client is seeded."""
+        a = self.args
+        try:
+            self.ws = await websockets.connect(a.url, max_size=None, open_timeout=a.timeout, ping_interval=None)
+        except Exception:
+            self.results.connect_failures += 1
+            self.seeded.set()
+            return
+        reader = asyncio.create_task(self._reader())
+        try:
+            # session_init arrives before any reply
+            await self.request("init", self._op("init"), a.timeout)
+            await self.request("write_files", {"files": [
+                {"path": p, "content": self._content()} for p in self.paths
+            ]}, a.timeout)
+            if start_dev:
+                await self.request("start_dev", {}, a.timeout)
+            self.seeded.set()
+            await ready.wait()
+            deadline = window["deadline"]
+
+            kinds = [k for k, _ in mix]
+            weights = [w for _, w in mix]
+            while time.monotonic() < deadline:
+                kind = self.rng.choices(kinds, weights)[0]
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await self.request(kind, self._op(kind), a.timeout)
+                if a.think_ms:
+                    await asyncio.sleep(self.rng.expovariate(1000 / a.think_ms))
+
+            if start_dev:
+                with contextlib.suppress(Exception):
+                    await self.request("stop_dev", {}, a.timeout)
+        except websockets.ConnectionClosed:
+            self.results.disconnects += 1
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.seeded.set()
+            reader.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await reader
+            with contextlib.suppress(Exception):
+                await self.ws.close()
+
+
+# ---- server side ----
+def _parse_metrics(text: str) -> dict[str, float]:
+    out: dict[str, float] = defaultdict(float)
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_labels, _, value = line.rpartition(" ")
+        name = name_labels.split("{", 1)[0]
+        with contextlib.suppress(ValueError):
+            out[name] += float(value)  # labels summed: cpu user+system, dropped frames by reason
+    return out
+
+
+class ServerSampler:
+    """Polls /metrics once a second for CPU, RSS, loop lag and thread-pool wait."""
+
+    def __init__(self, metrics_url: str):
+        self.url = metrics_url
+        self.samples: list[tuple[float, dict[str, float]]] = []
+        self.available = True
+
+    async def run(self, stop: asyncio.Event) -> None:
+        async with httpx.AsyncClient(timeout=5.0, trust_env=False) as client:
+            while not stop.is_set():
+                try:
+                    r = await client.get(self.url)
+                    r.raise_for_status()
+                    self.samples.append((time.monotonic(), _parse_metrics(r.text)))
+                except Exception:
+                    if not self.samples:
+                        self.available = False
+                        return
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop.wait(), 1.0)
+
+    def report(self) -> dict[str, Any]:
+        if len(self.samples) < 2:
+            return {"available": False}
+        cpu_pct = []
+        for (t0, m0), (t1, m1) in zip(self.samples, self.samples[1:]):
+            cpu = m1.get("rca_process_cpu_seconds_total", 0) - m0.get("rca_process_cpu_seconds_total", 0)
+            cpu_pct.append(100 * cpu / (t1 - t0))
+        rss = [m.get("rca_process_resident_memory_bytes", 0) for _, m in self.samples]
+        first, last = self.samples[0][1], self.samples[-1][1]
+
+        def mean_delta(name: str) -> Optional[float]:
+            n = last.get(f"{name}_count", 0) - first.get(f"{name}_count", 0)
+            s = last.get(f"{name}_sum", 0) - first.get(f"{name}_sum", 0)
+            return round(s / n * 1000, 3) if n > 0 else None
+
+        return {
+            "available": True,
+            "cpu_percent_mean": round(sum(cpu_pct) / len(cpu_pct), 1),
+            "cpu_percent_max": round(max(cpu_pct), 1),
+            "cpu_seconds": round(last.get("rca_process_cpu_seconds_total", 0) - first.get("rca_process_cpu_seconds_total", 0), 3),
+            "rss_bytes_start": int(rss[0]),
+            "rss_bytes_max": int(max(rss)),
+            "rss_bytes_end": int(rss[-1]),
+            "loop_lag_max_ms": round(max(m.get("rca_event_loop_lag_max_seconds", 0) for _, m in self.samples) * 1000, 3),
+            "loop_lag_mean_ms": mean_delta("rca_event_loop_lag_seconds"),
+            "threadpool_wait_mean_ms": mean_delta("rca_threadpool_queue_wait_seconds"),
+            "send_wait_mean_ms": mean_delta("rca_ws_send_wait_seconds"),
+            "frames_dropped": int(last.get("rca_ws_frames_dropped_total", 0) - first.get("rca_ws_frames_dropped_total", 0)),
+            "open_fds_max": int(max(m.get("rca_process_open_fds", 0) for _, m in self.samples)),
+        }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _spawn_server(args: argparse.Namespace) -> tuple[subprocess.Popen, str, tempfile.TemporaryDirectory]:
+    port = _free_port()
+    tmp = tempfile.TemporaryDirectory(prefix="rca-bench-")
+    fake_dev = [
+        sys.executable, str(BENCH_DIR / "fake_dev.py"),
+        "--lines-per-sec", str(args.dev_lines_per_sec),
+        "--line-bytes", str(args.dev_line_bytes),
+        "--burst", str(args.dev_burst),
+    ]
+    env = {
+        **os.environ,
+        "WORKSPACE_ROOT": tmp.name,
+        "DEV_CMD": shlex.join(fake_dev),
+        "PYTHONUNBUFFERED": "1",
+        **dict(kv.split("=", 1) for kv in args.server_env),
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=str(APP_DIR), env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(timeout=2.0, trust_env=False) as client:
+        for _ in range(100):
+            if proc.poll() is not None:
+                raise SystemExit(f"server exited with {proc.returncode}")
+            with contextlib.suppress(httpx.HTTPError):
+                if (await client.get(base + "/healthz")).status_code == 200:
+                    return proc, f"ws://127.0.0.1:{port}/ws", tmp
+            await asyncio.sleep(0.2)
+    proc.kill()
+    raise SystemExit("server did not become healthy")
+
+
+def _metrics_url(ws_url: str) -> str:
+    scheme = "https" if ws_url.startswith("wss") else "http"
+    host = ws_url.split("://", 1)[1].split("/", 1)[0]
+    return f"{scheme}://{host}/metrics"
+
+
+def _git_rev() -> Optional[str]:
+    with contextlib.suppress(Exception):
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    return None
+
+
+def _parse_mix(spec: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        kind, _, weight = part.strip().partition("=")
+        if kind:
+            mix.append((kind, float(weight or 1)))
+    return mix
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    server = tmp = None
+    if args.spawn_server:
+        server, args.url, tmp = await _spawn_server(args)
+    results = Results()
+    sampler = ServerSampler(args.metrics_url or _metrics_url(args.url))
+    stop_sampler = asyncio.Event()
+    mix = _parse_mix(args.mix)
+    ready = asyncio.Event()
+
+    try:
+        # ramp clients up, then measure for --duration once all are seeded
+        window = {"deadline": 0.0}
+        clients, tasks = [], []
+        for i in range(args.clients):
+            client = Client(i, args, results)
+            clients.append(client)
+            tasks.append(asyncio.create_task(client.run(mix, i < args.dev_clients, window, ready)))
+            if args.ramp > 0:
+                await asyncio.sleep(args.ramp / max(1, args.clients))
+        await asyncio.gather(*(c.seeded.wait() for c in clients))
+        await asyncio.sleep(args.warmup)
+
+        sampler_task = asyncio.create_task(sampler.run(stop_sampler))
+        results.measuring = True
+        started = time.monotonic()
+        window["deadline"] = started + args.duration
+        ready.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+        results.measuring = False
+        stop_sampler.set()
+        await sampler_task
+    finally:
+        if server is not None:
+            server.terminate()
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                server.wait(10)
+            if server.poll() is None:
+                server.kill()
+        if tmp is not None:
+            tmp.cleanup()
+
+    total = sum(len(v) for v in results.latency.values())
+    return {
+        "meta": {
+            "tool": "ws_load",
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out",)},
+        },
+        "summary": {
+            "clients": args.clients,
+            "dev_clients": min(args.dev_clients, args.clients),
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "requests_per_sec": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": sum(results.errors.values()),
+            "connect_failures": results.connect_failures,
+            "disconnects": results.disconnects,
+        },
+        "per_type": {
+            kind: _summarize(results.latency.get(kind, []), results.errors.get(kind, 0), elapsed)
+            for kind in sorted(set(results.latency) | set(results.errors))
+        },
+        "pushed": {
+            t: {"frames": n, "per_sec": round(n / elapsed, 2), "bytes": results.pushed_bytes[t]}
+            for t, n in sorted(results.pushed.items())
+        },
+        "error_messages": dict(results.error_messages.most_common(10)),
+        "server": sampler.report(),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    ap.add_argument("--metrics-url", default=None, help="defaults to /metrics on the ws host")
+    ap.add_argument("--spawn-server", action="store_true", help="start a worker on a free port with fake_dev.py as DEV_CMD")
+    ap.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE", help="extra env for --spawn-server")
+    ap.add_argument("--clients", type=int, default=20)
+    ap.add_argument("--dev-clients", type=int, default=0, help="clients that run start_dev (dev_log traffic)")
+    ap.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    ap.add_argument("--ramp", type=float, default=2.0, help="seconds to open all connections")
+    ap.add_argument("--warmup", type=float, default=1.0)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="weighted message types, e.g. read_file=50,write_file=20")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a client's requests (0 = closed loop)")
+    ap.add_argument("--files", type=int, default=50, help="files seeded per workspace")
+    ap.add_argument("--file-bytes", type=int, default=4096)
+    ap.add_argument("--dev-lines-per-sec", type=float, default=100.0)
+    ap.add_argument("--dev-line-bytes", type=int, default=120)
+    ap.add_argument("--dev-burst", type=int, default=1)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None, help="write JSON here instead of stdout")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+        s = report["summary"]
+        print(f"{s['requests']} requests, {s['requests_per_sec']}/s, {s['errors']} errors -> {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())